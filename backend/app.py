@@ -1,10 +1,17 @@
 import os
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from config import config
-from models import db
+from models import db, Document, SearchHistory
 from vector_store import VectorStore
+from vector_client import VectorStoreClient
+from readiness import Readiness
+from services import fulltext_index  # registers the FTS5 sync events on Document
+from services import data_version, enrichment, report_jobs, rollups, segmenter
+from services.bm25_index import KeywordIndex, load_user_tokens
+from services.metadata_snapshot import MetadataCache, load_user_metadata
+from services.search_cache import SearchCache
 from routes.auth import auth_bp
 from routes.documents import documents_bp
 from routes.search import search_bp
@@ -16,6 +23,8 @@ def create_app(config_name='development'):
     
     # Load configuration
     app.config.from_object(config[config_name])
+    readiness = Readiness()
+    app.config['READINESS'] = readiness
     
     # Initialize extensions
     db.init_app(app)
@@ -32,13 +41,49 @@ def create_app(config_name='development'):
     
     jwt = JWTManager(app)
     
-    # Initialize vector store
+    # Initialize vector store (a client of the shared vector server when VECTOR_SERVER_SOCKET is set)
     with app.app_context():
-        vector_store = VectorStore(
-            model_name=app.config['EMBEDDING_MODEL'],
-            index_path=app.config['FAISS_INDEX_PATH']
+        app.config['VECTOR_STORE'] = build_vector_store(app)
+    
+    # jieba dictionary and query segmentation memo
+    segmenter.configure(
+        cache_dir=app.config['JIEBA_CACHE_DIR'],
+        dictionary=app.config['JIEBA_DICT'],
+        memo_items=app.config['JIEBA_QUERY_MEMO_ITEMS']
+    )
+    if app.config['JIEBA_PRELOAD']:
+        segmenter.initialize()
+    
+    # In-process BM25 keyword index, kept current by commit hooks on Document
+    app.config['KEYWORD_INDEX'] = None
+    if app.config['KEYWORD_INDEX_MAX_USERS'] > 0:
+        app.config['KEYWORD_INDEX'] = KeywordIndex(
+            load_user_tokens,
+            max_loaded_users=app.config['KEYWORD_INDEX_MAX_USERS'],
+            k1=app.config['BM25_K1'],
+            b=app.config['BM25_B']
+        )
+    
+    # Columnar document metadata for analytics, kept current by commit hooks on Document
+    app.config['METADATA_CACHE'] = None
+    if app.config['METADATA_CACHE_MAX_USERS'] > 0:
+        app.config['METADATA_CACHE'] = MetadataCache(
+            load_user_metadata,
+            max_users=app.config['METADATA_CACHE_MAX_USERS']
         )
-        app.config['VECTOR_STORE'] = vector_store
+    
+    # Search results cache, invalidated through the per-user data version
+    app.config['SEARCH_CACHE'] = None
+    if app.config['SEARCH_CACHE_ITEMS'] > 0:
+        app.config['SEARCH_CACHE'] = SearchCache(app.config['SEARCH_CACHE_ITEMS'], app.config['SEARCH_CACHE_TTL'])
+    with app.app_context():
+        try:
+            data_version.ensure_table(db.engine)
+            enrichment.ensure_table(db.engine)
+            rollups.ensure_tables(db.engine)
+            report_jobs.ensure_table(db.engine)
+        except Exception as e:
+            print(f"Skipping side table check: {str(e)}")
     
     # Register blueprints
     app.register_blueprint(auth_bp)
@@ -76,7 +121,7 @@ def create_app(config_name='development'):
             'message': 'Please log in first'
         }), 401
     
-    # Health check
+    # Health check (process is up; does not wait for the embedding model)
     @app.route('/health', methods=['GET'])
     def health_check():
         return jsonify({
@@ -84,6 +129,74 @@ def create_app(config_name='development'):
             'message': 'XU-News-AI-RAG API is running'
         }), 200
     
+    # Readiness probe: 503 until the warm-up has loaded the model and hot partitions
+    @app.route('/ready', methods=['GET'])
+    def readiness_check():
+        report = readiness.report()
+        report['model_loaded'] = app.config['VECTOR_STORE'].model_loaded
+        return jsonify(report), 200 if readiness.ready else 503
+    
+    @app.after_request
+    def record_first_query(response):
+        if request.path.startswith('/api/search') and response.status_code == 200:
+            readiness.record_query()
+        return response
+    
+    @app.cli.command('vector-migrate')
+    def vector_migrate():
+        """Split a shared (pre-partition) vector index into per-user partitions"""
+        owners = dict(db.session.query(Document.id, Document.user_id).all())
+        migrated = app.config['VECTOR_STORE'].migrate_shared_index(owners)
+        print(f"Migrated {migrated} vectors into per-user partitions.")
+    
+    @app.cli.command('vector-reindex')
+    def vector_reindex():
+        """Re-embed all documents as overlapping passages (after upgrading from whole-document vectors)"""
+        vector_store = app.config['VECTOR_STORE']
+        user_ids = [user_id for (user_id,) in db.session.query(Document.user_id).distinct()]
+        for user_id in user_ids:
+            documents = Document.query.filter_by(user_id=user_id).all()
+            vector_store.add_documents(
+                [doc.id for doc in documents],
+                [f"{doc.title} {doc.content}" for doc in documents],
+                user_id
+            )
+            print(f"Re-indexed {len(documents)} documents for user {user_id}.")
+        vector_store.checkpoint()
+    
+    @app.cli.command('enrich-rebuild')
+    def enrich_rebuild():
+        """Recompute term counts, keywords and summaries for all documents (after upgrading an existing database)"""
+        count = enrichment.rebuild()
+        print(f"Enriched {count} documents.")
+    
+    @app.cli.command('rollups-rebuild')
+    def rollups_rebuild():
+        """Recompute the daily analytics rollups from all documents (run after `flask enrich-rebuild` when upgrading)"""
+        count = rollups.rebuild(processes=app.config['JIEBA_PARALLEL'])
+        print(f"Rolled up {count} documents.")
+    
+    @app.cli.command('jieba-cache')
+    def jieba_cache():
+        """Build the jieba dictionary model cache (ship it with the deployment to skip the build on startup)"""
+        segmenter.initialize()
+        print(f"jieba dictionary cached at {segmenter.cache_file()}.")
+    
+    @app.cli.command('fts-rebuild')
+    def fts_rebuild():
+        """Create (or rebuild) the FTS5 keyword index and backfill it from existing documents"""
+        count = fulltext_index.rebuild()
+        print(f"Indexed {count} documents for full-text search.")
+    
+    @app.cli.command('vector-serve')
+    def vector_serve():
+        """Run the shared vector server that the web workers connect to over VECTOR_SERVER_SOCKET"""
+        import vector_server
+        socket_path = app.config['VECTOR_SERVER_SOCKET']
+        if not socket_path:
+            raise SystemExit("VECTOR_SERVER_SOCKET is not set.")
+        vector_server.serve(build_vector_store(app, local=True), socket_path)
+    
     # Root route
     @app.route('/', methods=['GET'])
     def index():
@@ -99,8 +212,83 @@ def create_app(config_name='development'):
             }
         }), 200
     
+    readiness.mark_created()
+    if app.config['VECTOR_WARM_UP']:
+        readiness.start(warm_up_steps(app))
+    else:
+        readiness.mark_ready()
+    
     return app
 
+def build_vector_store(app, local=False):
+    """
+    Create the vector store for this process
+    
+    With VECTOR_SERVER_SOCKET set, web workers share one model and index held by the
+    `flask vector-serve` process and get a thin client; local=True always builds the
+    in-process store (used by the server itself).
+    """
+    socket_path = app.config['VECTOR_SERVER_SOCKET']
+    if socket_path and not local:
+        return VectorStoreClient(
+            socket_path,
+            chunk_size=app.config['VECTOR_CHUNK_SIZE'],
+            chunk_overlap=app.config['VECTOR_CHUNK_OVERLAP'],
+            timeout=app.config['VECTOR_SERVER_TIMEOUT']
+        )
+    return VectorStore(
+        model_name=app.config['EMBEDDING_MODEL'],
+        index_path=app.config['FAISS_INDEX_PATH'],
+        checkpoint_bytes=app.config['VECTOR_CHECKPOINT_BYTES'],
+        checkpoint_interval=app.config['VECTOR_CHECKPOINT_INTERVAL'],
+        max_loaded_partitions=app.config['VECTOR_MAX_LOADED_PARTITIONS'],
+        ann_index=app.config['VECTOR_ANN_INDEX'],
+        ann_threshold=app.config['VECTOR_ANN_THRESHOLD'],
+        nprobe=app.config['VECTOR_IVF_NPROBE'],
+        ef_search=app.config['VECTOR_HNSW_EF_SEARCH'],
+        compression=app.config['VECTOR_COMPRESSION'],
+        rerank_factor=app.config['VECTOR_RERANK_FACTOR'],
+        metric=app.config['VECTOR_METRIC'],
+        similarity_threshold=app.config['SIMILARITY_THRESHOLD'],
+        embedding_cache_path=app.config['EMBEDDING_CACHE_PATH'],
+        embedding_cache_items=app.config['EMBEDDING_CACHE_MEMORY_ITEMS'],
+        embedding_batch_size=app.config['EMBEDDING_BATCH_SIZE'],
+        embedding_batch_wait_ms=app.config['EMBEDDING_BATCH_WAIT_MS'],
+        chunk_size=app.config['VECTOR_CHUNK_SIZE'],
+        chunk_overlap=app.config['VECTOR_CHUNK_OVERLAP'],
+        passage_pooling=app.config['VECTOR_PASSAGE_POOLING']
+    )
+
+def warm_up_steps(app):
+    """Warm-up steps run in the background after the app is created"""
+    vector_store = app.config['VECTOR_STORE']
+    
+    def recent_users():
+        # Partitions of the users who searched most recently are paged in first
+        with app.app_context():
+            try:
+                rows = db.session.query(SearchHistory.user_id)\
+                    .group_by(SearchHistory.user_id)\
+                    .order_by(db.func.max(SearchHistory.created_at).desc())\
+                    .limit(app.config['VECTOR_WARM_UP_PARTITIONS'])\
+                    .all()
+            except Exception as e:
+                # Database not initialized yet: only warm up the model
+                print(f"Skipping partition warm-up: {str(e)}")
+                rows = []
+            finally:
+                db.session.remove()
+        return [user_id for (user_id,) in rows]
+    
+    return [
+        ('vector_store', lambda: vector_store.warm_up(recent_users())),
+        ('jieba', segmenter.initialize),
+    ]
+
+def shutdown(app):
+    """Stop the vector store's background threads and write its final checkpoints"""
+    app.config['VECTOR_STORE'].close()
+
 def init_database(app):
     """Initialize database"""
     with app.app_context():
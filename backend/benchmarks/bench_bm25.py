@@ -0,0 +1,108 @@
+"""
+关键词检索基准
+
+在合成语料上比较三种关键词检索的单核吞吐（查询/秒）与延迟：
+    like  旧实现：多个 LIKE '%词%' 条件 OR 组合，按命中词数排序（全表扫描）
+    fts5  SQLite FTS5全文索引（jieba预分词），bm25 排序
+    bm25  进程内 BM25Index（CSC倒排矩阵，向量化打分）
+
+语料由常用词随机组成（词频服从Zipf分布），构建时直接使用词序列，不计入分词耗时。
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_bm25.py --docs 100000 --queries 500
+"""
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.bm25_index import BM25Index
+
+WORDS = (
+    '人工智能 芯片 产业 经济 发展 市场 政策 科技 创新 数据 网络 安全 能源 汽车 电池 金融 银行 投资 '
+    '股票 教育 医疗 健康 疫苗 体育 足球 篮球 联赛 国家队 比赛 冠军 文化 旅游 电影 音乐 气候 环境 '
+    '农业 粮食 出口 进口 贸易 制造 工业 互联网 平台 手机 通信 卫星 航天 量子 计算 研究 大学 报告'
+).split()
+
+
+def corpus(docs, length, seed=0):
+    """生成 (文档ID, 词列表)；在常用词之外加入长尾词，使词表规模接近真实语料"""
+    rng = np.random.default_rng(seed)
+    vocabulary = WORDS + [f'词{i}' for i in range(20000)]
+    weights = 1.0 / np.arange(1, len(vocabulary) + 1)
+    weights /= weights.sum()
+    for doc_id in range(1, docs + 1):
+        yield doc_id, [vocabulary[i] for i in rng.choice(len(vocabulary), size=length, p=weights)]
+
+
+def timed(search, queries):
+    """依次执行查询，返回 (查询/秒, 每次耗时毫秒数组)"""
+    latencies = np.zeros(len(queries))
+    started = time.perf_counter()
+    for position, terms in enumerate(queries):
+        begin = time.perf_counter()
+        search(terms)
+        latencies[position] = (time.perf_counter() - begin) * 1000
+    return len(queries) / (time.perf_counter() - started), latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare LIKE, FTS5 and in-memory BM25 keyword search')
+    parser.add_argument('--docs', type=int, default=100000)
+    parser.add_argument('--length', type=int, default=200, help='words per document')
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--limit', type=int, default=50)
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(':memory:')
+    connection.execute('CREATE TABLE documents (id INTEGER PRIMARY KEY, user_id INTEGER, title TEXT, content TEXT, created_at INTEGER)')
+    connection.execute('CREATE VIRTUAL TABLE documents_fts USING fts5(title, content, user_id UNINDEXED)')
+    index = BM25Index()
+
+    started = time.perf_counter()
+    documents = list(corpus(args.docs, args.length))
+    for doc_id, words in documents:
+        connection.execute('INSERT INTO documents VALUES (?, 1, ?, ?, ?)', (doc_id, words[0], ''.join(words), doc_id))
+        connection.execute('INSERT INTO documents_fts (rowid, title, content, user_id) VALUES (?, ?, ?, 1)',
+                           (doc_id, words[0], ' '.join(words)))
+    connection.commit()
+    print(f"SQLite load: {time.perf_counter() - started:.1f}s")
+    started = time.perf_counter()
+    index.add_many(documents)
+    print(f"BM25Index build: {time.perf_counter() - started:.1f}s, {len(index.vocabulary)} terms, {index.base.nnz} postings")
+
+    rng = np.random.default_rng(1)
+    queries = [list(rng.choice(WORDS, size=rng.integers(1, 4), replace=False)) for _ in range(args.queries)]
+
+    def like(terms):
+        matches = ' OR '.join(['content LIKE ?'] * len(terms))
+        score = ' + '.join(['(content LIKE ?)'] * len(terms))
+        patterns = [f'%{term}%' for term in terms]
+        return connection.execute(
+            f'SELECT id FROM documents WHERE user_id = 1 AND ({matches}) '
+            f'ORDER BY {score} DESC, created_at DESC LIMIT ?', patterns + patterns + [args.limit]
+        ).fetchall()
+
+    def fts5(terms):
+        return connection.execute(
+            'SELECT rowid FROM documents_fts WHERE documents_fts MATCH ? AND user_id = 1 '
+            'ORDER BY bm25(documents_fts) LIMIT ?', (' OR '.join(f'"{term}"' for term in terms), args.limit)
+        ).fetchall()
+
+    def bm25(terms):
+        return index.search(terms, args.limit)
+
+    print(f"{'path':<6} {'queries/s':>10} {'p50_ms':>8} {'p99_ms':>8}")
+    for name, search in (('like', like), ('fts5', fts5), ('bm25', bm25)):
+        # LIKE 每次全表扫描，只取少量查询计时
+        sample = queries[:max(1, len(queries) // 20)] if name == 'like' else queries
+        rate, latencies = timed(search, sample)
+        print(f"{name:<6} {rate:>10.1f} {np.percentile(latencies, 50):>8.2f} {np.percentile(latencies, 99):>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
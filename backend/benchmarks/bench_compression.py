@@ -0,0 +1,69 @@
+"""
+压缩向量存储基准
+
+在同一批向量上比较 flat / sq8 / ivfpq 的每向量内存、recall@k（压缩索引分别给出
+直接检索与原始向量精确重排后的结果）与单次查询延迟，用于选择 VECTOR_COMPRESSION
+和 VECTOR_RERANK_FACTOR。
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_compression.py --count 200000 --rerank-factor 4
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import faiss
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import vector_index
+import vector_rerank
+from vector_rerank import RawVectors
+from vector_partition import evaluate_recall
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare flat and compressed vector storage')
+    parser.add_argument('--count', type=int, default=100000, help='number of vectors')
+    parser.add_argument('--dimension', type=int, default=384)
+    parser.add_argument('--topics', type=int, default=200, help='number of topic clusters')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--nprobe', type=int, default=16)
+    parser.add_argument('--rerank-factor', type=int, default=4)
+    args = parser.parse_args()
+    
+    # 围绕若干主题中心生成向量，比均匀随机向量更接近真实文本嵌入的分布
+    rng = np.random.default_rng(42)
+    centers = rng.standard_normal((args.topics, args.dimension)).astype('float32')
+    vectors = centers[rng.integers(0, args.topics, args.count)]
+    vectors += rng.standard_normal((args.count, args.dimension)).astype('float32')
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = np.arange(1, args.count + 1, dtype='int64')
+    raw = RawVectors(args.dimension, ids, vectors)
+    
+    print(f"{'index':<14} {'build_s':>8} {'bytes/vec':>10} {'memory':>7} {'recall@k':>9} {'latency_ms':>11}")
+    flat_bytes = None
+    for kind in ('flat', 'sq8', 'ivfpq'):
+        started = time.perf_counter()
+        index = vector_index.build_index(kind, args.dimension, ids, vectors, args.nprobe)
+        build_seconds = time.perf_counter() - started
+        bytes_per_vector = len(faiss.serialize_index(index)) / args.count
+        flat_bytes = flat_bytes or bytes_per_vector
+        
+        variants = [(kind, None)]
+        if kind in vector_index.COMPRESSED_KINDS:
+            variants.append((f'{kind}+rerank', raw))
+        for label, variant_raw in variants:
+            report = evaluate_recall(
+                lambda queries, k: vector_rerank.search(index, variant_raw, queries, k, 0, args.rerank_factor),
+                ids, vectors, args.k, args.queries,
+            )
+            print(f"{label:<14} {build_seconds:>8.2f} {bytes_per_vector:>10.1f} "
+                  f"{flat_bytes / bytes_per_vector:>6.1f}x {report['recall_at_k']:>9.3f} "
+                  f"{report['latency_ms']:>11.3f}")
+
+
+if __name__ == '__main__':
+    main()
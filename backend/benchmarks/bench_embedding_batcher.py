@@ -0,0 +1,77 @@
+"""
+嵌入微批处理基准
+
+多个线程并发地各自编码单条文本，比较逐条调用模型与经 EmbeddingBatcher 合并调用的
+吞吐（条/秒）与单次请求延迟分位数，用于选择 EMBEDDING_BATCH_SIZE / EMBEDDING_BATCH_WAIT_MS。
+
+用法（在 backend 目录下，需要能加载嵌入模型）:
+    python benchmarks/bench_embedding_batcher.py --threads 16 --requests 2000 --wait-ms 5
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_batcher import EmbeddingBatcher
+
+
+def run(encode, texts, threads):
+    """threads 个线程并发编码 texts（每次一条），返回 (总耗时秒, 每次请求耗时毫秒数组)"""
+    latencies = np.zeros(len(texts))
+    cursor = iter(range(len(texts)))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                position = next(cursor, None)
+            if position is None:
+                return
+            started = time.perf_counter()
+            encode([texts[position]])
+            latencies[position] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return time.perf_counter() - started, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare per-call and micro-batched embedding under concurrency')
+    parser.add_argument('--model', default=os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2'))
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--wait-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(args.model)
+    encode = lambda texts: model.encode(texts, convert_to_numpy=True, show_progress_bar=False)
+    encode(['warm up'])
+
+    # 每条文本都不同，避免任何去重带来的收益
+    texts = [f'第{i}条新闻：人工智能与经济发展的最新动态，第{i % 97}个行业观察' for i in range(args.requests)]
+
+    print(f"{'mode':<10} {'encodes/s':>10} {'p50_ms':>8} {'p99_ms':>8} {'max_ms':>8} {'batches':>8}")
+    seconds, latencies = run(encode, texts, args.threads)
+    print(f"{'direct':<10} {len(texts) / seconds:>10.1f} {np.percentile(latencies, 50):>8.2f} "
+          f"{np.percentile(latencies, 99):>8.2f} {latencies.max():>8.2f} {len(texts):>8}")
+
+    batcher = EmbeddingBatcher(encode, args.batch_size, args.wait_ms)
+    seconds, latencies = run(batcher.encode, texts, args.threads)
+    print(f"{'batched':<10} {len(texts) / seconds:>10.1f} {np.percentile(latencies, 50):>8.2f} "
+          f"{np.percentile(latencies, 99):>8.2f} {latencies.max():>8.2f} {batcher.batches:>8}")
+    batcher.close()
+
+
+if __name__ == '__main__':
+    main()
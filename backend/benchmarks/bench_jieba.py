@@ -0,0 +1,100 @@
+"""
+jieba分词基准
+
+分三部分测量：
+    startup  新进程加载词典的耗时：无缓存文件时从词典文本构建，有缓存文件时直接读取
+    queries  查询分词吞吐（查询/秒）：首轮全部未命中（冷），之后重复查询命中 cut_query 缓存（热）
+    analysis 批量文档精确模式分词吞吐（篇/秒）：单进程与 keyword_engine 多进程对比（词频统计）
+
+查询按Zipf分布从一组不同的查询中抽取，模拟热门查询反复出现。
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_jieba.py --queries 20000 --docs 5000 --processes 4
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+import subprocess
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import keyword_engine, segmenter
+
+WORDS = (
+    '人工智能 芯片 产业 经济 发展 市场 政策 科技 创新 数据 网络 安全 能源 汽车 电池 金融 银行 投资 '
+    '股票 教育 医疗 健康 疫苗 体育 足球 篮球 联赛 国家队 比赛 冠军 文化 旅游 电影 音乐 气候 环境 '
+    '农业 粮食 出口 进口 贸易 制造 工业 互联网 平台 手机 通信 卫星 航天 量子 计算 研究 大学 报告'
+).split()
+
+STARTUP = (
+    'import sys, time; sys.path.insert(0, {backend!r}); from services import segmenter; '
+    'segmenter.configure(cache_dir={cache_dir!r}); started = time.perf_counter(); '
+    'segmenter.initialize(); print(time.perf_counter() - started)'
+)
+
+
+def startup_seconds(cache_dir):
+    """在新进程中加载词典，返回耗时秒数"""
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run(
+        [sys.executable, '-c', STARTUP.format(backend=backend, cache_dir=cache_dir)],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return float(output.split()[-1])
+
+
+def rate(function, items):
+    """依次处理 items，返回每秒处理数"""
+    started = time.perf_counter()
+    for item in items:
+        function(item)
+    return len(items) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure jieba startup, query and batch segmentation throughput')
+    parser.add_argument('--queries', type=int, default=20000)
+    parser.add_argument('--distinct', type=int, default=2000, help='distinct queries')
+    parser.add_argument('--docs', type=int, default=5000)
+    parser.add_argument('--length', type=int, default=200, help='words per document')
+    parser.add_argument('--processes', type=int, default=4)
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp(prefix='jieba-bench-')
+    try:
+        cold = startup_seconds(cache_dir)
+        warm = startup_seconds(cache_dir)
+        print(f"startup: build {cold:.2f}s, from cache {warm:.2f}s")
+    finally:
+        shutil.rmtree(cache_dir)
+
+    rng = np.random.default_rng(0)
+    segmenter.configure(memo_items=4096)
+    segmenter.initialize()
+    distinct = [''.join(rng.choice(WORDS, size=rng.integers(2, 6))) for _ in range(args.distinct)]
+    weights = 1.0 / np.arange(1, len(distinct) + 1)
+    queries = [distinct[i] for i in rng.choice(len(distinct), size=args.queries, p=weights / weights.sum())]
+
+    uncached = rate(segmenter._cut_for_search, queries)
+    first_pass = rate(segmenter.cut_query, distinct)
+    repeated = rate(segmenter.cut_query, queries)
+    print(f"queries: uncached {uncached:,.0f}/s, cold memo {first_pass:,.0f}/s, "
+          f"warm memo {repeated:,.0f}/s (hit rate {segmenter.memo_info()['hit_rate']:.1%})")
+
+    documents = [''.join(rng.choice(WORDS, size=args.length)) for _ in range(args.docs)]
+    started = time.perf_counter()
+    serial = keyword_engine.term_statistics(documents)
+    serial_rate = args.docs / (time.perf_counter() - started)
+    started = time.perf_counter()
+    parallel = keyword_engine.term_statistics(documents, processes=args.processes)
+    parallel_rate = args.docs / (time.perf_counter() - started)
+    assert parallel == serial
+    print(f"analysis: 1 process {serial_rate:,.0f} docs/s, {args.processes} processes {parallel_rate:,.0f} docs/s")
+
+
+if __name__ == '__main__':
+    main()
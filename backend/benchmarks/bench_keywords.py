@@ -0,0 +1,88 @@
+"""
+关键词统计基准
+
+对比两种统计方式：
+    materialized 先对全部文本分词并保留结果，再计数（改造前报告生成时提取关键词的做法）
+    streaming    keyword_engine.term_statistics 分块流式统计，进程数依次取 1, 2, 4 ... --processes
+
+输出各方式的吞吐（篇/秒）、相对单进程的加速比，以及单进程时父进程的内存峰值（tracemalloc）。
+加速比受CPU核数限制，结果中一并打印 os.cpu_count()。
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_keywords.py --docs 20000 --processes 8
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+from collections import Counter
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import keyword_engine, segmenter
+from services.keyword_engine import is_term
+
+WORDS = (
+    '人工智能 芯片 产业 经济 发展 市场 政策 科技 创新 数据 网络 安全 能源 汽车 电池 金融 银行 投资 '
+    '股票 教育 医疗 健康 疫苗 体育 足球 篮球 联赛 国家队 比赛 冠军 文化 旅游 电影 音乐 气候 环境 '
+    '农业 粮食 出口 进口 贸易 制造 工业 互联网 平台 手机 通信 卫星 航天 量子 计算 研究 大学 报告'
+).split()
+
+
+def materialized(documents):
+    """改造前的做法：保留全部分词结果后计数"""
+    tokens = [segmenter.cut(text) for text in documents]
+    return Counter(word for words in tokens for word in words if is_term(word))
+
+
+def rate(function, documents):
+    """返回 (结果, 篇/秒)"""
+    started = time.perf_counter()
+    result = function(documents)
+    return result, len(documents) / (time.perf_counter() - started)
+
+
+def peak_memory(function, documents):
+    """单独运行一次，返回父进程的内存峰值MB（tracemalloc 会拖慢运行，不与计时混在一起）"""
+    tracemalloc.start()
+    function(documents)
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure map-reduce keyword statistics throughput')
+    parser.add_argument('--docs', type=int, default=20000)
+    parser.add_argument('--length', type=int, default=200, help='words per document')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=keyword_engine.CHUNK_SIZE)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    segmenter.initialize()
+    documents = [''.join(rng.choice(WORDS, size=args.length)) for _ in range(args.docs)]
+    print(f"{args.docs} documents x {args.length} words, cpu_count={os.cpu_count()}")
+
+    expected, serial_rate = rate(materialized, documents)
+    print(f"materialized: 1 process {serial_rate:,.0f} docs/s, "
+          f"parent peak {peak_memory(materialized, documents):.1f} MB")
+
+    processes = 1
+    baseline = None
+    while processes <= args.processes:
+        def streaming(texts):
+            return keyword_engine.term_statistics(texts, processes, args.chunk_size)[0]
+        term_frequency, docs_per_second = rate(streaming, documents)
+        assert term_frequency == expected
+        baseline = baseline or docs_per_second
+        memory = f", parent peak {peak_memory(streaming, documents):.1f} MB" if processes == 1 else ''
+        print(f"streaming: {processes} processes {docs_per_second:,.0f} docs/s, "
+              f"speedup {docs_per_second / baseline:.2f}x{memory}")
+        processes *= 2
+
+
+if __name__ == '__main__':
+    main()
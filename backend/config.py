@@ -1,4 +1,5 @@
 import os
+import tempfile
 from datetime import timedelta
 from dotenv import load_dotenv
 
@@ -35,6 +36,34 @@ class Config:
     # Retrieval configuration
     SIMILARITY_THRESHOLD = float(os.getenv('SIMILARITY_THRESHOLD', '0.6'))
     MAX_SEARCH_RESULTS = int(os.getenv('MAX_SEARCH_RESULTS', '10'))
+    # Knowledge-base search fuses the top HYBRID_CANDIDATES vector and keyword hits by reciprocal rank
+    HYBRID_RRF_K = int(os.getenv('HYBRID_RRF_K', '60'))
+    HYBRID_CANDIDATES = int(os.getenv('HYBRID_CANDIDATES', '50'))
+    # In-process BM25 keyword index, built per user on first search and kept for up to
+    # KEYWORD_INDEX_MAX_USERS users (0 = query the FTS5 table instead)
+    KEYWORD_INDEX_MAX_USERS = int(os.getenv('KEYWORD_INDEX_MAX_USERS', '64'))
+    BM25_K1 = float(os.getenv('BM25_K1', '1.5'))
+    BM25_B = float(os.getenv('BM25_B', '0.75'))
+    SEARCH_BATCH_MAX_QUERIES = int(os.getenv('SEARCH_BATCH_MAX_QUERIES', '500'))  # queries per /api/search/batch call
+    # jieba dictionary: loaded in create_app when JIEBA_PRELOAD is set (with `gunicorn --preload` the
+    # workers inherit it), from the prebuilt model cache in JIEBA_CACHE_DIR (empty = system temp dir)
+    JIEBA_PRELOAD = os.getenv('JIEBA_PRELOAD', 'true').lower() == 'true'
+    JIEBA_CACHE_DIR = os.getenv('JIEBA_CACHE_DIR', '')
+    JIEBA_DICT = os.getenv('JIEBA_DICT', '')
+    JIEBA_QUERY_MEMO_ITEMS = int(os.getenv('JIEBA_QUERY_MEMO_ITEMS', '4096'))  # segmented queries kept (LRU)
+    JIEBA_PARALLEL = int(os.getenv('JIEBA_PARALLEL', '0'))  # processes for `flask rollups-rebuild` segmentation (0 = in-process)
+    # Knowledge-base search results cached per user for SEARCH_CACHE_TTL seconds (0 items = disabled);
+    # entries are dropped as soon as the user's documents change
+    SEARCH_CACHE_ITEMS = int(os.getenv('SEARCH_CACHE_ITEMS', '2048'))
+    SEARCH_CACHE_TTL = float(os.getenv('SEARCH_CACHE_TTL', '300'))
+    # Analysis reports are generated by REPORT_WORKERS background threads (0 = inside the submitting request);
+    # queued or running jobs older than REPORT_JOB_TIMEOUT seconds are not reused
+    REPORT_WORKERS = int(os.getenv('REPORT_WORKERS', '2'))
+    REPORT_JOB_TIMEOUT = float(os.getenv('REPORT_JOB_TIMEOUT', '600'))
+    # Columnar per-user document metadata (created_at, category, source) kept in memory for up to
+    # METADATA_CACHE_MAX_USERS users; document counts, distributions and trends are computed from it
+    # (0 = read the daily rollups instead)
+    METADATA_CACHE_MAX_USERS = int(os.getenv('METADATA_CACHE_MAX_USERS', '64'))
     
     # File upload configuration
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads')
@@ -44,6 +73,53 @@ class Config:
     # FAISS vector store path
     FAISS_INDEX_PATH = 'faiss_index'
     VECTOR_DIM = 384  # Vector dimension for all-MiniLM-L6-v2
+    
+    # Vector WAL checkpointing (full index written in background)
+    VECTOR_CHECKPOINT_BYTES = int(os.getenv('VECTOR_CHECKPOINT_BYTES', str(64 * 1024 * 1024)))
+    VECTOR_CHECKPOINT_INTERVAL = float(os.getenv('VECTOR_CHECKPOINT_INTERVAL', '300'))
+    
+    # Per-user vector partitions kept in memory (least recently used are evicted)
+    VECTOR_MAX_LOADED_PARTITIONS = int(os.getenv('VECTOR_MAX_LOADED_PARTITIONS', '64'))
+    
+    # Approximate index a partition is promoted to once it holds VECTOR_ANN_THRESHOLD vectors (ivf, hnsw or flat)
+    VECTOR_ANN_INDEX = os.getenv('VECTOR_ANN_INDEX', 'hnsw')
+    VECTOR_ANN_THRESHOLD = int(os.getenv('VECTOR_ANN_THRESHOLD', '50000'))
+    VECTOR_IVF_NPROBE = int(os.getenv('VECTOR_IVF_NPROBE', '16'))
+    VECTOR_HNSW_EF_SEARCH = int(os.getenv('VECTOR_HNSW_EF_SEARCH', '64'))
+    
+    # Opt-in compressed storage (none, sq8 or ivfpq); top k * VECTOR_RERANK_FACTOR candidates are re-ranked exactly
+    VECTOR_COMPRESSION = os.getenv('VECTOR_COMPRESSION', 'none')
+    VECTOR_RERANK_FACTOR = int(os.getenv('VECTOR_RERANK_FACTOR', '4'))
+    
+    # Vector distance metric: l2 (similarity = exp(-distance)) or cosine (normalized inner product).
+    # Changing it requires rebuilding existing indexes.
+    VECTOR_METRIC = os.getenv('VECTOR_METRIC', 'l2')
+    
+    # Embedding cache keyed by hash(model, normalized text): bounded in-memory LRU plus a SQLite file
+    EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH', 'embedding_cache.db')
+    EMBEDDING_CACHE_MEMORY_ITEMS = int(os.getenv('EMBEDDING_CACHE_MEMORY_ITEMS', '10000'))
+    
+    # Concurrent small encode requests are coalesced into one model call after at most
+    # EMBEDDING_BATCH_WAIT_MS or once EMBEDDING_BATCH_SIZE texts are queued (0 ms disables batching)
+    EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '64'))
+    EMBEDDING_BATCH_WAIT_MS = float(os.getenv('EMBEDDING_BATCH_WAIT_MS', '5'))
+    
+    # Documents are embedded as overlapping passages (sizes in approximate tokens);
+    # passage hits are pooled back to documents by max or sum
+    VECTOR_CHUNK_SIZE = int(os.getenv('VECTOR_CHUNK_SIZE', '200'))
+    VECTOR_CHUNK_OVERLAP = int(os.getenv('VECTOR_CHUNK_OVERLAP', '40'))
+    VECTOR_PASSAGE_POOLING = os.getenv('VECTOR_PASSAGE_POOLING', 'max')
+    
+    # The embedding model is loaded lazily; when enabled, a background warm-up loads it, runs one encode,
+    # pages in the partitions of the most recently active users and loads the jieba dictionary.
+    # /ready answers 503 until the warm-up has finished.
+    VECTOR_WARM_UP = os.getenv('VECTOR_WARM_UP', 'true').lower() == 'true'
+    VECTOR_WARM_UP_PARTITIONS = int(os.getenv('VECTOR_WARM_UP_PARTITIONS', '8'))
+    
+    # Multi-worker deployments: run `flask vector-serve` once and point every web worker at its
+    # Unix socket so the model and indexes are loaded a single time (empty = in-process store)
+    VECTOR_SERVER_SOCKET = os.getenv('VECTOR_SERVER_SOCKET', '')
+    VECTOR_SERVER_TIMEOUT = float(os.getenv('VECTOR_SERVER_TIMEOUT', '60'))
 
 class DevelopmentConfig(Config):
     """Development environment configuration"""
@@ -53,10 +129,17 @@ class ProductionConfig(Config):
     """Production environment configuration"""
     DEBUG = False
 
+# Test database and vector index live outside the source tree (one directory per test process);
+# the test fixtures close the app and remove it after each test
+TEST_DATA_DIR = os.path.join(tempfile.gettempdir(), f'xu_news_rag_test_{os.getpid()}')
+
 class TestingConfig(Config):
     """Testing environment configuration"""
     TESTING = True
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///test.db'
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(TEST_DATA_DIR, 'test.db')
+    FAISS_INDEX_PATH = os.path.join(TEST_DATA_DIR, 'faiss_index')
+    EMBEDDING_CACHE_PATH = ''  # memory only
+    VECTOR_WARM_UP = False  # the model is loaded by the first test that encodes text
 
 # Configuration dictionary
 config = {
@@ -0,0 +1,115 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+import numpy as np
+
+
+class EmbeddingBatcher:
+    """
+    嵌入微批处理器
+
+    并发的检索与入库线程各自只编码一两条文本，逐条调用模型时CPU推理的固定开销占大头。
+    批处理器把这些请求放入队列，由一个工作线程合并为一批调用模型：
+    凑满 max_batch 条文本或第一个请求已等待 max_wait_ms 时立即发出，每个调用方的
+    Future 各自得到自己那部分结果。单个请求的额外等待不超过 max_wait_ms。
+    """
+
+    def __init__(self, encode: Callable[[List[str]], np.ndarray], max_batch: int = 64,
+                 max_wait_ms: float = 5.0):
+        """
+        Args:
+            encode: 批量编码函数，输入文本列表，返回与之对应的向量矩阵
+            max_batch: 每批最多的文本数
+            max_wait_ms: 批内第一个请求最多等待的毫秒数
+        """
+        self.encode_batch = encode
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.batches = 0
+        self.encoded = 0
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name='embedding-batcher', daemon=True)
+        self._worker.start()
+
+    def submit(self, texts: List[str]) -> Future:
+        """
+        提交编码请求
+
+        Returns:
+            结果为向量矩阵（行与 texts 一一对应）的 Future
+        """
+        future = Future()
+        texts = list(texts)
+        if not texts:
+            future.set_result(np.zeros((0, 0), dtype='float32'))
+            return future
+        with self._lock:
+            if self._closed:
+                future.set_exception(RuntimeError("Embedding batcher is closed"))
+                return future
+            self._queue.put((texts, future))
+        return future
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """提交编码请求并等待结果"""
+        return self.submit(texts).result()
+
+    def _collect(self, first: tuple) -> List[tuple]:
+        """从第一个请求开始收集一批，直到凑满文本数或等待超时"""
+        pending = [first]
+        count = len(first[0])
+        deadline = time.monotonic() + self.max_wait
+        while count < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                # 关闭信号放回，处理完这一批后退出
+                self._queue.put(None)
+                break
+            pending.append(request)
+            count += len(request[0])
+        return pending
+
+    def _run(self):
+        """工作线程: 合并请求，批内去重后调用一次模型并分发结果"""
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            pending = self._collect(first)
+
+            # 标记为取消的请求不再编码
+            pending = [(texts, future) for texts, future in pending if future.set_running_or_notify_cancel()]
+            if not pending:
+                continue
+            unique = list(dict.fromkeys(text for texts, _ in pending for text in texts))
+            try:
+                vectors = self.encode_batch(unique)
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.encoded += len(unique)
+            rows = {text: row for row, text in enumerate(unique)}
+            for texts, future in pending:
+                future.set_result(vectors[[rows[text] for text in texts]])
+
+    def close(self):
+        """处理完已提交的请求后停止工作线程"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._worker.join(timeout=10)
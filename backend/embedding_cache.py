@@ -0,0 +1,146 @@
+import os
+import re
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+from typing import Dict, List, Optional
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本（Unicode NFKC、合并空白、去除首尾空白），使仅格式不同的重复内容命中同一缓存项"""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFKC', text)).strip()
+
+
+class EmbeddingCache:
+    """
+    按内容哈希缓存文本嵌入向量
+    
+    键为 sha1(模型名 + 规范化文本)，两级存储：
+    - 内存层: 有界LRU，命中时无需任何IO
+    - 磁盘层: SQLite表（向量以float32字节存储），进程重启与重建索引时复用
+    
+    缓存的是模型原始输出，归一化等后处理由调用方完成。
+    """
+    
+    def __init__(self, model_name: str, path: Optional[str] = None, memory_items: int = 10000):
+        """
+        初始化缓存
+        
+        Args:
+            model_name: 嵌入模型名称（参与键计算，换模型后旧缓存自然失效）
+            path: SQLite缓存文件路径，为空时只使用内存层
+            memory_items: 内存层最多保留的向量数
+        """
+        self.model_name = model_name
+        self.path = path
+        self.memory_items = memory_items
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS embeddings ('
+                'key BLOB PRIMARY KEY, dimension INTEGER NOT NULL, vector BLOB NOT NULL)'
+            )
+            self._conn.commit()
+    
+    def key(self, text: str) -> bytes:
+        """计算文本的缓存键"""
+        return hashlib.sha1(f"{self.model_name}\0{normalize_text(text)}".encode('utf-8')).digest()
+    
+    def _remember(self, key: bytes, vector: np.ndarray):
+        """放入内存层并按LRU淘汰，调用方需持有锁"""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+    
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        批量查询缓存
+        
+        Args:
+            texts: 文本列表
+        
+        Returns:
+            与texts一一对应的向量，未命中为None
+        """
+        keys = [self.key(text) for text in texts]
+        found: Dict[bytes, np.ndarray] = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+                else:
+                    missing.append(key)
+            
+            if missing and self._conn is not None:
+                unique = list(dict.fromkeys(missing))
+                for start in range(0, len(unique), 500):
+                    batch = unique[start:start + 500]
+                    rows = self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                        batch
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = np.frombuffer(blob, dtype='float32')
+                        found[key] = vector
+                        self._remember(key, vector)
+            
+            results = [found.get(key) for key in keys]
+            hit_count = sum(vector is not None for vector in results)
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+        return results
+    
+    def put_many(self, texts: List[str], vectors: np.ndarray):
+        """
+        写入缓存
+        
+        Args:
+            texts: 文本列表
+            vectors: 与texts对应的向量矩阵
+        """
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = self.key(text)
+                vector = np.ascontiguousarray(vector, dtype='float32')
+                self._remember(key, vector)
+                rows.append((key, len(vector), vector.tobytes()))
+            if self._conn is not None and rows:
+                self._conn.executemany('INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)', rows)
+                self._conn.commit()
+    
+    def stats(self) -> Dict:
+        """命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'memory_items': len(self._memory),
+            }
+    
+    def close(self):
+        """关闭磁盘层连接"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
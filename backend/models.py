@@ -1,3 +1,4 @@
+import json
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -97,4 +98,82 @@ class SearchHistory(db.Model):
             'created_at': self.created_at.isoformat()
         }
 
+class UserDataVersion(db.Model):
+    """Per-user data version, bumped in the same transaction as every document write"""
+    __tablename__ = 'user_data_versions'
+    
+    user_id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
 
+class DocumentEnrichment(db.Model):
+    """Per-document text statistics computed once at ingest (see services/enrichment.py)"""
+    __tablename__ = 'document_enrichments'
+    
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id', ondelete='CASCADE'), primary_key=True)
+    token_count = db.Column(db.Integer, nullable=False, default=0)
+    term_counts = db.Column(db.Text, nullable=False)  # JSON {word: count}, words of two or more characters
+    keywords = db.Column(db.Text, nullable=False)  # JSON [[word, tf-idf weight], ...]
+    summary = db.Column(db.Text)  # TextRank extractive summary
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class DailyDocumentRollup(db.Model):
+    """Documents per (user, day, category, source), maintained on every document write (see services/rollups.py)"""
+    __tablename__ = 'daily_document_rollups'
+    
+    user_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    category = db.Column(db.String(100), primary_key=True)  # '' when the document has no category
+    source = db.Column(db.String(200), primary_key=True)  # '' when the document has no source
+    doc_count = db.Column(db.Integer, nullable=False, default=0)
+
+class DailyTermRollup(db.Model):
+    """Term occurrences per (user, day, category, source, term), summed from document enrichments"""
+    __tablename__ = 'daily_term_rollups'
+    
+    user_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    category = db.Column(db.String(100), primary_key=True)
+    source = db.Column(db.String(200), primary_key=True)
+    term = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class ReportJob(db.Model):
+    """Background analysis report job; a finished job doubles as the cached report for its data version"""
+    __tablename__ = 'report_jobs'
+    
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    user_id = db.Column(db.Integer, nullable=False)
+    time_range = db.Column(db.String(20), nullable=False)
+    data_version = db.Column(db.Integer, nullable=False)  # user data version the report was computed from
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    progress = db.Column(db.Float, nullable=False, default=0.0)  # 0..1
+    stage = db.Column(db.String(50))
+    result = db.Column(db.Text)  # JSON report
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    
+    # At most one queued/running job per (user, time range, data version), also across worker processes
+    __table_args__ = (
+        db.Index('ix_report_jobs_lookup', 'user_id', 'time_range', 'data_version'),
+        db.Index('uq_report_jobs_active', 'user_id', 'time_range', 'data_version', unique=True,
+                 sqlite_where=db.text("status IN ('queued', 'running')"),
+                 postgresql_where=db.text("status IN ('queued', 'running')")),
+    )
+    
+    def to_dict(self, include_result=True):
+        """Convert to dictionary"""
+        data = {
+            'id': self.id,
+            'time_range': self.time_range,
+            'data_version': self.data_version,
+            'status': self.status,
+            'progress': round(self.progress or 0.0, 3),
+            'stage': self.stage,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+        if include_result and self.status == 'done':
+            data['report'] = json.loads(self.result)
+        return data
@@ -0,0 +1,128 @@
+import os
+import time
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 就绪状态
+#   starting: 应用已创建，预热尚未开始
+#   warming:  后台预热进行中（/health 已可响应，/ready 返回503）
+#   ready:    可以接收查询
+#   failed:   预热失败（首个查询仍会按需加载）
+STATES = ('starting', 'warming', 'ready', 'failed')
+
+_IMPORTED_AT = time.time()
+
+
+def process_start_time() -> float:
+    """
+    当前进程的启动时间戳
+
+    Linux 从 /proc 读取内核记录的启动时刻，其他平台退化为本模块的导入时间。
+    """
+    try:
+        with open('/proc/self/stat') as f:
+            # 进程名可能含空格，从最后一个右括号之后开始按字段切分
+            fields = f.read().rsplit(')', 1)[1].split()
+        start_ticks = int(fields[19])
+        with open('/proc/stat') as f:
+            boot_time = next(int(line.split()[1]) for line in f if line.startswith('btime'))
+        return boot_time + start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, StopIteration):
+        return _IMPORTED_AT
+
+
+class Readiness:
+    """
+    记录服务的就绪状态与启动耗时
+
+    预热步骤在后台线程中依次执行，期间 /health 正常响应、/ready 返回503。
+    同时记录进程启动到应用创建、到预热完成、到首个查询完成的耗时。
+    """
+
+    def __init__(self):
+        self.state = 'starting'
+        self.error: Optional[str] = None
+        self.process_started = process_start_time()
+        self.app_created: Optional[float] = None
+        self.ready_at: Optional[float] = None
+        self.first_query_at: Optional[float] = None
+        self.steps: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == 'ready'
+
+    def mark_created(self):
+        """应用工厂完成时调用"""
+        self.app_created = time.time()
+
+    def mark_ready(self):
+        """不预热时直接标记就绪（模型在首个查询时加载）"""
+        self.ready_at = time.time()
+        self.state = 'ready'
+
+    def warm_up(self, steps: List[Tuple[str, Callable[[], object]]]):
+        """
+        依次执行预热步骤并记录每步耗时
+
+        Args:
+            steps: [(步骤名, 无参函数), ...]，函数返回值（如分阶段耗时）一并记录
+        """
+        self.state = 'warming'
+        try:
+            for name, step in steps:
+                started = time.perf_counter()
+                result = step()
+                elapsed = round(time.perf_counter() - started, 3)
+                self.steps[name] = result if result is not None else elapsed
+        except Exception as e:
+            self.error = str(e)
+            self.state = 'failed'
+            print(f"Warm-up failed: {self.error}")
+            return
+        self.mark_ready()
+        print(f"Warm-up finished {self._since_start(self.ready_at):.2f}s after process start: {self.steps}")
+
+    def start(self, steps: List[Tuple[str, Callable[[], object]]]) -> threading.Thread:
+        """在后台线程中预热"""
+        self._thread = threading.Thread(target=self.warm_up, args=(steps,), name='warm-up', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待后台预热结束，返回是否就绪"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.ready
+
+    def record_query(self):
+        """记录首个查询完成的时刻（只记录一次）"""
+        if self.first_query_at is not None:
+            return
+        with self._lock:
+            if self.first_query_at is None:
+                self.first_query_at = time.time()
+                print(f"First query served {self._since_start(self.first_query_at):.2f}s after process start.")
+
+    def _since_start(self, moment: Optional[float]) -> Optional[float]:
+        if moment is None:
+            return None
+        return round(moment - self.process_started, 3)
+
+    def report(self) -> Dict:
+        """
+        Returns:
+            {'status', 'error', 'warm_up', 'process_started', 'app_created_seconds',
+             'ready_seconds', 'time_to_first_query_seconds'}，耗时均从进程启动起算
+        """
+        return {
+            'status': self.state,
+            'error': self.error,
+            'warm_up': self.steps,
+            'process_started': self.process_started,
+            'app_created_seconds': self._since_start(self.app_created),
+            'ready_seconds': self._since_start(self.ready_at),
+            'time_to_first_query_seconds': self._since_start(self.first_query_at),
+        }
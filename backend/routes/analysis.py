@@ -1,35 +1,46 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, Document
 from services.analysis_service import AnalysisService
+from services import analytics_query, report_jobs
 
 analysis_bp = Blueprint('analysis', __name__, url_prefix='/api/analysis')
 
+def insufficient_data(user_id):
+    """400 response when the user has too few documents for a report, else None"""
+    # Document count from the metadata snapshot (the daily rollups when the metadata cache is off)
+    document_count = analytics_query.count_documents(user_id)
+    
+    if document_count < 100:
+        return jsonify({
+            'error': 'Insufficient data',
+            'message': 'At least 100 documents are required to generate analysis report',
+            'current_count': document_count
+        }), 400
+    return None
+
 @analysis_bp.route('/report', methods=['GET'])
 @jwt_required()
 def get_analysis_report():
-    """Get data analysis report"""
+    """Get data analysis report (generated in the request; see /report/jobs for the background version)"""
     current_user_id = get_jwt_identity()
     
     # Get parameters
     time_range = request.args.get('time_range', 'all')  # 7days, 30days, all
+    if time_range not in report_jobs.TIME_RANGES:
+        time_range = 'all'
     
-    # Query all user documents
-    documents = Document.query.filter_by(user_id=current_user_id).all()
-    
-    if len(documents) < 100:
-        return jsonify({
-            'error': 'Insufficient data',
-            'message': 'At least 100 documents are required to generate analysis report',
-            'current_count': len(documents)
-        }), 400
+    error = insufficient_data(current_user_id)
+    if error:
+        return error
     
     try:
-        # Convert to dictionary format
-        docs_dict = [doc.to_dict(include_content=True) for doc in documents]
-        
-        # Generate analysis report
-        report = AnalysisService.generate_summary_report(docs_dict, time_range=time_range)
+        # Reuses the finished report for the current data version, otherwise generates it from the daily rollups
+        job = report_jobs.submit(current_user_id, time_range, run_inline=True)
+        if job.status != 'done':
+            # A background job for this data version is still running
+            report = AnalysisService.user_summary_report(current_user_id, time_range=time_range)
+        else:
+            report = job.to_dict()['report']
         
         return jsonify({
             'report': report
@@ -38,10 +49,50 @@ def get_analysis_report():
     except Exception as e:
         return jsonify({'error': f'Report generation failed: {str(e)}'}), 500
 
+@analysis_bp.route('/report/jobs', methods=['POST'])
+@jwt_required()
+def submit_report_job():
+    """Queue a background analysis report; unchanged data returns the finished report at once"""
+    current_user_id = get_jwt_identity()
+    data = request.get_json(silent=True) or {}
+    
+    time_range = data.get('time_range', 'all')
+    if time_range not in report_jobs.TIME_RANGES:
+        return jsonify({'error': f"time_range must be one of {', '.join(report_jobs.TIME_RANGES)}"}), 400
+    
+    error = insufficient_data(current_user_id)
+    if error:
+        return error
+    
+    job = report_jobs.submit(current_user_id, time_range)
+    return jsonify({
+        'job': job.to_dict()
+    }), 200 if job.status == 'done' else 202
+
+@analysis_bp.route('/report/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_report_job(job_id):
+    """Poll a report job: status, progress and, once done, the report"""
+    current_user_id = get_jwt_identity()
+    
+    job = report_jobs.get(job_id, current_user_id)
+    if job is None:
+        return jsonify({'error': 'Report job not found'}), 404
+    
+    return jsonify({
+        'job': job.to_dict()
+    }), 200
+
 @analysis_bp.route('/keywords', methods=['POST'])
 @jwt_required()
 def extract_keywords():
-    """Extract keywords"""
+    """
+    Extract keywords
+
+    7days/30days are counted in whole UTC days from the daily rollups: every document
+    created on or after the first day of the window (returned as `since`) is included,
+    so the window covers up to one day more than a rolling 7/30 x 24 hours.
+    """
     current_user_id = get_jwt_identity()
     data = request.get_json()
     
@@ -50,43 +101,32 @@ def extract_keywords():
     topK = data.get('topK', 10)
     category = data.get('category', None)
     
-    # Build query
-    query = Document.query.filter_by(user_id=current_user_id)
-    
-    if category:
-        query = query.filter_by(category=category)
-    
-    # Filter by time range
-    if time_range == '7days':
-        from datetime import datetime, timedelta
-        cutoff_date = datetime.utcnow() - timedelta(days=7)
-        query = query.filter(Document.created_at >= cutoff_date)
-    elif time_range == '30days':
+    # Filter by time range (whole days, read from the daily rollups)
+    since = None
+    if time_range in ('7days', '30days'):
         from datetime import datetime, timedelta
-        cutoff_date = datetime.utcnow() - timedelta(days=30)
-        query = query.filter(Document.created_at >= cutoff_date)
+        since = datetime.utcnow() - timedelta(days=7 if time_range == '7days' else 30)
     
-    documents = query.all()
+    document_count = analytics_query.count_documents(current_user_id, category=category, since=since)
     
-    if not documents:
+    since_day = since.date().isoformat() if since else None
+    
+    if not document_count:
         return jsonify({
             'keywords': [],
+            'since': since_day,
             'message': 'No matching documents found'
         }), 200
     
     try:
-        # Extract text
-        texts = []
-        for doc in documents:
-            text = f"{doc.title} {doc.content}"
-            texts.append(text)
-        
-        # Extract keywords
-        keywords = AnalysisService.extract_keywords(texts, topK=topK)
+        # Sum the term counts rolled up at ingest instead of re-segmenting every document
+        term_counts = analytics_query.term_counts(current_user_id, category=category, since=since)
+        keywords = AnalysisService.keywords_from_counts(term_counts, topK=topK)
         
         return jsonify({
             'keywords': keywords,
-            'document_count': len(documents)
+            'document_count': document_count,
+            'since': since_day
         }), 200
         
     except Exception as e:
@@ -98,22 +138,19 @@ def get_category_distribution():
     """Get category distribution"""
     current_user_id = get_jwt_identity()
     
-    # Query all documents
-    documents = Document.query.filter_by(user_id=current_user_id).all()
-    
-    if not documents:
-        return jsonify({
-            'distribution': {},
-            'message': 'No documents found'
-        }), 200
-    
     try:
-        docs_dict = [doc.to_dict() for doc in documents]
-        distribution = AnalysisService.analyze_category_distribution(docs_dict)
+        # Summed from the daily rollups
+        distribution = AnalysisService.user_category_distribution(current_user_id)
+        
+        if not distribution:
+            return jsonify({
+                'distribution': {},
+                'message': 'No documents found'
+            }), 200
         
         return jsonify({
             'distribution': distribution,
-            'total': len(documents)
+            'total': sum(distribution.values())
         }), 200
         
     except Exception as e:
@@ -125,22 +162,19 @@ def get_source_distribution():
     """Get source distribution"""
     current_user_id = get_jwt_identity()
     
-    # Query all documents
-    documents = Document.query.filter_by(user_id=current_user_id).all()
-    
-    if not documents:
-        return jsonify({
-            'distribution': {},
-            'message': 'No documents found'
-        }), 200
-    
     try:
-        docs_dict = [doc.to_dict() for doc in documents]
-        distribution = AnalysisService.analyze_source_distribution(docs_dict)
+        # Summed from the daily rollups
+        distribution = AnalysisService.user_source_distribution(current_user_id)
+        
+        if not distribution:
+            return jsonify({
+                'distribution': {},
+                'message': 'No documents found'
+            }), 200
         
         return jsonify({
             'distribution': distribution,
-            'total': len(documents)
+            'total': sum(distribution.values())
         }), 200
         
     except Exception as e:
@@ -154,18 +188,15 @@ def get_time_trend():
     
     days = request.args.get('days', 7, type=int)
     
-    # Query all documents
-    documents = Document.query.filter_by(user_id=current_user_id).all()
-    
-    if not documents:
+    if not analytics_query.count_documents(current_user_id):
         return jsonify({
             'trend': {},
             'message': 'No documents found'
         }), 200
     
     try:
-        docs_dict = [doc.to_dict() for doc in documents]
-        trend = AnalysisService.analyze_time_trend(docs_dict, days=days)
+        # One row per day from the daily rollups
+        trend = AnalysisService.user_time_trend(current_user_id, days=days)
         
         return jsonify({
             'trend': trend,
@@ -178,39 +209,31 @@ def get_time_trend():
 @analysis_bp.route('/stats', methods=['GET'])
 @jwt_required()
 def get_statistics():
-    """Get statistics"""
+    """
+    Get statistics
+
+    recent_7days counts whole UTC days from the daily rollups: documents created on or
+    after recent_7days_since (today minus 7 days), up to one day more than a rolling 7 x 24 hours.
+    """
     current_user_id = get_jwt_identity()
     
-    # Calculate various statistics
-    total_docs = Document.query.filter_by(user_id=current_user_id).count()
-    
-    # Statistics by category
-    from sqlalchemy import func
-    category_stats = db.session.query(
-        Document.category,
-        func.count(Document.id)
-    ).filter_by(user_id=current_user_id).group_by(Document.category).all()
-    
-    # Statistics by source
-    source_stats = db.session.query(
-        Document.source,
-        func.count(Document.id)
-    ).filter_by(user_id=current_user_id).group_by(Document.source).all()
+    # Calculate various statistics (from the daily rollups)
+    total_docs = analytics_query.count_documents(current_user_id)
+    category_stats = AnalysisService.user_category_distribution(current_user_id)
+    source_stats = AnalysisService.user_source_distribution(current_user_id)
     
-    # Recent 7 days
+    # Recent 7 days (whole days, see docstring)
     from datetime import datetime, timedelta
     week_ago = datetime.utcnow() - timedelta(days=7)
-    recent_docs = Document.query.filter(
-        Document.user_id == current_user_id,
-        Document.created_at >= week_ago
-    ).count()
+    recent_docs = analytics_query.count_documents(current_user_id, since=week_ago)
     
     return jsonify({
         'total_documents': total_docs,
         'recent_7days': recent_docs,
-        'category_distribution': dict(category_stats),
-        'source_distribution': dict(source_stats),
-        'index_size': current_app.config['VECTOR_STORE'].get_index_size()
+        'recent_7days_since': week_ago.date().isoformat(),
+        'category_distribution': category_stats,
+        'source_distribution': source_stats,
+        'index_size': current_app.config['VECTOR_STORE'].get_index_size(current_user_id)
     }), 200
 
 
@@ -4,7 +4,8 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
 from models import db, Document
 from services.document_parser import DocumentParser
-from datetime import datetime
+from services import analytics_query
+from datetime import datetime, timedelta
 
 documents_bp = Blueprint('documents', __name__, url_prefix='/api/documents')
 
@@ -13,6 +14,17 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
 
+def time_range_start(time_range):
+    """时间范围筛选的起始时间（UTC），today / 7days / 30days，其他值不筛选"""
+    now = datetime.utcnow()
+    if time_range == 'today':
+        return now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if time_range == '7days':
+        return now - timedelta(days=7)
+    if time_range == '30days':
+        return now - timedelta(days=30)
+    return None
+
 @documents_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_documents():
@@ -40,19 +52,9 @@ def get_documents():
         query = query.filter_by(source=source)
     
     # 按时间范围筛选
-    if time_range:
-        now = datetime.utcnow()
-        if time_range == 'today':
-            start_time = now.replace(hour=0, minute=0, second=0, microsecond=0)
-            query = query.filter(Document.created_at >= start_time)
-        elif time_range == '7days':
-            from datetime import timedelta
-            start_time = now - timedelta(days=7)
-            query = query.filter(Document.created_at >= start_time)
-        elif time_range == '30days':
-            from datetime import timedelta
-            start_time = now - timedelta(days=30)
-            query = query.filter(Document.created_at >= start_time)
+    start_time = time_range_start(time_range)
+    if start_time is not None:
+        query = query.filter(Document.created_at >= start_time)
     
     # 排序
     if sort_by == 'created_at':
@@ -105,6 +107,9 @@ def update_document(doc_id):
     if not document:
         return jsonify({'error': '文档不存在'}), 404
     
+    # 标题参与向量化，变更后需要重新编码
+    reembed = 'title' in data and data['title'] != document.title
+    
     # 更新允许的字段
     if 'title' in data:
         document.title = data['title']
@@ -124,6 +129,10 @@ def update_document(doc_id):
         document.notes = data['notes']
     
     try:
+        if reembed and document.vector_id is not None:
+            vector_store = current_app.config['VECTOR_STORE']
+            vector_store.update_document(document.id, f"{document.title} {document.content}", document.user_id)
+        
         db.session.commit()
         return jsonify({
             'message': '更新成功',
@@ -148,7 +157,7 @@ def delete_document(doc_id):
         # 从向量库中删除
         vector_store = current_app.config['VECTOR_STORE']
         if document.vector_id is not None:
-            vector_store.remove_document(document.id)
+            vector_store.remove_document(document.id, document.user_id)
         
         db.session.delete(document)
         db.session.commit()
@@ -180,11 +189,14 @@ def batch_delete():
             Document.user_id == current_user_id
         ).all()
         
+        # 向量库按ID一次性批量删除
         vector_store = current_app.config['VECTOR_STORE']
+        vector_store.remove_documents(
+            [doc.id for doc in documents if doc.vector_id is not None],
+            current_user_id
+        )
         
         for doc in documents:
-            if doc.vector_id is not None:
-                vector_store.remove_document(doc.id)
             db.session.delete(doc)
         
         db.session.commit()
@@ -229,7 +241,7 @@ def create_document():
         # 添加到向量库
         vector_store = current_app.config['VECTOR_STORE']
         text_for_embedding = f"{document.title} {document.content}"
-        vector_store.add_document(document.id, text_for_embedding)
+        vector_store.add_document(document.id, text_for_embedding, document.user_id)
         
         # 更新vector_id
         document.vector_id = document.id
@@ -294,7 +306,7 @@ def upload_document():
         # 添加到向量库
         vector_store = current_app.config['VECTOR_STORE']
         text_for_embedding = f"{document.title} {document.content}"
-        vector_store.add_document(document.id, text_for_embedding)
+        vector_store.add_document(document.id, text_for_embedding, document.user_id)
         
         # 更新vector_id
         document.vector_id = document.id
@@ -330,6 +342,7 @@ def n8n_webhook():
     try:
         # 支持单个或批量插入
         documents_data = data if isinstance(data, list) else [data]
+        documents = []
         created_docs = []
         
         for doc_data in documents_data:
@@ -352,12 +365,18 @@ def n8n_webhook():
             
             db.session.add(document)
             db.session.flush()  # 获取 ID
-            
-            # 向量化
+            documents.append(document)
+        
+        # 整批文档一次调用向量化（向量库内部按块编码并追加预写日志）
+        if documents:
             vector_store = current_app.config['VECTOR_STORE']
-            text_for_embedding = f"{document.title} {document.content}"
-            vector_store.add_document(document.id, text_for_embedding)
-            
+            vector_store.add_documents(
+                [doc.id for doc in documents],
+                [f"{doc.title} {doc.content}" for doc in documents],
+                n8n_user_id
+            )
+        
+        for document in documents:
             document.vector_id = document.id
             created_docs.append(document.to_dict())
         
@@ -377,6 +396,26 @@ def n8n_webhook():
             'error': f'创建失败：{str(e)}'
         }), 500
 
+@documents_bp.route('/preview', methods=['GET'])
+@jwt_required()
+def preview_documents():
+    """筛选预览：筛选条件下的文档数与各分类、来源的文档数（不加载文档）"""
+    current_user_id = get_jwt_identity()
+    
+    category = request.args.get('category', None)
+    source = request.args.get('source', None)
+    since = time_range_start(request.args.get('time_range', None))  # today, 7days, 30days
+    
+    # 各分类的数量按当前的来源、时间条件计算（选择分类后的结果数），来源同理
+    categories = analytics_query.category_distribution(current_user_id, source=source, since=since)
+    sources = analytics_query.source_distribution(current_user_id, category=category, since=since)
+    
+    return jsonify({
+        'total': analytics_query.count_documents(current_user_id, category=category, source=source, since=since),
+        'categories': {name: count for name, count in categories.items() if name},
+        'sources': {name: count for name, count in sources.items() if name}
+    }), 200
+
 @documents_bp.route('/categories', methods=['GET'])
 @jwt_required()
 def get_categories():
@@ -2,14 +2,58 @@ from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db, Document, SearchHistory
 from services.search_service import WebSearchService, LLMService
+from services.hybrid_search import HybridSearchService
+from services import data_version, segmenter
 from datetime import datetime
 
 search_bp = Blueprint('search', __name__, url_prefix='/api/search')
 
+def hybrid_search_service():
+    """当前应用的知识库混合检索服务"""
+    return HybridSearchService(
+        current_app.config['VECTOR_STORE'],
+        rrf_k=current_app.config['HYBRID_RRF_K'],
+        candidates=current_app.config['HYBRID_CANDIDATES'],
+        keyword_index=current_app.config['KEYWORD_INDEX']
+    )
+
+def cached_search(user_id, endpoint, query, compute, **params):
+    """
+    读取缓存的检索结果，未命中时计算并写入缓存
+
+    Args:
+        user_id: 用户ID
+        endpoint: 接口名（参与缓存键）
+        query: 查询文本或查询文本列表
+        compute: version -> 结果；version 为检索前读取的用户数据版本
+        params: 影响结果的其他参数
+
+    Returns:
+        检索结果（可能来自缓存，调用方不得修改）
+    """
+    version = data_version.current(user_id)
+    cache = current_app.config['SEARCH_CACHE']
+    if cache is None:
+        return compute(version)
+    key = cache.make_key(user_id, endpoint, query, **params)
+    result = cache.get(key, version)
+    if result is None:
+        result = compute(version)
+        cache.put(key, version, result)
+    return result
+
+def knowledge_base_search(user_id, query, limit, min_similarity):
+    """知识库混合检索（带缓存），返回 (关键词列表, 文档字典列表)"""
+    return cached_search(
+        user_id, 'hybrid', query,
+        lambda version: hybrid_search_service().search(query, user_id, limit, min_similarity, version),
+        k=limit, min_similarity=min_similarity
+    )
+
 @search_bp.route('/semantic', methods=['POST'])
 @jwt_required()
 def semantic_search():
-    """全文检索（基于 SQLite）"""
+    """知识库混合检索（向量 + 关键词，倒数排名融合）"""
     current_user_id = get_jwt_identity()
     data = request.get_json()
     
@@ -18,49 +62,10 @@ def semantic_search():
     
     search_query = data['query']
     limit = data.get('k', current_app.config['MAX_SEARCH_RESULTS'])
+    min_similarity = data.get('min_similarity', current_app.config['SIMILARITY_THRESHOLD'])
     
     try:
-        # 使用 jieba 分词提取关键词
-        import jieba
-        keywords = list(jieba.cut_for_search(search_query))
-        # 过滤停用词
-        stopwords = {'的', '了', '是', '在', '有', '和', '与', '及', '或', '等', '啊', '吗', '呢'}
-        keywords = [k for k in keywords if k not in stopwords and len(k) > 1]
-        
-        # 构建 SQL 查询
-        if not keywords:
-            # 如果没有关键词，使用原始查询
-            keywords = [search_query]
-        
-        # 使用 LIKE 进行全文搜索
-        conditions = []
-        for keyword in keywords[:5]:  # 最多使用前5个关键词
-            conditions.append(Document.title.like(f'%{keyword}%'))
-            conditions.append(Document.content.like(f'%{keyword}%'))
-        
-        # 组合查询条件（OR）
-        from sqlalchemy import or_
-        query_filter = or_(*conditions)
-        
-        # 执行查询
-        documents = Document.query.filter_by(user_id=current_user_id)\
-            .filter(query_filter)\
-            .order_by(Document.created_at.desc())\
-            .limit(limit)\
-            .all()
-        
-        # 格式化结果
-        results = []
-        for doc in documents:
-            doc_dict = doc.to_dict()
-            # 计算匹配度（简单统计匹配的关键词数量）
-            match_count = sum(1 for k in keywords if k in doc.title or k in doc.content)
-            doc_dict['match_score'] = match_count / len(keywords) if keywords else 0
-            doc_dict['matched_keywords'] = [k for k in keywords if k in doc.title or k in doc.content]
-            results.append(doc_dict)
-        
-        # 按匹配度排序
-        results.sort(key=lambda x: x['match_score'], reverse=True)
+        keywords, results = knowledge_base_search(current_user_id, search_query, limit, min_similarity)
         
         # 记录搜索历史
         history = SearchHistory(
@@ -77,7 +82,7 @@ def semantic_search():
         
         return jsonify({
             'query': search_query,
-            'keywords': keywords[:5],
+            'keywords': keywords,
             'results': results,
             'count': len(results),
             'trigger_web_search': trigger_web_search
@@ -86,6 +91,163 @@ def semantic_search():
     except Exception as e:
         return jsonify({'error': f'搜索失败：{str(e)}'}), 500
 
+def vector_results(user_id, search_query, limit, min_similarity):
+    """向量检索并回表，返回带相似度与命中片段的文档字典列表"""
+    vector_store = current_app.config['VECTOR_STORE']
+    # 阈值在向量索引内部过滤，低相关文档不会返回，也不会回表查询
+    hits = vector_store.search_range(search_query, user_id, min_similarity, limit, with_passages=True)
+    
+    # 一次IN查询取回命中的文档，按相似度顺序输出
+    documents = {}
+    if hits:
+        documents = {
+            doc.id: doc
+            for doc in Document.query.filter(
+                Document.user_id == user_id,
+                Document.id.in_([doc_id for doc_id, _, _ in hits])
+            ).all()
+        }
+    
+    results = []
+    for doc_id, similarity, chunk_no in hits:
+        doc = documents.get(doc_id)
+        if doc is None:
+            continue
+        doc_dict = doc.to_dict()
+        doc_dict['similarity'] = similarity
+        # 返回命中的片段，片段按与索引时相同的方式切分得到
+        passage = vector_store.chunker.passage(f"{doc.title} {doc.content}", chunk_no)
+        doc_dict['passage'] = passage.text if passage else None
+        results.append(doc_dict)
+    return results
+
+@search_bp.route('/vector', methods=['POST'])
+@jwt_required()
+def vector_search():
+    """向量语义检索（只返回相似度不低于阈值的文档）"""
+    current_user_id = get_jwt_identity()
+    data = request.get_json()
+    
+    if not data or 'query' not in data:
+        return jsonify({'error': '缺少查询内容'}), 400
+    
+    search_query = data['query']
+    limit = data.get('k', current_app.config['MAX_SEARCH_RESULTS'])
+    min_similarity = data.get('min_similarity', current_app.config['SIMILARITY_THRESHOLD'])
+    
+    try:
+        results = cached_search(
+            current_user_id, 'vector', search_query,
+            lambda version: vector_results(current_user_id, search_query, limit, min_similarity),
+            k=limit, min_similarity=min_similarity
+        )
+        
+        # 记录搜索历史
+        history = SearchHistory(
+            user_id=current_user_id,
+            query=search_query,
+            result_count=len(results),
+            search_type='knowledge_base'
+        )
+        db.session.add(history)
+        db.session.commit()
+        
+        return jsonify({
+            'query': search_query,
+            'min_similarity': min_similarity,
+            'results': results,
+            'count': len(results),
+            'trigger_web_search': len(results) < 3
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'搜索失败：{str(e)}'}), 500
+
+def batch_results(user_id, queries, limit):
+    """批量向量检索并回表，返回每个查询的 {query, results, count}"""
+    vector_store = current_app.config['VECTOR_STORE']
+    batch_hits = vector_store.search_batch(queries, user_id, limit, with_passages=True)
+    
+    # 全部查询命中的文档一次IN查询取回
+    hit_ids = {doc_id for hits in batch_hits for doc_id, _, _ in hits}
+    documents = {}
+    if hit_ids:
+        documents = {
+            doc.id: doc
+            for doc in Document.query.filter(
+                Document.user_id == user_id,
+                Document.id.in_(hit_ids)
+            ).all()
+        }
+    
+    # 同一片段可能被多个查询命中，只切分一次
+    passages = {}
+    results = []
+    for search_query, hits in zip(queries, batch_hits):
+        query_results = []
+        for doc_id, similarity, chunk_no in hits:
+            doc = documents.get(doc_id)
+            if doc is None:
+                continue
+            doc_dict = doc.to_dict()
+            doc_dict['similarity'] = similarity
+            if (doc_id, chunk_no) not in passages:
+                passage = vector_store.chunker.passage(f"{doc.title} {doc.content}", chunk_no)
+                passages[doc_id, chunk_no] = passage.text if passage else None
+            doc_dict['passage'] = passages[doc_id, chunk_no]
+            query_results.append(doc_dict)
+        results.append({
+            'query': search_query,
+            'results': query_results,
+            'count': len(query_results)
+        })
+    return results
+
+@search_bp.route('/batch', methods=['POST'])
+@jwt_required()
+def batch_search():
+    """批量向量检索（多个查询一次编码、一次检索，按查询分别返回结果）"""
+    current_user_id = get_jwt_identity()
+    data = request.get_json()
+    
+    if not data or not isinstance(data.get('queries'), list) or not data['queries']:
+        return jsonify({'error': '缺少查询列表'}), 400
+    
+    queries = data['queries']
+    if not all(isinstance(query, str) and query.strip() for query in queries):
+        return jsonify({'error': '查询内容不能为空'}), 400
+    max_queries = current_app.config['SEARCH_BATCH_MAX_QUERIES']
+    if len(queries) > max_queries:
+        return jsonify({'error': f'单次最多{max_queries}个查询'}), 400
+    limit = data.get('k', current_app.config['MAX_SEARCH_RESULTS'])
+    
+    try:
+        results = cached_search(
+            current_user_id, 'batch', queries,
+            lambda version: batch_results(current_user_id, queries, limit),
+            k=limit
+        )
+        
+        # 记录搜索历史（一次提交）
+        db.session.add_all([
+            SearchHistory(
+                user_id=current_user_id,
+                query=item['query'],
+                result_count=item['count'],
+                search_type='knowledge_base'
+            )
+            for item in results
+        ])
+        db.session.commit()
+        
+        return jsonify({
+            'results': results,
+            'count': len(results)
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'搜索失败：{str(e)}'}), 500
+
 @search_bp.route('/web', methods=['POST'])
 @jwt_required()
 def web_search():
@@ -145,47 +307,13 @@ def combined_search():
     limit = data.get('k', current_app.config['MAX_SEARCH_RESULTS'])
     
     try:
-        # 1. 先从知识库搜索（SQLite 全文搜索）
-        import jieba
-        from sqlalchemy import or_
-        
-        keywords = list(jieba.cut_for_search(search_query))
-        stopwords = {'的', '了', '是', '在', '有', '和', '与', '及', '或', '等', '啊', '吗', '呢'}
-        keywords = [k for k in keywords if k not in stopwords and len(k) > 1]
-        
-        if not keywords:
-            keywords = [search_query]
-        
-        # 构建搜索条件
-        conditions = []
-        for keyword in keywords[:5]:
-            conditions.append(Document.title.like(f'%{keyword}%'))
-            conditions.append(Document.content.like(f'%{keyword}%'))
-        
-        query_filter = or_(*conditions)
-        
-        # 执行查询
-        documents = Document.query.filter_by(user_id=current_user_id)\
-            .filter(query_filter)\
-            .order_by(Document.created_at.desc())\
-            .limit(limit)\
-            .all()
-        
-        # 格式化结果
-        kb_results = []
-        for doc in documents:
-            doc_dict = doc.to_dict()
-            match_count = sum(1 for k in keywords if k in doc.title or k in doc.content)
-            doc_dict['match_score'] = match_count / len(keywords) if keywords else 0
-            doc_dict['matched_keywords'] = [k for k in keywords if k in doc.title or k in doc.content]
-            kb_results.append(doc_dict)
-        
-        # 按匹配度排序
-        kb_results.sort(key=lambda x: x['match_score'], reverse=True)
+        # 1. 先从知识库搜索（向量 + 关键词混合检索）
+        min_similarity = data.get('min_similarity', current_app.config['SIMILARITY_THRESHOLD'])
+        keywords, kb_results = knowledge_base_search(current_user_id, search_query, limit, min_similarity)
         
         response_data = {
             'query': search_query,
-            'keywords': keywords[:5],
+            'keywords': keywords,
             'knowledge_base_results': kb_results,
             'kb_count': len(kb_results),
             'web_search_triggered': False
@@ -271,4 +399,11 @@ def delete_search_history(history_id):
         db.session.rollback()
         return jsonify({'error': f'删除失败：{str(e)}'}), 500
 
-
+@search_bp.route('/cache/stats', methods=['GET'])
+@jwt_required()
+def search_cache_stats():
+    """检索结果缓存与查询分词缓存的命中统计（本进程）"""
+    cache = current_app.config['SEARCH_CACHE']
+    stats = dict(cache.stats(), enabled=True) if cache is not None else {'enabled': False}
+    stats['query_segmentation'] = segmenter.memo_info()
+    return jsonify(stats), 200
@@ -1,169 +1,146 @@
-import jieba
-import jieba.analyse
 from collections import Counter
-from typing import List, Dict
+from typing import Callable, Iterable, List, Dict, Optional
 from datetime import datetime, timedelta
+from services import analytics_query, keyword_engine
+from services.enrichment import tfidf_keywords
 
 class AnalysisService:
     """数据分析服务"""
     
     @staticmethod
-    def extract_keywords(texts: List[str], topK: int = 10) -> List[Dict[str, any]]:
+    def extract_keywords(texts: Iterable[str], topK: int = 10) -> List[Dict[str, any]]:
         """
-        提取关键词
+        提取关键词（对文本当场分词；已入库文档使用预计算词频，见 keywords_from_counts）
+        
+        文本按块流式统计（见 services/keyword_engine.py），不拼接、不保留全部分词结果；
+        IDF按合并后的文档频率调整（见 enrichment.tfidf_keywords）。
         
         Args:
-            texts: 文本列表
+            texts: 文本列表或生成器
             topK: 返回top K个关键词
             
         Returns:
-            [{'keyword': str, 'count': int, 'weight': float}, ...]
+            [{'keyword': str, 'count': int, 'weight': float, 'documents': int}, ...]，documents 为包含该词的文本数
         """
-        if not texts:
-            return []
-        
-        # 合并所有文本
-        combined_text = ' '.join(texts)
-        
-        # 使用jieba的TF-IDF提取关键词
-        keywords_with_weight = jieba.analyse.extract_tags(
-            combined_text,
-            topK=topK,
-            withWeight=True
-        )
-        
-        # 统计每个关键词的出现次数
-        all_words = []
-        for text in texts:
-            words = jieba.cut(text)
-            all_words.extend(words)
-        
-        word_counter = Counter(all_words)
+        term_frequency, document_frequency, count = keyword_engine.term_statistics(texts)
+        keywords = AnalysisService.keywords_from_counts(term_frequency, topK, document_frequency, count)
+        for item in keywords:
+            item['documents'] = document_frequency[item['keyword']]
+        return keywords
+    
+    @staticmethod
+    def keywords_from_counts(term_counts: Dict[str, int], topK: int = 10,
+                             document_frequency: Optional[Dict[str, int]] = None,
+                             documents: int = 0) -> List[Dict[str, any]]:
+        """
+        由词频提取关键词（TF-IDF权重与 jieba.analyse.extract_tags 相同）
         
-        # 构建结果
+        Args:
+            term_counts: {词: 出现次数}，如入库时预计算的文档词频之和
+            topK: 返回top K个关键词
+            document_frequency: {词: 包含该词的文本数}，给出时按文档频率调整IDF
+            documents: 文本数
+            
+        Returns:
+            [{'keyword': str, 'count': int, 'weight': float}, ...]
+        """
         results = []
-        for keyword, weight in keywords_with_weight:
+        for keyword, weight in tfidf_keywords(term_counts, topK, document_frequency, documents):
             results.append({
                 'keyword': keyword,
-                'count': word_counter.get(keyword, 0),
+                'count': term_counts.get(keyword, 0),
                 'weight': float(weight)
             })
         
         return results
     
     @staticmethod
-    def analyze_category_distribution(documents: List[Dict]) -> Dict[str, int]:
+    def _label_missing(distribution: Dict[Optional[str], int], label: str) -> Dict[str, int]:
+        """空值分组并入指定名称（JSON对象的键不能为空）"""
+        labeled = Counter()
+        for value, count in distribution.items():
+            labeled[value or label] += count
+        return dict(labeled)
+    
+    @staticmethod
+    def user_category_distribution(user_id: int, since: Optional[datetime] = None) -> Dict[str, int]:
         """
-        分析分类分布
+        用户文档的分类分布（读取按日汇总表）
         
         Args:
-            documents: 文档列表
+            user_id: 用户ID
+            since: 只统计该日期及之后的文档
             
         Returns:
-            {'category': count, ...}
+            {'category': count, ...}，未设置分类的文档计入 '未分类'
         """
-        categories = [doc.get('category', '未分类') for doc in documents]
-        return dict(Counter(categories))
+        return AnalysisService._label_missing(analytics_query.category_distribution(user_id, since=since), '未分类')
     
     @staticmethod
-    def analyze_source_distribution(documents: List[Dict]) -> Dict[str, int]:
+    def user_source_distribution(user_id: int, since: Optional[datetime] = None) -> Dict[str, int]:
         """
-        分析来源分布
+        用户文档的来源分布（读取按日汇总表）
         
         Args:
-            documents: 文档列表
+            user_id: 用户ID
+            since: 只统计该日期及之后的文档
             
         Returns:
-            {'source': count, ...}
+            {'source': count, ...}，未设置来源的文档计入 '未知'
         """
-        sources = [doc.get('source', '未知') for doc in documents]
-        return dict(Counter(sources))
+        return AnalysisService._label_missing(analytics_query.source_distribution(user_id, since=since), '未知')
     
     @staticmethod
-    def analyze_time_trend(documents: List[Dict], days: int = 7) -> Dict[str, int]:
+    def user_time_trend(user_id: int, days: int = 7) -> Dict[str, int]:
         """
-        分析时间趋势
+        用户最近N天的时间趋势（读取按日汇总表，起始日当天的文档全部计入）
         
         Args:
-            documents: 文档列表
+            user_id: 用户ID
             days: 统计最近N天
             
         Returns:
             {'date': count, ...}
         """
-        # 计算日期范围
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=days)
-        
-        # 按日期统计
-        date_counter = Counter()
-        
-        for doc in documents:
-            created_at = doc.get('created_at')
-            if created_at:
-                # 解析ISO格式日期
-                if isinstance(created_at, str):
-                    doc_date = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                else:
-                    doc_date = created_at
-                
-                if start_date <= doc_date <= end_date:
-                    date_str = doc_date.strftime('%Y-%m-%d')
-                    date_counter[date_str] += 1
-        
-        return dict(date_counter)
+        return analytics_query.daily_counts(user_id, since=start_date, until=end_date)
     
     @staticmethod
-    def generate_summary_report(documents: List[Dict], time_range: str = 'all') -> Dict:
+    def user_summary_report(user_id: int, time_range: str = 'all',
+                            progress: Optional[Callable[[str, float], None]] = None) -> Dict:
         """
-        生成综合分析报告
+        生成用户的综合分析报告（全部读取按日汇总表，不加载文档）
         
         Args:
-            documents: 文档列表
-            time_range: 时间范围 (7days, 30days, all)
+            user_id: 用户ID
+            time_range: 时间范围 (7days, 30days, all)，按日期计算，起始日当天的文档全部计入
+            progress: (阶段名, 完成比例) 回调，每完成一个部分调用一次（后台报告任务用于汇报进度）
             
         Returns:
-            完整的分析报告
+            {'time_range', 'generated_at', 'total_documents', 'top_keywords',
+             'category_distribution', 'source_distribution'}，限定时间范围时另含 'time_trend'
         """
-        # 根据时间范围过滤文档
-        if time_range == '7days':
-            cutoff_date = datetime.utcnow() - timedelta(days=7)
-            filtered_docs = [
-                doc for doc in documents
-                if datetime.fromisoformat(doc['created_at'].replace('Z', '+00:00')) >= cutoff_date
-            ]
-        elif time_range == '30days':
-            cutoff_date = datetime.utcnow() - timedelta(days=30)
-            filtered_docs = [
-                doc for doc in documents
-                if datetime.fromisoformat(doc['created_at'].replace('Z', '+00:00')) >= cutoff_date
-            ]
-        else:
-            filtered_docs = documents
-        
-        # 提取所有文本内容
-        texts = []
-        for doc in filtered_docs:
-            title = doc.get('title', '')
-            summary = doc.get('summary', '')
-            content = doc.get('content', '')
-            texts.append(f"{title} {summary} {content}")
+        days = {'7days': 7, '30days': 30}.get(time_range)
+        since = datetime.utcnow() - timedelta(days=days) if days else None
+        
+        sections = [
+            ('total_documents', lambda: analytics_query.count_documents(user_id, since=since)),
+            ('top_keywords', lambda: AnalysisService.keywords_from_counts(
+                analytics_query.term_counts(user_id, since=since), topK=10)),
+            ('category_distribution', lambda: AnalysisService.user_category_distribution(user_id, since=since)),
+            ('source_distribution', lambda: AnalysisService.user_source_distribution(user_id, since=since)),
+        ]
+        if days:
+            sections.append(('time_trend', lambda: AnalysisService.user_time_trend(user_id, days=days)))
         
-        # 生成报告
         report = {
-            'total_documents': len(filtered_docs),
             'time_range': time_range,
             'generated_at': datetime.utcnow().isoformat(),
-            'top_keywords': AnalysisService.extract_keywords(texts, topK=10),
-            'category_distribution': AnalysisService.analyze_category_distribution(filtered_docs),
-            'source_distribution': AnalysisService.analyze_source_distribution(filtered_docs),
         }
-        
-        # 如果是限定时间范围，添加时间趋势
-        if time_range in ['7days', '30days']:
-            days = 7 if time_range == '7days' else 30
-            report['time_trend'] = AnalysisService.analyze_time_trend(filtered_docs, days=days)
+        for done, (name, compute) in enumerate(sections, 1):
+            report[name] = compute()
+            if progress:
+                progress(name, done / len(sections))
         
         return report
-
-
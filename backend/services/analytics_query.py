@@ -0,0 +1,116 @@
+from datetime import date, datetime
+from typing import Dict, List, Optional
+from sqlalchemy import func
+from models import db, DailyDocumentRollup, DailyTermRollup
+from services import metadata_snapshot
+
+# 分析接口的聚合查询：读取按日汇总表（见 services/rollups.py）并在数据库中分组求和，
+# 耗时与内存与天数、分组数成正比，与文档数量和正文大小无关。
+# 时间条件按日期（UTC）比较：since 当天的文档全部计入。
+#
+# 启用元数据缓存（METADATA_CACHE_MAX_USERS）时，文档数、分布与按日趋势改由内存中的列式快照
+# （见 services/metadata_snapshot.py）计算，时间条件同样按日期比较，结果与汇总表一致；词频始终读取汇总表。
+
+
+def _conditions(model, user_id: int, category: Optional[str] = None, source: Optional[str] = None,
+                since: Optional[datetime] = None, until: Optional[datetime] = None) -> List:
+    """汇总行筛选条件"""
+    conditions = [model.user_id == int(user_id)]
+    if category:
+        conditions.append(model.category == category)
+    if source:
+        conditions.append(model.source == source)
+    if since is not None:
+        conditions.append(model.day >= since.date())
+    if until is not None:
+        conditions.append(model.day <= until.date())
+    return conditions
+
+
+def count_documents(user_id: int, **filters) -> int:
+    """
+    文档数量
+
+    Args:
+        user_id: 用户ID
+        filters: category / source / since / until
+    """
+    snapshot = metadata_snapshot.current(user_id)
+    if snapshot is not None:
+        return snapshot.count(**filters)
+    total = db.session.query(func.sum(DailyDocumentRollup.doc_count))\
+        .filter(*_conditions(DailyDocumentRollup, user_id, **filters)).scalar()
+    return int(total or 0)
+
+
+def count_by(column, user_id: int, **filters) -> Dict:
+    """
+    按汇总列分组求和
+
+    Args:
+        column: 分组列，DailyDocumentRollup.category 或 DailyDocumentRollup.source
+        user_id: 用户ID
+        filters: category / source / since / until
+
+    Returns:
+        {列值: 文档数}，列为空的文档计入 None
+    """
+    rows = db.session.query(column, func.sum(DailyDocumentRollup.doc_count))\
+        .filter(*_conditions(DailyDocumentRollup, user_id, **filters))\
+        .group_by(column)
+    return {value or None: int(count) for value, count in rows.all()}
+
+
+def category_distribution(user_id: int, **filters) -> Dict[Optional[str], int]:
+    """分类分布"""
+    snapshot = metadata_snapshot.current(user_id)
+    if snapshot is not None:
+        return snapshot.distribution('category', **filters)
+    return count_by(DailyDocumentRollup.category, user_id, **filters)
+
+
+def source_distribution(user_id: int, **filters) -> Dict[Optional[str], int]:
+    """来源分布"""
+    snapshot = metadata_snapshot.current(user_id)
+    if snapshot is not None:
+        return snapshot.distribution('source', **filters)
+    return count_by(DailyDocumentRollup.source, user_id, **filters)
+
+
+def daily_counts(user_id: int, since: datetime, until: datetime, **filters) -> Dict[str, int]:
+    """
+    按日期统计新增文档数（UTC）
+
+    Args:
+        user_id: 用户ID
+        since: 起始时间（按日期，含当天）
+        until: 结束时间（按日期，含当天）
+        filters: category / source
+
+    Returns:
+        {'YYYY-MM-DD': 文档数}，没有文档的日期不出现
+    """
+    snapshot = metadata_snapshot.current(user_id)
+    if snapshot is not None:
+        return snapshot.daily_counts(since=since, until=until, **filters)
+    rows = db.session.query(DailyDocumentRollup.day, func.sum(DailyDocumentRollup.doc_count))\
+        .filter(*_conditions(DailyDocumentRollup, user_id, since=since, until=until, **filters))\
+        .group_by(DailyDocumentRollup.day)
+    return {day.isoformat() if isinstance(day, date) else str(day): int(count) for day, count in rows.all()}
+
+
+def term_counts(user_id: int, **filters) -> Dict[str, int]:
+    """
+    词频之和（入库时统计的两个字符以上的词）
+
+    Args:
+        user_id: 用户ID
+        filters: category / since / until
+
+    Returns:
+        {词: 出现次数}
+    """
+    rows = db.session.query(DailyTermRollup.term, func.sum(DailyTermRollup.count))\
+        .filter(*_conditions(DailyTermRollup, user_id, **filters))\
+        .group_by(DailyTermRollup.term)
+    return {term: int(count) for term, count in rows.all()}
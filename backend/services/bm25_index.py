@@ -0,0 +1,477 @@
+import re
+import threading
+import numpy as np
+import scipy.sparse as sp
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session
+from models import db, Document
+from services import data_version, fulltext_index, segmenter
+
+# 增量（合并后新增的文档 + 已删除的文档）达到 max(MERGE_THRESHOLD, 基础文档数 * MERGE_RATIO) 时合并为新的基础矩阵
+MERGE_THRESHOLD = 1024
+MERGE_RATIO = 0.02
+
+# 单次查询最多使用的词数（命中词以位掩码记录）
+MAX_QUERY_TERMS = 32
+
+# 参与索引的词：至少含一个字母、数字或汉字（去掉标点与空白）
+WORD = re.compile(r'[0-9A-Za-z㐀-鿿]')
+
+
+def tokenize(text: str) -> List[str]:
+    """搜索引擎模式分词，去掉标点与空白，英文转小写"""
+    return [word.lower() for word in segmenter.cut_for_search(text) if WORD.search(word)]
+
+
+def _grown(array: np.ndarray, size: int) -> np.ndarray:
+    """容量不足时按倍数扩容"""
+    if size <= len(array):
+        return array
+    grown = np.zeros(max(size, 2 * len(array), 64), dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+def _pad_columns(matrix: sp.csc_matrix, columns: int) -> sp.csc_matrix:
+    """按列存储的矩阵补齐新词的空列"""
+    if matrix.shape[1] == columns:
+        return matrix
+    indptr = np.concatenate([matrix.indptr, np.full(columns - matrix.shape[1], matrix.indptr[-1])])
+    return sp.csc_matrix((matrix.data, matrix.indices, indptr), shape=(matrix.shape[0], columns))
+
+
+class BM25Index:
+    """
+    单个语料（一个用户的文档）的内存BM25倒排索引
+
+    词频以 文档槽位 × 词 的稀疏矩阵按列（CSC）存储，每一列即一个词的倒排表。
+    查询只切出查询词的列，按槽位 bincount 累加得分，整个候选集一次向量化计算。
+
+    新增文档先记入增量矩阵，删除只清除有效标记；增量达到阈值时合并为新的基础矩阵。
+    文档频率在合并前不扣除已删除的文档（与Lucene相同），文档数与平均长度始终精确。
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """
+        Args:
+            k1: 词频饱和参数
+            b: 文档长度归一化参数
+        """
+        self.k1 = k1
+        self.b = b
+        self.vocabulary: Dict[str, int] = {}
+        self.df = np.zeros(0, dtype='int64')
+        self.slot_of: Dict[int, int] = {}
+        self.doc_ids = np.zeros(0, dtype='int64')
+        self.doc_len = np.zeros(0, dtype='float32')
+        self.live = np.zeros(0, dtype=bool)
+        self.slots = 0
+        self.base = sp.csc_matrix((0, 0), dtype='float32')
+        self.base_slots = 0
+        self.delta: List[Tuple[np.ndarray, np.ndarray]] = []
+        self._delta_matrix: Optional[sp.csc_matrix] = None
+        self.deleted = 0
+        self.total_len = 0.0
+        self.lock = threading.RLock()
+
+    @property
+    def size(self) -> int:
+        """有效文档数量"""
+        return len(self.slot_of)
+
+    @property
+    def pending(self) -> int:
+        """尚未合并的增量大小"""
+        return len(self.delta) + self.deleted
+
+    def _term_ids(self, tokens: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """文档的 (词ID数组, 词频数组)，新词加入词表"""
+        ids = []
+        for token in tokens:
+            term_id = self.vocabulary.get(token)
+            if term_id is None:
+                term_id = self.vocabulary[token] = len(self.vocabulary)
+            ids.append(term_id)
+        self.df = _grown(self.df, len(self.vocabulary))
+        return np.unique(np.array(ids, dtype='int64'), return_counts=True)
+
+    def _append(self, doc_id: int, tokens: List[str]):
+        """新文档占用一个槽位，词频记入增量"""
+        self._remove(doc_id)
+        terms, counts = self._term_ids(tokens)
+        slot = self.slots
+        self.slots += 1
+        self.doc_ids = _grown(self.doc_ids, self.slots)
+        self.doc_len = _grown(self.doc_len, self.slots)
+        self.live = _grown(self.live, self.slots)
+        self.doc_ids[slot] = doc_id
+        self.doc_len[slot] = len(tokens)
+        self.live[slot] = True
+        self.slot_of[doc_id] = slot
+        self.df[terms] += 1
+        self.total_len += len(tokens)
+        self.delta.append((terms, counts.astype('float32')))
+        self._delta_matrix = None
+
+    def add(self, doc_id: int, tokens: List[str]):
+        """写入（覆盖）文档"""
+        with self.lock:
+            self._append(doc_id, tokens)
+            self._maybe_merge()
+
+    def add_many(self, documents: Iterable[Tuple[int, List[str]]]):
+        """批量写入后一次合并（加载整个语料时使用）"""
+        with self.lock:
+            for doc_id, tokens in documents:
+                self._append(doc_id, tokens)
+            self._merge()
+
+    def _remove(self, doc_id: int) -> bool:
+        slot = self.slot_of.pop(doc_id, None)
+        if slot is None:
+            return False
+        self.live[slot] = False
+        self.total_len -= float(self.doc_len[slot])
+        self.deleted += 1
+        return True
+
+    def remove(self, doc_id: int) -> bool:
+        """删除文档，返回文档原先是否在索引中"""
+        with self.lock:
+            removed = self._remove(doc_id)
+            self._maybe_merge()
+            return removed
+
+    def _maybe_merge(self):
+        if self.pending >= max(MERGE_THRESHOLD, self.base_slots * MERGE_RATIO):
+            self._merge()
+
+    def _delta(self) -> sp.csc_matrix:
+        """增量文档的词频矩阵（行号为 槽位 - base_slots），查询时按需构建并缓存"""
+        if self._delta_matrix is None:
+            columns = len(self.vocabulary)
+            if self.delta:
+                indices = np.concatenate([terms for terms, _ in self.delta])
+                data = np.concatenate([counts for _, counts in self.delta])
+                indptr = np.concatenate([[0], np.cumsum([len(terms) for terms, _ in self.delta])])
+                matrix = sp.csr_matrix((data, indices, indptr), shape=(len(self.delta), columns))
+            else:
+                matrix = sp.csr_matrix((0, columns), dtype='float32')
+            self._delta_matrix = matrix.tocsc()
+        return self._delta_matrix
+
+    def _merge(self):
+        """基础矩阵与增量合并，去掉已删除的槽位并重新编号"""
+        columns = len(self.vocabulary)
+        full = sp.vstack([_pad_columns(self.base, columns), self._delta()], format='csr')
+        keep = np.flatnonzero(self.live[:self.slots])
+        full = full[keep].tocsc()
+        full.sort_indices()
+
+        self.base = full
+        self.base_slots = self.slots = len(keep)
+        self.doc_ids = self.doc_ids[keep]
+        self.doc_len = self.doc_len[keep]
+        self.live = np.ones(len(keep), dtype=bool)
+        self.slot_of = {int(doc_id): slot for slot, doc_id in enumerate(self.doc_ids)}
+        self.df = np.diff(full.indptr).astype('int64')
+        self.delta = []
+        self._delta_matrix = None
+        self.deleted = 0
+
+    @staticmethod
+    def _postings(matrix: sp.csc_matrix, term_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        直接按列指针切出查询词的倒排表（比稀疏矩阵的列索引快一个数量级）
+
+        Returns:
+            (槽位数组, 查询词序号数组, 词频数组)
+        """
+        indptr = matrix.indptr
+        present = term_ids < matrix.shape[1]  # 合并后出现的新词不在基础矩阵中
+        spans = [(indptr[term_id], indptr[term_id + 1]) for term_id in term_ids[present]]
+        if not spans:
+            empty = np.zeros(0, dtype='int64')
+            return empty, empty, np.zeros(0, dtype='float32')
+        rows = np.concatenate([matrix.indices[start:end] for start, end in spans])
+        tf = np.concatenate([matrix.data[start:end] for start, end in spans])
+        which = np.repeat(np.flatnonzero(present), [end - start for start, end in spans])
+        return rows, which, tf
+
+    def _score(self, terms: List[str], with_masks: bool = False) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+        """
+        对全部槽位计算BM25得分
+
+        Args:
+            terms: 查询词
+            with_masks: 是否同时计算命中词位掩码
+
+        Returns:
+            (得分数组, 命中词位掩码数组（未计算时为None）, 实际使用的查询词)，均以槽位为下标
+        """
+        terms = [term for term in dict.fromkeys(term.lower() for term in terms) if term in self.vocabulary]
+        terms = terms[:MAX_QUERY_TERMS]
+        scores = np.zeros(self.slots, dtype='float64')
+        masks = np.zeros(self.slots, dtype='int64') if with_masks else None
+        if not terms or not self.slot_of:
+            return scores, masks, terms
+
+        term_ids = np.array([self.vocabulary[term] for term in terms], dtype='int64')
+        count = len(self.slot_of)
+        df = self.df[term_ids]
+        idf = np.log1p((np.maximum(count - df, 0) + 0.5) / (df + 0.5))
+        avgdl = self.total_len / count if self.total_len > 0 else 1.0
+
+        for matrix, offset in ((self.base, 0), (self._delta(), self.base_slots)):
+            if matrix.nnz == 0:
+                continue
+            rows, which, tf = self._postings(matrix, term_ids)
+            rows = rows + offset
+            norm = self.k1 * (1 - self.b + self.b * self.doc_len[rows] / avgdl)
+            weights = idf[which] * tf * (self.k1 + 1) / (tf + norm)
+            scores += np.bincount(rows, weights=weights, minlength=self.slots)
+            if with_masks:
+                # 同一槽位的各词位互不重叠，求和即按位或
+                masks += np.bincount(rows, weights=np.left_shift(1, which), minlength=self.slots).astype('int64')
+
+        dead = ~self.live[:self.slots]
+        scores[dead] = 0.0
+        if with_masks:
+            masks[dead] = 0
+        return scores, masks, terms
+
+    def search(self, terms: List[str], limit: int) -> List[Tuple[int, float]]:
+        """
+        检索
+
+        Args:
+            terms: 查询词（已分词）
+            limit: 返回数量
+
+        Returns:
+            [(doc_id, bm25_score), ...]，按得分从高到低排列
+        """
+        with self.lock:
+            scores, _, _ = self._score(terms)
+            hits = np.flatnonzero(scores)
+            if len(hits) > limit:
+                hits = hits[np.argpartition(-scores[hits], limit - 1)[:limit]]
+            hits = hits[np.argsort(-scores[hits], kind='stable')]
+            return [(int(self.doc_ids[slot]), float(scores[slot])) for slot in hits]
+
+    def explain(self, terms: List[str], doc_ids: Iterable[int]) -> Dict[int, Tuple[float, List[str]]]:
+        """
+        给定文档的BM25得分与命中的查询词
+
+        Returns:
+            {doc_id: (bm25_score, [命中的查询词])}；不在索引中的文档得分为0、无命中词
+        """
+        with self.lock:
+            scores, masks, used = self._score(terms, with_masks=True)
+            explained = {}
+            for doc_id in doc_ids:
+                slot = self.slot_of.get(doc_id)
+                if slot is None:
+                    explained[doc_id] = (0.0, [])
+                    continue
+                mask = int(masks[slot])
+                explained[doc_id] = (float(scores[slot]), [term for i, term in enumerate(used) if mask >> i & 1])
+            return explained
+
+
+class KeywordIndex:
+    """
+    按用户懒加载的BM25索引
+
+    首次检索某用户时由 loader 读取该用户全部文档的词构建索引，超过 max_loaded_users 时按LRU淘汰。
+    文档写入提交后由 apply 增量更新已加载的索引；构建期间到达的变更先暂存，构建完成后重放。
+
+    每个索引记录它反映的用户数据版本。本进程提交的写入连续推进版本；
+    检索时传入的当前版本更新（其他worker进程写入过）时丢弃索引重新构建。
+    """
+
+    def __init__(self, loader: Callable[[int], Iterable[Tuple[int, List[str]]]],
+                 max_loaded_users: int = 64, k1: float = 1.5, b: float = 0.75):
+        """
+        Args:
+            loader: user_id -> [(doc_id, tokens), ...]
+            max_loaded_users: 内存中最多保留的用户索引数量
+            k1: BM25词频饱和参数
+            b: BM25文档长度归一化参数
+        """
+        self.loader = loader
+        self.max_loaded_users = max_loaded_users
+        self.k1 = k1
+        self.b = b
+        self._indexes: "OrderedDict[int, BM25Index]" = OrderedDict()
+        self._versions: Dict[int, int] = {}
+        self._building: Dict[int, List[tuple]] = {}
+        self._built: Dict[int, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, version: Optional[int] = None) -> BM25Index:
+        """
+        获取用户索引，未加载或已过期时构建
+
+        Args:
+            user_id: 用户ID
+            version: 用户当前的数据版本（构建前读取）；为空时不检查是否过期
+        """
+        user_id = int(user_id)
+        while True:
+            with self._lock:
+                index = self._indexes.get(user_id)
+                if index is not None and (version is None or self._versions[user_id] >= version):
+                    self._indexes.move_to_end(user_id)
+                    return index
+                if user_id in self._building:
+                    built = self._built[user_id]
+                else:
+                    self._indexes.pop(user_id, None)
+                    self._building[user_id] = []
+                    self._built[user_id] = built = threading.Event()
+                    break
+            # 其他线程正在构建同一用户的索引
+            built.wait()
+
+        try:
+            index = BM25Index(self.k1, self.b)
+            index.add_many(self.loader(user_id))
+        except Exception:
+            with self._lock:
+                self._building.pop(user_id)
+                self._built.pop(user_id).set()
+            raise
+
+        with self._lock:
+            # 读取语料前的版本；语料可能已包含之后提交的写入，重放这些写入是幂等的
+            self._versions[user_id] = version or 0
+            for changes, transition in self._building.pop(user_id):
+                self._apply(user_id, index, changes, transition)
+            self._indexes[user_id] = index
+            while len(self._indexes) > self.max_loaded_users:
+                cold, _ = self._indexes.popitem(last=False)
+                self._versions.pop(cold, None)
+            self._built.pop(user_id).set()
+        return index
+
+    def _apply(self, user_id: int, index: BM25Index, changes: List[Tuple[int, Optional[List[str]]]],
+               transition: Optional[Tuple[int, int]]):
+        for doc_id, tokens in changes:
+            if tokens is None:
+                index.remove(doc_id)
+            else:
+                index.add(doc_id, tokens)
+        # 版本连续时推进；中间有其他进程的写入则保持原版本，下次检索时重新构建
+        if transition is not None and self._versions.get(user_id) == transition[0]:
+            self._versions[user_id] = transition[1]
+
+    def apply(self, changes: Iterable[Tuple[int, int, Optional[str]]],
+              versions: Optional[Dict[int, Tuple[int, int]]] = None):
+        """
+        应用已提交的文档变更
+
+        Args:
+            changes: [(user_id, doc_id, 文本), ...]，文本为 None 表示删除；只处理已加载或正在构建的用户
+            versions: 本次提交中各用户的版本变化 {user_id: (提交前版本, 提交后版本)}
+        """
+        versions = versions or {}
+        with self._lock:
+            users = set(self._indexes) | set(self._building)
+        by_user: Dict[int, List[Tuple[int, Optional[List[str]]]]] = {}
+        # 分词较慢，不占用锁；其间被淘汰的索引下次会从数据库重新构建，不会漏掉本次变更
+        for user_id, doc_id, text in changes:
+            if int(user_id) in users:
+                by_user.setdefault(int(user_id), []).append((int(doc_id), None if text is None else tokenize(text)))
+        with self._lock:
+            for user_id in set(by_user) | (set(versions) & users):
+                transition = versions.get(user_id)
+                index = self._indexes.get(user_id)
+                if index is not None:
+                    self._apply(user_id, index, by_user.get(user_id, []), transition)
+                elif user_id in self._building:
+                    self._building[user_id].append((by_user.get(user_id, []), transition))
+
+    def evict(self, user_id: int):
+        """丢弃用户索引，下次检索时重新构建"""
+        with self._lock:
+            self._indexes.pop(int(user_id), None)
+            self._versions.pop(int(user_id), None)
+
+    def loaded_users(self) -> List[int]:
+        """当前驻留内存的用户（由冷到热）"""
+        with self._lock:
+            return list(self._indexes)
+
+    def search(self, user_id: int, terms: List[str], limit: int,
+               version: Optional[int] = None) -> List[Tuple[int, float]]:
+        return self.get(user_id, version).search(terms, limit)
+
+    def explain(self, user_id: int, terms: List[str], doc_ids: Iterable[int],
+                version: Optional[int] = None) -> Dict[int, Tuple[float, List[str]]]:
+        return self.get(user_id, version).explain(terms, doc_ids)
+
+
+def load_user_tokens(user_id: int) -> Iterator[Tuple[int, List[str]]]:
+    """
+    读取用户全部文档的词（KeywordIndex 的 loader，需在应用上下文中调用）
+
+    已建全文索引时直接读取其中预先分词的文本，不再重新分词。
+    """
+    if fulltext_index.is_available(db.session.connection()):
+        table = fulltext_index.FTS_TABLE
+        rows = db.session.execute(
+            text(f"SELECT rowid, title, content FROM {table} WHERE {table} MATCH :owner"),
+            {'owner': fulltext_index.owner_expression(user_id)}
+        )
+        for doc_id, title, content in rows:
+            yield doc_id, [word.lower() for word in f'{title} {content}'.split() if WORD.search(word)]
+        return
+    rows = Document.query.with_entities(Document.id, Document.title, Document.content)\
+        .filter(Document.user_id == user_id)\
+        .yield_per(500)
+    for doc_id, title, content in rows:
+        yield doc_id, tokenize(f'{title} {content}')
+
+
+# 文档变更在 flush 时记录到会话，提交后才更新内存索引（回滚的写入不会进入索引）
+_CHANGES = 'keyword_index_changes'
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_changes(session, flush_context):
+    changes = session.info.setdefault(_CHANGES, [])
+    for doc in session.new:
+        if isinstance(doc, Document):
+            changes.append((doc.user_id, doc.id, f'{doc.title} {doc.content}'))
+    for doc in session.dirty:
+        if not isinstance(doc, Document):
+            continue
+        state = inspect(doc)
+        if not any(state.attrs[name].history.has_changes() for name in ('title', 'content', 'user_id')):
+            continue
+        for old_user_id in state.attrs.user_id.history.deleted:
+            changes.append((old_user_id, doc.id, None))
+        changes.append((doc.user_id, doc.id, f'{doc.title} {doc.content}'))
+    for doc in session.deleted:
+        if isinstance(doc, Document):
+            changes.append((doc.user_id, doc.id, None))
+
+
+def _apply_changes(session, versions):
+    changes = session.info.pop(_CHANGES, None)
+    if changes and has_app_context():
+        keyword_index = current_app.config.get('KEYWORD_INDEX')
+        if keyword_index is not None:
+            keyword_index.apply(changes, versions)
+
+
+data_version.on_commit(_apply_changes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop(_CHANGES, None)
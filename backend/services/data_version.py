@@ -0,0 +1,90 @@
+from typing import Callable, Dict, List, Tuple
+from sqlalchemy import event, inspect, insert, select, update
+from sqlalchemy.orm import Session
+from models import db, Document, UserDataVersion
+
+# 用户数据版本：文档的每次新增、修改、删除都在同一事务内把所属用户的版本号加1。
+# 版本号存放在数据库中，多个worker进程看到的是同一个值；
+# 缓存的检索结果、内存索引记录生成时的版本，版本不一致即视为过期。
+
+# 本事务中各用户的版本变化 {user_id: (事务前版本, 最新版本)}，提交后交给回调
+_PENDING = 'data_versions'
+
+_commit_callbacks: List[Callable[[Session, Dict[int, Tuple[int, int]]], None]] = []
+
+
+def current(user_id: int) -> int:
+    """用户当前的数据版本（从未写入过文档的用户为0）"""
+    version = db.session.execute(
+        select(UserDataVersion.version).where(UserDataVersion.user_id == int(user_id))
+    ).scalar()
+    return version or 0
+
+
+def ensure_table(engine):
+    """已有数据库升级时补建版本表"""
+    UserDataVersion.__table__.create(engine, checkfirst=True)
+
+
+def on_commit(callback: Callable[[Session, Dict[int, Tuple[int, int]]], None]):
+    """
+    注册提交后的回调
+
+    Args:
+        callback: (session, {user_id: (事务前版本, 最新版本)})，只在本事务写过文档时调用
+    """
+    _commit_callbacks.append(callback)
+
+
+@event.listens_for(Document.user_id, 'set', active_history=True)
+def _load_previous_owner(target, value, oldvalue, initiator):
+    # active_history: 修改所属用户前先加载原值，flush时才能从属性历史中取得原用户
+    pass
+
+
+def _touched_users(session: Session) -> set:
+    """本次flush中有文档变化的用户（修改所属用户时新旧用户都算）"""
+    user_ids = set()
+    for doc in session.new:
+        if isinstance(doc, Document):
+            user_ids.add(int(doc.user_id))
+    for doc in session.deleted:
+        if isinstance(doc, Document):
+            user_ids.add(int(doc.user_id))
+    for doc in session.dirty:
+        if isinstance(doc, Document) and session.is_modified(doc):
+            user_ids.add(int(doc.user_id))
+            user_ids.update(int(user_id) for user_id in inspect(doc).attrs.user_id.history.deleted)
+    return user_ids
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_versions(session, flush_context):
+    user_ids = _touched_users(session)
+    if not user_ids:
+        return
+    pending = session.info.setdefault(_PENDING, {})
+    connection = session.connection()
+    table = UserDataVersion.__table__
+    for user_id in sorted(user_ids):
+        updated = connection.execute(
+            update(table).where(table.c.user_id == user_id).values(version=table.c.version + 1)
+        ).rowcount
+        if not updated:
+            connection.execute(insert(table).values(user_id=user_id, version=1))
+        version = connection.execute(select(table.c.version).where(table.c.user_id == user_id)).scalar()
+        before = pending[user_id][0] if user_id in pending else version - 1
+        pending[user_id] = (before, version)
+
+
+@event.listens_for(Session, 'after_commit')
+def _committed(session):
+    versions = session.info.pop(_PENDING, None)
+    if versions:
+        for callback in _commit_callbacks:
+            callback(session, versions)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _rolled_back(session):
+    session.info.pop(_PENDING, None)
@@ -0,0 +1,243 @@
+import re
+import json
+import math
+import jieba.analyse
+import numpy as np
+from collections import Counter
+from datetime import datetime
+from concurrent.futures import Executor
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import delete, event, inspect, insert, select
+from models import db, Document, DocumentEnrichment
+from services import keyword_engine, segmenter
+from services.keyword_engine import is_term
+
+# 每篇文档保存的关键词数量
+DOCUMENT_KEYWORDS = 10
+
+# TextRank摘要的句子数量；只对前 MAX_RANKED_SENTENCES 句排序（相似度矩阵随句数平方增长）
+SUMMARY_SENTENCES = 3
+MAX_RANKED_SENTENCES = 200
+
+# 句子以中英文句末标点或换行结尾
+SENTENCE = re.compile(r'[^。！？!?；;\n]+[。！？!?；;]*')
+
+
+def tfidf_keywords(term_counts: Dict[str, int], top_k: int, document_frequency: Optional[Dict[str, int]] = None,
+                   documents: int = 0) -> List[Tuple[str, float]]:
+    """
+    由词频计算TF-IDF关键词，权重与 jieba.analyse.extract_tags 相同
+
+    给出统计范围内的文档频率时，IDF再乘以 1 + log(文档数 / 文档频率)：出现在每篇文本中的词（栏目名、署名等）
+    保持jieba词典的IDF，只出现在部分文本中的词权重更高；只有一篇文本时与 extract_tags 相同。
+
+    Args:
+        term_counts: {词: 出现次数}
+        top_k: 返回的关键词数量
+        document_frequency: {词: 包含该词的文本数}
+        documents: 文本数
+
+    Returns:
+        [(词, 权重), ...]，按权重从高到低排列
+    """
+    tfidf = jieba.analyse.default_tfidf
+    freq = {word: count for word, count in term_counts.items()
+            if is_term(word) and word.lower() not in tfidf.stop_words}
+    total = sum(freq.values())
+
+    def idf(word: str) -> float:
+        value = tfidf.idf_freq.get(word, tfidf.median_idf)
+        if document_frequency and document_frequency.get(word):
+            value *= 1.0 + math.log(documents / document_frequency[word])
+        return value
+
+    weights = ((word, count * idf(word) / total) for word, count in freq.items())
+    return sorted(weights, key=lambda item: item[1], reverse=True)[:top_k]
+
+
+def split_sentences(text_value: str) -> List[str]:
+    """按句末标点与换行切分句子"""
+    return [sentence.strip() for sentence in SENTENCE.findall(text_value or '') if sentence.strip()]
+
+
+def textrank_summary(sentences: List[str], tokens: List[List[str]], size: int = SUMMARY_SENTENCES) -> str:
+    """
+    TextRank抽取式摘要
+
+    句子为图的节点，两句的相似度为共同词数 / (log|Si| + log|Sj|)，
+    按带权PageRank得分取前 size 句，保持原文顺序拼接。
+
+    Args:
+        sentences: 句子列表
+        tokens: 各句的词列表
+        size: 摘要句数
+
+    Returns:
+        摘要文本
+    """
+    sentences, tokens = sentences[:MAX_RANKED_SENTENCES], tokens[:MAX_RANKED_SENTENCES]
+    if len(sentences) <= size:
+        return ''.join(sentences)
+
+    vocabulary: Dict[str, int] = {}
+    rows, columns = [], []
+    for row, words in enumerate(tokens):
+        for word in set(words):
+            rows.append(row)
+            columns.append(vocabulary.setdefault(word, len(vocabulary)))
+    occurrence = np.zeros((len(sentences), len(vocabulary)), dtype=np.float32)
+    occurrence[rows, columns] = 1.0
+
+    overlap = occurrence @ occurrence.T
+    lengths = np.log(np.maximum(occurrence.sum(axis=1), 2.0))
+    similarity = overlap / (lengths[:, None] + lengths[None, :])
+    np.fill_diagonal(similarity, 0.0)
+
+    # 按出边权重归一化，没有出边的句子只保留阻尼项
+    out_weight = similarity.sum(axis=1, keepdims=True)
+    transition = np.divide(similarity, out_weight, out=np.zeros_like(similarity), where=out_weight > 0)
+    scores = np.ones(len(sentences), dtype=np.float32)
+    for _ in range(50):
+        updated = 0.15 + 0.85 * (transition.T @ scores)
+        if np.abs(updated - scores).max() < 1e-4:
+            scores = updated
+            break
+        scores = updated
+
+    chosen = sorted(np.argsort(-scores, kind='stable')[:size])
+    return ''.join(sentences[index] for index in chosen)
+
+
+def _segment(title: str, content: str) -> Tuple[List[str], List[List[str]], List[str]]:
+    """正文按句子分词，每句只分一次；返回 (句子, 各句的词, 标题与正文的全部词)"""
+    sentences = split_sentences(content)
+    tokens = [segmenter.cut(sentence) for sentence in sentences]
+    words = segmenter.cut(title) + [word for sentence_words in tokens for word in sentence_words]
+    return sentences, tokens, words
+
+
+def enrich(title: str, content: str) -> Dict:
+    """
+    计算文档的分词统计、关键词与摘要
+
+    分词结果同时用于词频统计与TextRank。
+
+    Args:
+        title: 标题
+        content: 正文
+
+    Returns:
+        {'token_count', 'term_counts', 'keywords', 'summary'}
+    """
+    sentences, tokens, words = _segment(title, content)
+    term_counts = Counter(word for word in words if is_term(word))
+    return {
+        'token_count': sum(1 for word in words if word.strip()),
+        'term_counts': dict(term_counts),
+        'keywords': tfidf_keywords(term_counts, DOCUMENT_KEYWORDS),
+        'summary': textrank_summary(sentences, tokens),
+    }
+
+
+def ensure_table(engine):
+    """已有数据库升级时补建富化表"""
+    DocumentEnrichment.__table__.create(engine, checkfirst=True)
+
+
+def _row(target: Document) -> Dict:
+    enriched = enrich(target.title, target.content)
+    return {
+        'document_id': target.id,
+        'token_count': enriched['token_count'],
+        'term_counts': json.dumps(enriched['term_counts'], ensure_ascii=False, separators=(',', ':')),
+        'keywords': json.dumps(enriched['keywords'], ensure_ascii=False, separators=(',', ':')),
+        'summary': enriched['summary'],
+        'updated_at': datetime.utcnow(),
+    }
+
+
+@event.listens_for(Document, 'after_insert')
+def _enrich_document(mapper, connection, target):
+    table = DocumentEnrichment.__table__
+    # SQLite 可能复用已删除文档的ID，先清掉可能残留的旧行
+    connection.execute(delete(table).where(table.c.document_id == target.id))
+    connection.execute(insert(table).values(**_row(target)))
+
+
+@event.listens_for(Document, 'after_update')
+def _reenrich_document(mapper, connection, target):
+    # 只修改备注、分类等字段时不重新分词
+    state = inspect(target)
+    if not any(state.attrs[name].history.has_changes() for name in ('title', 'content')):
+        return
+    table = DocumentEnrichment.__table__
+    connection.execute(delete(table).where(table.c.document_id == target.id))
+    connection.execute(insert(table).values(**_row(target)))
+
+
+@event.listens_for(Document, 'after_delete')
+def _unenrich_document(mapper, connection, target):
+    table = DocumentEnrichment.__table__
+    connection.execute(delete(table).where(table.c.document_id == target.id))
+
+
+def document_term_counts(doc_ids: Iterable[int], pool: Optional[Executor] = None) -> Dict[int, Dict[str, int]]:
+    """
+    读取文档的预计算词频
+
+    没有富化记录的文档（已有数据库尚未运行 `flask enrich-rebuild`）当场分词补算，不写回。
+
+    Args:
+        doc_ids: 文档ID
+        pool: 补算时使用的进程池（keyword_engine.worker_pool），为 None 时在当前进程内分词
+
+    Returns:
+        {doc_id: {词: 出现次数}}
+    """
+    doc_ids = list(doc_ids)
+    table = DocumentEnrichment.__table__
+    counts = {}
+    # 分批查询，避免IN列表超出数据库的参数上限
+    for start in range(0, len(doc_ids), 500):
+        rows = db.session.execute(
+            select(table.c.document_id, table.c.term_counts).where(table.c.document_id.in_(doc_ids[start:start + 500]))
+        )
+        counts.update((doc_id, json.loads(term_counts)) for doc_id, term_counts in rows)
+
+    missing = [doc_id for doc_id in doc_ids if doc_id not in counts]
+    for start in range(0, len(missing), 500):
+        rows = db.session.query(Document.id, Document.title, Document.content)\
+            .filter(Document.id.in_(missing[start:start + 500])).all()
+        texts = [f"{title} {content}" for _, title, content in rows]
+        for (doc_id, _, _), term_counts in zip(rows, keyword_engine.term_counts(texts, pool)):
+            counts[doc_id] = term_counts
+    return counts
+
+
+def rebuild(batch_size: int = 200) -> int:
+    """
+    为全部现有文档重新计算富化记录
+
+    Args:
+        batch_size: 每批读取的文档数量
+
+    Returns:
+        处理的文档数量
+    """
+    connection = db.session.connection()
+    table = DocumentEnrichment.__table__
+    table.create(connection, checkfirst=True)
+    connection.execute(delete(table))
+
+    count = 0
+    last_id = 0
+    while True:
+        batch = Document.query.filter(Document.id > last_id).order_by(Document.id).limit(batch_size).all()
+        if not batch:
+            break
+        connection.execute(insert(table), [_row(doc) for doc in batch])
+        count += len(batch)
+        last_id = batch[-1].id
+        db.session.expunge_all()
+    db.session.commit()
+    return count
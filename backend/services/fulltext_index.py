@@ -0,0 +1,158 @@
+from typing import Dict, List
+from sqlalchemy import event, inspect, text
+from models import db, Document
+from services import segmenter
+
+# FTS5全文索引表，rowid 即文档ID
+# 正文预先用 segmenter.cut_for_search（jieba搜索引擎模式）分词、以空格连接后写入，FTS5默认分词器按空格切分，中文词可直接匹配
+FTS_TABLE = 'documents_fts'
+
+# 所属用户以词 u<用户ID> 写入 owner 列并在 MATCH 中限定，检索只在该用户文档的倒排表中进行，
+# 不必先匹配全部用户的文档再按用户过滤
+COLUMNS = ('title', 'content', 'owner')
+
+# bm25 列权重（title, content, owner）：标题命中权重更高，owner 只用于限定范围、不参与排序
+BM25_WEIGHTS = (2.0, 1.0, 0.0)
+
+_CREATE = f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5({', '.join(COLUMNS)})"
+_DROP = f"DROP TABLE IF EXISTS {FTS_TABLE}"
+_UPSERT = f"INSERT INTO {FTS_TABLE} (rowid, title, content, owner) VALUES (:id, :title, :content, :owner)"
+_DELETE = f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"
+
+# 各数据库是否已有全文索引表（按数据库URL缓存，建表、删表与重建时更新）
+_available: Dict[str, bool] = {}
+
+
+def segment(text_value: str) -> str:
+    """搜索引擎模式分词，以空格连接"""
+    return ' '.join(word for word in segmenter.cut_for_search(text_value) if word.strip())
+
+
+def owner_token(user_id) -> str:
+    """owner 列中表示所属用户的词"""
+    return f'u{int(user_id)}'
+
+
+def owner_expression(user_id) -> str:
+    """只匹配该用户文档的FTS5查询"""
+    return f'owner : "{owner_token(user_id)}"'
+
+
+def match_expression(keywords: List[str]) -> str:
+    """关键词组合为FTS5查询：每个词作为短语（转义双引号），任一命中即可"""
+    return ' OR '.join('"{}"'.format(keyword.replace('"', '""')) for keyword in keywords)
+
+
+def is_available(connection) -> bool:
+    """
+    数据库是否为SQLite且已建全文索引表（已有数据库需先运行 `flask fts-rebuild`）
+
+    早期版本建立的表没有 owner 列，同样视为未建，重建后才使用。
+    """
+    if connection.dialect.name != 'sqlite':
+        return False
+    key = str(connection.engine.url)
+    if key not in _available:
+        columns = [row[1] for row in connection.execute(text(f"PRAGMA table_info({FTS_TABLE})"))]
+        _available[key] = tuple(columns) == COLUMNS
+    return _available[key]
+
+
+def _row(target: Document) -> Dict:
+    return {
+        'id': target.id,
+        'title': segment(target.title),
+        'content': segment(target.content),
+        'owner': owner_token(target.user_id),
+    }
+
+
+@event.listens_for(Document.__table__, 'after_create')
+def _create_table(target, connection, **kwargs):
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text(_CREATE))
+        _available[str(connection.engine.url)] = True
+
+
+@event.listens_for(Document.__table__, 'before_drop')
+def _drop_table(target, connection, **kwargs):
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text(_DROP))
+        _available[str(connection.engine.url)] = False
+
+
+@event.listens_for(Document, 'after_insert')
+def _index_document(mapper, connection, target):
+    if is_available(connection):
+        # SQLite 可能复用已删除文档的ID，先清掉可能残留的旧行
+        connection.execute(text(_DELETE), {'id': target.id})
+        connection.execute(text(_UPSERT), _row(target))
+
+
+@event.listens_for(Document, 'after_update')
+def _reindex_document(mapper, connection, target):
+    # 只修改备注、分类等字段时不重新分词
+    state = inspect(target)
+    if not is_available(connection) or not any(
+        state.attrs[name].history.has_changes() for name in ('title', 'content', 'user_id')
+    ):
+        return
+    connection.execute(text(_DELETE), {'id': target.id})
+    connection.execute(text(_UPSERT), _row(target))
+
+
+@event.listens_for(Document, 'after_delete')
+def _unindex_document(mapper, connection, target):
+    if is_available(connection):
+        connection.execute(text(_DELETE), {'id': target.id})
+
+
+def search(keywords: List[str], user_id: int, limit: int) -> List[int]:
+    """
+    全文检索：按 bm25 排序
+
+    Args:
+        keywords: 查询关键词（已分词）
+        user_id: 查询用户ID
+        limit: 返回数量
+
+    Returns:
+        文档ID列表，相关度高的在前
+    """
+    rows = db.session.execute(
+        text(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :query "
+            f"ORDER BY bm25({FTS_TABLE}, {', '.join(map(str, BM25_WEIGHTS))}) LIMIT :limit"
+        ),
+        {'query': f'{owner_expression(user_id)} AND ({match_expression(keywords)})', 'limit': limit}
+    )
+    return [doc_id for (doc_id,) in rows]
+
+
+def rebuild(batch_size: int = 500) -> int:
+    """
+    建立（或重建）全文索引表并写入全部现有文档
+
+    Args:
+        batch_size: 每批读取并分词的文档数量
+
+    Returns:
+        写入的文档数量
+    """
+    connection = db.session.connection()
+    connection.execute(text(_DROP))
+    connection.execute(text(_CREATE))
+    _available[str(connection.engine.url)] = True
+
+    count = 0
+    last_id = 0
+    while True:
+        batch = Document.query.filter(Document.id > last_id).order_by(Document.id).limit(batch_size).all()
+        if not batch:
+            break
+        connection.execute(text(_UPSERT), [_row(doc) for doc in batch])
+        count += len(batch)
+        last_id = batch[-1].id
+        db.session.expunge_all()
+    db.session.commit()
+    return count
@@ -0,0 +1,165 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import case, or_
+from models import db, Document
+from services import fulltext_index, segmenter
+
+# 查询分词后过滤的停用词
+STOPWORDS = {'的', '了', '是', '在', '有', '和', '与', '及', '或', '等', '啊', '吗', '呢'}
+
+# 关键词检索最多使用的关键词数量
+MAX_KEYWORDS = 5
+
+# 向量检索在后台线程执行，与请求线程中的关键词检索并行（向量检索不访问数据库会话）
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _vector_executor() -> ThreadPoolExecutor:
+    # 并发的首批请求只创建一个线程池
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='hybrid-vector')
+        return _executor
+
+
+def extract_keywords(query: str) -> List[str]:
+    """
+    查询分词并过滤停用词与单字
+
+    Returns:
+        关键词列表；没有可用关键词时返回原始查询
+    """
+    keywords = [word for word in segmenter.cut_query(query) if word not in STOPWORDS and len(word) > 1]
+    return list(dict.fromkeys(keywords)) or [query]
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """
+    倒数排名融合：文档得分为其在各路结果中 1 / (k + 名次) 之和
+
+    只依赖名次，不需要把向量相似度与关键词得分换算到同一尺度。
+
+    Args:
+        rankings: 各路检索的文档ID列表（按相关度从高到低）
+        k: 平滑常数，越大则名次靠后的结果权重衰减越慢
+
+    Returns:
+        [(doc_id, fused_score), ...]，按得分从高到低排列
+    """
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class HybridSearchService:
+    """知识库混合检索：向量检索与关键词检索并行执行，倒数排名融合后回表"""
+
+    def __init__(self, vector_store, rrf_k: int = 60, candidates: int = 50, keyword_index=None):
+        """
+        Args:
+            vector_store: 向量存储（VectorStore 或 VectorStoreClient）
+            rrf_k: 倒数排名融合的平滑常数
+            candidates: 每路检索参与融合的候选数量
+            keyword_index: 内存BM25索引（KeywordIndex）；为空时关键词检索查FTS5全文索引
+        """
+        self.vector_store = vector_store
+        self.keyword_index = keyword_index
+        self.rrf_k = rrf_k
+        self.candidates = candidates
+
+    def keyword_ranking(self, keywords: List[str], user_id: int, limit: int,
+                        version: Optional[int] = None) -> List[int]:
+        """
+        关键词检索：按 bm25 排序，只取文档ID
+
+        优先使用内存BM25索引，其次查FTS5全文索引；全文索引也不可用时
+        （非SQLite数据库，或已有数据库尚未运行 `flask fts-rebuild`）退回 LIKE 扫描，按命中的关键词个数排序。
+        version 为用户当前数据版本，内存索引落后于该版本时重新构建。
+
+        Returns:
+            文档ID列表，相关度高的在前
+        """
+        if self.keyword_index is not None:
+            return [doc_id for doc_id, _ in self.keyword_index.search(user_id, keywords, limit, version)]
+        if fulltext_index.is_available(db.session.connection()):
+            return fulltext_index.search(keywords, user_id, limit)
+        
+        matches = [
+            or_(Document.title.like(f'%{keyword}%'), Document.content.like(f'%{keyword}%'))
+            for keyword in keywords[:MAX_KEYWORDS]
+        ]
+        score = sum(case((match, 1), else_=0) for match in matches)
+        rows = Document.query.with_entities(Document.id)\
+            .filter(Document.user_id == user_id)\
+            .filter(or_(*matches))\
+            .order_by(score.desc(), Document.created_at.desc())\
+            .limit(limit)\
+            .all()
+        return [doc_id for (doc_id,) in rows]
+
+    def vector_ranking(self, query: str, user_id: int, min_similarity: float, limit: int) -> List[Tuple[int, float]]:
+        """向量检索：只保留相似度不低于阈值的文档"""
+        return self.vector_store.search_range(query, user_id, min_similarity, limit)
+
+    def search(self, query: str, user_id: int, limit: int, min_similarity: float,
+               version: Optional[int] = None) -> Tuple[List[str], List[Dict]]:
+        """
+        混合检索
+
+        Args:
+            query: 查询文本
+            user_id: 查询用户ID
+            limit: 返回的文档数量
+            min_similarity: 向量检索的最低相似度
+            version: 用户当前数据版本（见 services.data_version）
+
+        Returns:
+            (关键词列表, 文档字典列表)；文档按融合得分排序，
+            含 score（融合得分）、similarity（向量相似度，仅向量命中时）、
+            bm25（关键词得分，使用内存索引时）、match_score（命中关键词占比）、matched_keywords
+        """
+        keywords = extract_keywords(query)
+        candidates = max(limit, self.candidates)
+        vector_future = _vector_executor().submit(self.vector_ranking, query, user_id, min_similarity, candidates)
+        keyword_ids = self.keyword_ranking(keywords, user_id, candidates, version)
+        vector_hits = vector_future.result()
+
+        similarities = dict(vector_hits)
+        fused = reciprocal_rank_fusion([[doc_id for doc_id, _ in vector_hits], keyword_ids], self.rrf_k)[:limit]
+        if not fused:
+            return keywords[:MAX_KEYWORDS], []
+
+        # 一次IN查询回表，按融合顺序输出
+        documents = {
+            doc.id: doc
+            for doc in Document.query.filter(
+                Document.user_id == user_id,
+                Document.id.in_([doc_id for doc_id, _ in fused])
+            ).all()
+        }
+        # 命中的关键词从倒排索引取得，不再逐篇做子串扫描
+        explained = {}
+        if self.keyword_index is not None:
+            explained = self.keyword_index.explain(user_id, keywords, [doc_id for doc_id, _ in fused], version)
+        
+        results = []
+        for doc_id, score in fused:
+            doc = documents.get(doc_id)
+            if doc is None:
+                continue
+            doc_dict = doc.to_dict()
+            if doc_id in explained:
+                doc_dict['bm25'], matched_keywords = explained[doc_id]
+            else:
+                matched_keywords = [k for k in keywords if k in doc.title or k in doc.content]
+            doc_dict['score'] = score
+            doc_dict['similarity'] = similarities.get(doc_id)
+            doc_dict['match_score'] = len(matched_keywords) / len(keywords)
+            doc_dict['matched_keywords'] = matched_keywords
+            results.append(doc_dict)
+        return keywords[:MAX_KEYWORDS], results
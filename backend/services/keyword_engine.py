@@ -0,0 +1,138 @@
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Executor, wait
+from contextlib import contextmanager
+from itertools import chain, islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from services import segmenter
+
+# 关键词统计的 map-reduce：文本按块流式分给进程池，各子进程返回该块的词频与文档频率，
+# 父进程合并计数后计算TF-IDF。任何时刻只有在途的几个块在内存中，不保留全部分词结果。
+# 汇总表重建时用同一进程池逐篇统计缺少富化记录的文档（见 rollups.rebuild）。
+
+# 每块的文本数，块越大进程间传输的次数越少，但合并前占用的内存越多
+CHUNK_SIZE = 256
+
+# 逐篇统计时每块的文本数：每批文档只有几百篇，块小一些才能分给全部子进程
+DOCUMENT_CHUNK_SIZE = 32
+
+# 每个子进程最多排队的块数，读取文本的速度不会超前处理速度太多
+PENDING_PER_PROCESS = 2
+
+
+def is_term(word: str) -> bool:
+    """参与词频统计的词：去掉空白后至少两个字符（与 jieba.analyse.extract_tags 的过滤条件相同）"""
+    return len(word.strip()) >= 2
+
+
+def document_terms(texts: List[str]) -> List[Dict[str, int]]:
+    """
+    逐篇统计一块文本的词频（子进程中执行，按名称引用的模块级函数）
+
+    Returns:
+        与 texts 一一对应的 {词: 出现次数}
+    """
+    return [dict(Counter(word for word in segmenter.cut(text) if is_term(word))) for text in texts]
+
+
+def count_terms(texts: List[str]) -> Tuple[Counter, Counter]:
+    """
+    统计一块文本（子进程中执行，按名称引用的模块级函数）
+
+    Returns:
+        (词频, 文档频率)，只统计两个字符以上的词
+    """
+    term_frequency: Counter = Counter()
+    document_frequency: Counter = Counter()
+    for counts in document_terms(texts):
+        term_frequency.update(counts)
+        document_frequency.update(counts.keys())
+    return term_frequency, document_frequency
+
+
+def _chunks(texts: Iterable[str], size: int) -> Iterator[List[str]]:
+    iterator = iter(texts)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+@contextmanager
+def worker_pool(processes: int) -> Iterator[Optional[Executor]]:
+    """
+    在多次统计之间共用的进程池（见 segmenter.process_pool），进程数不大于1时为 None
+
+    子进程在第一次提交任务时才启动，用不到时没有启动开销。
+    """
+    if processes <= 1:
+        yield None
+        return
+    with segmenter.process_pool(processes) as pool:
+        yield pool
+
+
+def term_counts(texts: List[str], pool: Optional[Executor] = None,
+                chunk_size: int = DOCUMENT_CHUNK_SIZE) -> List[Dict[str, int]]:
+    """
+    逐篇统计词频
+
+    Args:
+        texts: 文本列表
+        pool: worker_pool 返回的进程池，为 None 或只有一块文本时在当前进程内统计
+        chunk_size: 每块的文本数
+
+    Returns:
+        与 texts 一一对应的 {词: 出现次数}
+    """
+    chunks = list(_chunks(texts, chunk_size))
+    results = pool.map(document_terms, chunks) if pool is not None and len(chunks) > 1 \
+        else map(document_terms, chunks)
+    return [counts for chunk in results for counts in chunk]
+
+
+def term_statistics(texts: Iterable[str], processes: int = 0,
+                    chunk_size: int = CHUNK_SIZE) -> Tuple[Counter, Counter, int]:
+    """
+    流式统计词频与文档频率
+
+    Args:
+        texts: 文本，可以是生成器（只遍历一次）
+        processes: 并行进程数，0或1时在当前进程内统计；只有一块文本时同样在当前进程内统计
+        chunk_size: 每块的文本数
+
+    Returns:
+        (词频, 文档频率, 文本数)
+    """
+    term_frequency: Counter = Counter()
+    document_frequency: Counter = Counter()
+    count = 0
+
+    def merge(partial: Tuple[Counter, Counter], size: int):
+        nonlocal count
+        term_frequency.update(partial[0])
+        document_frequency.update(partial[1])
+        count += size
+
+    chunks = _chunks(texts, chunk_size)
+    first = next(chunks, None)
+    if first is None:
+        return term_frequency, document_frequency, 0
+    second = next(chunks, None)
+    chunks = chain([first], [second] if second is not None else [], chunks)
+    if processes <= 1 or second is None:
+        for chunk in chunks:
+            merge(count_terms(chunk), len(chunk))
+        return term_frequency, document_frequency, count
+
+    pending = {}
+    with worker_pool(processes) as pool:
+        for chunk in chunks:
+            if len(pending) >= processes * PENDING_PER_PROCESS:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    merge(future.result(), pending.pop(future))
+            pending[pool.submit(count_terms, chunk)] = len(chunk)
+        for future in list(pending):
+            merge(future.result(), pending.pop(future))
+    return term_frequency, document_frequency, count
@@ -0,0 +1,325 @@
+import threading
+import numpy as np
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from models import db, Document
+from services import data_version
+
+# 每天的微秒数（created_at 列为UTC纪元微秒）
+DAY = 86_400_000_000
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+# 决定文档元数据的字段
+_TRACKED = ('user_id', 'created_at', 'category', 'source')
+
+Row = Tuple[int, datetime, Optional[str], Optional[str]]
+
+
+def epoch_us(moment: datetime) -> int:
+    """UTC时间（不带时区）转为纪元微秒（逐个转换时比 np.datetime64 快）"""
+    return (moment - EPOCH) // MICROSECOND
+
+
+class MetadataSnapshot:
+    """
+    用户文档元数据的列式快照
+
+    每篇文档一行：ID、创建时间（纪元微秒）、分类编码、来源编码，按创建时间排序。
+    时间条件用 searchsorted 定位区间，分布与按日趋势用 bincount 计数，不访问数据库。
+    快照不可修改：写入提交后由 with_changes 生成新快照，读取方无需加锁。
+    """
+
+    def __init__(self, ids: np.ndarray, created_at: np.ndarray, categories: np.ndarray, sources: np.ndarray,
+                 category_values: List[Optional[str]], source_values: List[Optional[str]]):
+        self.ids = ids
+        self.created_at = created_at
+        self.categories = categories
+        self.sources = sources
+        # 编码 -> 值，值 -> 编码；编码只增不减，不再出现的值计数为0
+        self.category_values = category_values
+        self.source_values = source_values
+        self._category_codes = {value: code for code, value in enumerate(category_values)}
+        self._source_codes = {value: code for code, value in enumerate(source_values)}
+
+    @classmethod
+    def build(cls, rows: Iterable[Row]) -> 'MetadataSnapshot':
+        """
+        由 (doc_id, created_at, category, source) 行构建快照
+
+        Args:
+            rows: 任意顺序的行
+        """
+        return cls.empty().with_changes([
+            (doc_id, (created_at, category, source)) for doc_id, created_at, category, source in rows
+        ])
+
+    @classmethod
+    def empty(cls) -> 'MetadataSnapshot':
+        # 编码0表示未设置分类/来源（空字符串同样计入0，与按日汇总表一致）
+        return cls(np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.int32), np.empty(0, np.int32),
+                   [None], [None])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @staticmethod
+    def _encode(values: List[Optional[str]], codes: Dict[Optional[str], int], value: Optional[str]) -> int:
+        value = value or None
+        if value not in codes:
+            codes[value] = len(values)
+            values.append(value)
+        return codes[value]
+
+    def with_changes(self, changes: List[Tuple[int, Optional[Tuple[datetime, Optional[str], Optional[str]]]]]
+                     ) -> 'MetadataSnapshot':
+        """
+        应用文档变更，返回新快照
+
+        Args:
+            changes: [(doc_id, (created_at, category, source)), ...]，元数据为 None 表示删除；
+                同一文档出现多次时以最后一次为准
+        """
+        latest = dict(changes)
+        if not latest:
+            return self
+        category_values, source_values = list(self.category_values), list(self.source_values)
+        category_codes, source_codes = dict(self._category_codes), dict(self._source_codes)
+
+        removed = np.isin(self.ids, np.fromiter(latest, np.int64, len(latest)))
+        columns = (self.ids, self.created_at, self.categories, self.sources)
+        if removed.any():
+            columns = tuple(column[~removed] for column in columns)
+        added = [(doc_id, fields) for doc_id, fields in latest.items() if fields is not None]
+        new_created = np.fromiter(
+            (epoch_us(fields[0] or datetime.utcnow()) for _, fields in added), np.int64, len(added)
+        )
+        # 新行按时间排序后插入保留行的对应位置，整体仍按时间有序
+        order = np.argsort(new_created, kind='stable')
+        added = [added[position] for position in order]
+        new_columns = (
+            np.array([doc_id for doc_id, _ in added], np.int64),
+            new_created[order],
+            np.array([self._encode(category_values, category_codes, fields[1]) for _, fields in added], np.int32),
+            np.array([self._encode(source_values, source_codes, fields[2]) for _, fields in added], np.int32),
+        )
+        positions = np.searchsorted(columns[1], new_columns[1], side='right')
+        return MetadataSnapshot(
+            *(np.insert(column, positions, values) for column, values in zip(columns, new_columns)),
+            category_values, source_values
+        )
+
+    def _select(self, category: Optional[str] = None, source: Optional[str] = None, since: Optional[datetime] = None,
+                until: Optional[datetime] = None) -> Tuple[slice, Optional[np.ndarray]]:
+        """
+        筛选条件对应的时间区间与区间内的掩码（没有分类、来源条件时掩码为 None）
+
+        时间条件与按日汇总表相同按UTC日期比较：since 取当天零点，until 取次日零点之前。
+        """
+        start = int(np.searchsorted(self.created_at, epoch_us(since) // DAY * DAY, 'left')) \
+            if since is not None else 0
+        stop = int(np.searchsorted(self.created_at, (epoch_us(until) // DAY + 1) * DAY, 'left')) \
+            if until is not None else len(self)
+        window = slice(start, max(start, stop))
+        mask = None
+        for column, codes, value in ((self.categories, self._category_codes, category),
+                                     (self.sources, self._source_codes, source)):
+            if value:
+                code = codes.get(value)
+                matches = column[window] == code if code is not None else np.zeros(window.stop - start, bool)
+                mask = matches if mask is None else mask & matches
+        return window, mask
+
+    def _column(self, column: np.ndarray, window: slice, mask: Optional[np.ndarray]) -> np.ndarray:
+        values = column[window]
+        return values if mask is None else values[mask]
+
+    def count(self, **filters) -> int:
+        """
+        文档数量
+
+        Args:
+            filters: category / source / since / until（时间按UTC日期比较）
+        """
+        window, mask = self._select(**filters)
+        return int(mask.sum()) if mask is not None else window.stop - window.start
+
+    def distribution(self, field: str, **filters) -> Dict[Optional[str], int]:
+        """
+        分类或来源分布
+
+        Args:
+            field: 'category' 或 'source'
+            filters: category / source / since / until
+
+        Returns:
+            {值: 文档数}，未设置的计入 None
+        """
+        column, values = (self.categories, self.category_values) if field == 'category' \
+            else (self.sources, self.source_values)
+        counts = np.bincount(self._column(column, *self._select(**filters)), minlength=len(values))
+        return {values[code]: int(count) for code, count in enumerate(counts) if count}
+
+    def daily_counts(self, **filters) -> Dict[str, int]:
+        """
+        按日期统计文档数（UTC）
+
+        Args:
+            filters: category / source / since / until
+
+        Returns:
+            {'YYYY-MM-DD': 文档数}，没有文档的日期不出现
+        """
+        days = self._column(self.created_at, *self._select(**filters)) // DAY
+        if not len(days):
+            return {}
+        first = int(days[0])
+        counts = np.bincount(days - first)
+        return {str(np.datetime64(first + int(offset), 'D')): int(counts[offset]) for offset in np.flatnonzero(counts)}
+
+
+class MetadataCache:
+    """
+    按用户懒加载的元数据快照
+
+    首次查询某用户时由 loader 读取该用户全部文档的元数据构建快照，超过 max_users 时按LRU淘汰。
+    与 KeywordIndex 相同，快照记录它反映的用户数据版本：本进程提交的写入由 apply 增量更新并连续推进版本，
+    查询时传入的当前版本更新（其他worker进程写入过）时重新构建。
+    """
+
+    def __init__(self, loader: Callable[[int], Iterable[Row]], max_users: int = 64):
+        """
+        Args:
+            loader: user_id -> [(doc_id, created_at, category, source), ...]
+            max_users: 内存中最多保留的用户快照数量
+        """
+        self.loader = loader
+        self.max_users = max_users
+        self._snapshots: "OrderedDict[int, MetadataSnapshot]" = OrderedDict()
+        self._versions: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, version: Optional[int] = None) -> MetadataSnapshot:
+        """
+        获取用户快照，未加载或已过期时构建
+
+        Args:
+            user_id: 用户ID
+            version: 用户当前的数据版本（构建前读取）；为空时不检查是否过期
+        """
+        user_id = int(user_id)
+        with self._lock:
+            snapshot = self._snapshots.get(user_id)
+            if snapshot is not None and (version is None or self._versions[user_id] >= version):
+                self._snapshots.move_to_end(user_id)
+                return snapshot
+
+        # 构建期间提交的写入不会应用到尚未放入缓存的快照；快照记录构建前的版本，
+        # 这些写入推进版本后下一次查询会重新构建
+        snapshot = MetadataSnapshot.build(self.loader(user_id))
+        with self._lock:
+            if self._versions.get(user_id, -1) <= (version or 0):
+                self._snapshots[user_id] = snapshot
+                self._versions[user_id] = version or 0
+                self._snapshots.move_to_end(user_id)
+            while len(self._snapshots) > self.max_users:
+                cold, _ = self._snapshots.popitem(last=False)
+                self._versions.pop(cold, None)
+        return snapshot
+
+    def apply(self, changes: Iterable[Tuple[int, int, Optional[Tuple[datetime, Optional[str], Optional[str]]]]],
+              versions: Optional[Dict[int, Tuple[int, int]]] = None):
+        """
+        应用已提交的文档变更
+
+        Args:
+            changes: [(user_id, doc_id, (created_at, category, source)), ...]，元数据为 None 表示删除；
+                只处理已加载的用户
+            versions: 本次提交中各用户的版本变化 {user_id: (提交前版本, 提交后版本)}
+        """
+        versions = versions or {}
+        by_user: Dict[int, list] = {}
+        for user_id, doc_id, fields in changes:
+            by_user.setdefault(int(user_id), []).append((int(doc_id), fields))
+        with self._lock:
+            for user_id in (set(by_user) | set(versions)) & set(self._snapshots):
+                self._snapshots[user_id] = self._snapshots[user_id].with_changes(by_user.get(user_id, []))
+                # 版本连续时推进；中间有其他进程的写入则保持原版本，下次查询时重新构建
+                transition = versions.get(user_id)
+                if transition is not None and self._versions.get(user_id) == transition[0]:
+                    self._versions[user_id] = transition[1]
+
+    def evict(self, user_id: int):
+        """丢弃用户快照，下次查询时重新构建"""
+        with self._lock:
+            self._snapshots.pop(int(user_id), None)
+            self._versions.pop(int(user_id), None)
+
+    def loaded_users(self) -> List[int]:
+        """当前驻留内存的用户（由冷到热）"""
+        with self._lock:
+            return list(self._snapshots)
+
+
+def load_user_metadata(user_id: int) -> Iterable[Row]:
+    """读取用户全部文档的元数据（MetadataCache 的 loader，需在应用上下文中调用）"""
+    return db.session.query(Document.id, Document.created_at, Document.category, Document.source)\
+        .filter(Document.user_id == int(user_id))\
+        .yield_per(5000)
+
+
+def current(user_id: int) -> Optional[MetadataSnapshot]:
+    """当前应用中用户的最新快照；未启用元数据缓存时返回 None"""
+    cache = current_app.config.get('METADATA_CACHE') if has_app_context() else None
+    if cache is None:
+        return None
+    return cache.get(user_id, data_version.current(user_id))
+
+
+# 文档变更在 flush 时记录到会话，提交后才更新快照（回滚的写入不会进入快照）
+_CHANGES = 'metadata_changes'
+
+
+def _fields(doc: Document) -> Tuple[datetime, Optional[str], Optional[str]]:
+    return doc.created_at, doc.category, doc.source
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_changes(session, flush_context):
+    changes = session.info.setdefault(_CHANGES, [])
+    for doc in session.new:
+        if isinstance(doc, Document):
+            changes.append((doc.user_id, doc.id, _fields(doc)))
+    for doc in session.dirty:
+        if not isinstance(doc, Document):
+            continue
+        state = inspect(doc)
+        if not any(state.attrs[name].history.has_changes() for name in _TRACKED):
+            continue
+        for old_user_id in state.attrs.user_id.history.deleted:
+            changes.append((old_user_id, doc.id, None))
+        changes.append((doc.user_id, doc.id, _fields(doc)))
+    for doc in session.deleted:
+        if isinstance(doc, Document):
+            changes.append((doc.user_id, doc.id, None))
+
+
+def _apply_changes(session, versions):
+    changes = session.info.pop(_CHANGES, None)
+    if has_app_context():
+        cache = current_app.config.get('METADATA_CACHE')
+        if cache is not None and (changes or versions):
+            cache.apply(changes or [], versions)
+
+
+data_version.on_commit(_apply_changes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop(_CHANGES, None)
@@ -0,0 +1,172 @@
+import json
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from models import db, ReportJob
+from services import data_version
+from services.analysis_service import AnalysisService
+
+# 分析报告的后台任务：提交后立即返回任务ID，由本进程的线程池生成报告，进度与结果写入 report_jobs 表，
+# 任一worker进程都可查询。完成的任务按 (用户, 时间范围, 数据版本) 充当报告缓存：
+# 文档没有变化时再次提交直接返回已有结果，文档写入后版本加1，旧结果不再命中。
+# 7天、30天的报告窗口随日期滑动，完成日期早于今天（UTC）的结果即使版本未变也不再命中。
+
+TIME_RANGES = ('7days', '30days', 'all')
+
+# 窗口随日期滑动的时间范围
+DATED_RANGES = ('7days', '30days')
+
+# 仍在排队或执行中的任务视为活跃，同一版本的重复提交复用该任务
+ACTIVE = ('queued', 'running')
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# 本进程内的查找 + 创建串行执行；多个worker进程之间由活跃任务的唯一索引兜底
+_submit_lock = threading.Lock()
+
+
+def _report_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=current_app.config['REPORT_WORKERS'], thread_name_prefix='report-job'
+            )
+        return _executor
+
+
+def ensure_table(engine):
+    """已有数据库升级时补建任务表及其索引"""
+    ReportJob.__table__.create(engine, checkfirst=True)
+    for index in ReportJob.__table__.indexes:
+        index.create(engine, checkfirst=True)
+
+
+def get(job_id: str, user_id: int) -> Optional[ReportJob]:
+    """用户的任务；不存在或属于其他用户时返回 None"""
+    job = db.session.get(ReportJob, job_id)
+    if job is None or job.user_id != int(user_id):
+        return None
+    return job
+
+
+def find(user_id: int, time_range: str, version: int) -> Optional[ReportJob]:
+    """
+    可复用的任务：同一数据版本已完成的任务，或未超时的排队/执行中任务
+
+    执行中的进程退出后任务会停留在 running，超过 REPORT_JOB_TIMEOUT 秒不再复用。
+    7天、30天的任务只复用今天（UTC）完成的结果，或今天提交的活跃任务。
+    """
+    now = datetime.utcnow()
+    started_after = now - timedelta(seconds=current_app.config['REPORT_JOB_TIMEOUT'])
+    if time_range in DATED_RANGES:
+        started_after = max(started_after, datetime.combine(now.date(), datetime.min.time()))
+    candidates = ReportJob.query.filter_by(user_id=int(user_id), time_range=time_range, data_version=version)\
+        .filter(ReportJob.status.in_(('done',) + ACTIVE))\
+        .order_by(ReportJob.created_at.desc()).all()
+    for job in candidates:
+        if job.status == 'done':
+            if time_range not in DATED_RANGES or job.finished_at.date() == now.date():
+                return job
+        elif job.created_at >= started_after:
+            return job
+    return None
+
+
+def _expire_stale(user_id: int, time_range: str, version: int):
+    """把不再复用的排队/执行中任务标记为失败，释放活跃任务的唯一索引"""
+    stale = ReportJob.query.filter_by(user_id=int(user_id), time_range=time_range, data_version=version)\
+        .filter(ReportJob.status.in_(ACTIVE)).all()
+    for job in stale:
+        job.status = 'failed'
+        job.error = 'timed out'
+        job.finished_at = datetime.utcnow()
+
+
+def submit(user_id: int, time_range: str = 'all', run_inline: bool = False) -> ReportJob:
+    """
+    提交报告任务
+
+    Args:
+        user_id: 用户ID
+        time_range: 时间范围 (7days, 30days, all)
+        run_inline: 在当前线程生成报告（同步接口使用；REPORT_WORKERS 为0时总是如此）
+
+    Returns:
+        任务；数据未变化时为已完成的旧任务，已有同版本任务在执行时为该任务
+    """
+    version = data_version.current(user_id)
+    with _submit_lock:
+        job = find(user_id, time_range, version)
+        if job is not None:
+            return job
+
+        _expire_stale(user_id, time_range, version)
+        job = ReportJob(id=uuid.uuid4().hex, user_id=int(user_id), time_range=time_range, data_version=version)
+        db.session.add(job)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # 另一个worker进程同时创建了同版本的任务
+            db.session.rollback()
+            job = find(user_id, time_range, version)
+            if job is None:
+                raise
+            return job
+
+    app = current_app._get_current_object()
+    if run_inline or current_app.config['REPORT_WORKERS'] <= 0:
+        run(app, job.id)
+        db.session.refresh(job)
+    else:
+        _report_executor().submit(run, app, job.id)
+    return job
+
+
+def run(app, job_id: str):
+    """
+    生成报告并记录进度与结果（在独立的应用上下文与数据库会话中执行）
+
+    完成后删除该用户同一时间范围的其他已结束任务，每个时间范围只保留最新结果。
+    """
+    with app.app_context():
+        try:
+            job = db.session.get(ReportJob, job_id)
+            if job is None or job.status != 'queued':
+                # 排队超时后已被新任务取代
+                return
+            job.status = 'running'
+            db.session.commit()
+
+            def report_progress(stage: str, progress: float):
+                job.stage = stage
+                job.progress = progress
+                db.session.commit()
+
+            report = AnalysisService.user_summary_report(job.user_id, job.time_range, progress=report_progress)
+            job.result = json.dumps(report, ensure_ascii=False)
+            job.status = 'done'
+            job.progress = 1.0
+            job.finished_at = datetime.utcnow()
+            ReportJob.query.filter(
+                ReportJob.user_id == job.user_id,
+                ReportJob.time_range == job.time_range,
+                ReportJob.id != job.id,
+                ReportJob.status.in_(('done', 'failed'))
+            ).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            job = db.session.get(ReportJob, job_id)
+            if job is not None:
+                job.status = 'failed'
+                job.error = str(e)
+                job.finished_at = datetime.utcnow()
+                db.session.commit()
+        finally:
+            db.session.remove()
@@ -0,0 +1,178 @@
+import json
+from collections import Counter
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import delete, event, inspect, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, Document, DocumentEnrichment, DailyDocumentRollup, DailyTermRollup
+# 先导入富化模块：同一事件的监听器按注册顺序执行，插入文档时富化记录先于汇总写入
+from services import enrichment, keyword_engine
+
+# 按 (用户, 日期, 分类, 来源) 汇总的文档数与词频，文档写入时在同一事务内增量维护，
+# 分析接口读取汇总表，耗时与天数、分组数成正比，与文档总数无关
+
+DOCUMENTS = DailyDocumentRollup.__table__
+TERMS = DailyTermRollup.__table__
+GROUP_COLUMNS = ('user_id', 'day', 'category', 'source')
+
+# 超过列宽的词（长串英文、链接等）不计入词频汇总
+MAX_TERM_LENGTH = 100
+
+# 决定文档所在分组或词频的字段
+_TRACKED = ('user_id', 'created_at', 'category', 'source', 'title', 'content')
+
+Group = Tuple[int, date, str, str]
+
+
+def _group(user_id, created_at: Optional[datetime], category: Optional[str], source: Optional[str]) -> Group:
+    return int(user_id), (created_at or datetime.utcnow()).date(), category or '', source or ''
+
+
+def _stored_term_counts(connection, doc_id: int) -> Dict[str, int]:
+    """文档的富化词频；没有富化记录（已有数据库尚未运行 `flask enrich-rebuild`）时为空"""
+    row = connection.execute(
+        select(DocumentEnrichment.__table__.c.term_counts).where(DocumentEnrichment.__table__.c.document_id == doc_id)
+    ).scalar()
+    return json.loads(row) if row else {}
+
+
+def _add(connection, table, group: Group, rows: List[Dict], column: str):
+    """
+    把增量加到汇总行上（不存在则插入），计数减到0的行删除
+
+    Args:
+        group: 分组键，rows 都属于该分组
+        rows: 含主键列与增量列的字典
+        column: 增量列名
+    """
+    if not rows:
+        return
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        statement = (sqlite if dialect == 'sqlite' else postgresql).insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(table.primary_key.columns),
+            set_={column: table.c[column] + statement.excluded[column]}
+        )
+        connection.execute(statement, rows)
+    else:
+        for row in rows:
+            key = [column_ == row[column_.name] for column_ in table.primary_key.columns]
+            if not connection.execute(update(table).where(*key).values({column: table.c[column] + row[column]})).rowcount:
+                connection.execute(insert(table).values(**row))
+    if any(row[column] < 0 for row in rows):
+        connection.execute(delete(table).where(
+            *[table.c[name] == value for name, value in zip(GROUP_COLUMNS, group)], table.c[column] <= 0
+        ))
+
+
+def _apply(connection, group: Group, term_counts: Dict[str, int], sign: int):
+    """把一篇文档计入（sign=1）或移出（sign=-1）分组"""
+    key = dict(zip(GROUP_COLUMNS, group))
+    _add(connection, DOCUMENTS, group, [dict(key, doc_count=sign)], 'doc_count')
+    _add(connection, TERMS, group, [
+        dict(key, term=term, count=sign * count)
+        for term, count in term_counts.items() if len(term) <= MAX_TERM_LENGTH
+    ], 'count')
+
+
+def _changed(target) -> bool:
+    state = inspect(target)
+    return any(state.attrs[name].history.has_changes() for name in _TRACKED)
+
+
+def _previous(target, name):
+    """flush前的属性值"""
+    history = inspect(target).attrs[name].history
+    return history.deleted[0] if history.deleted else getattr(target, name)
+
+
+for _name in ('user_id', 'created_at', 'category', 'source'):
+    # active_history: 修改前先加载原值，flush时才能从属性历史中取得原分组
+    event.listen(getattr(Document, _name), 'set', lambda target, value, oldvalue, initiator: None, active_history=True)
+
+
+@event.listens_for(Document, 'after_insert')
+def _count_document(mapper, connection, target):
+    group = _group(target.user_id, target.created_at, target.category, target.source)
+    _apply(connection, group, _stored_term_counts(connection, target.id), 1)
+
+
+@event.listens_for(Document, 'before_update')
+def _uncount_previous(mapper, connection, target):
+    # 富化记录在 after_update 中才会更新，此时读到的仍是修改前的词频
+    if _changed(target):
+        group = _group(*(_previous(target, name) for name in ('user_id', 'created_at', 'category', 'source')))
+        _apply(connection, group, _stored_term_counts(connection, target.id), -1)
+
+
+@event.listens_for(Document, 'after_update')
+def _count_updated(mapper, connection, target):
+    if _changed(target):
+        group = _group(target.user_id, target.created_at, target.category, target.source)
+        _apply(connection, group, _stored_term_counts(connection, target.id), 1)
+
+
+@event.listens_for(Document, 'before_delete')
+def _uncount_document(mapper, connection, target):
+    # 富化记录在 after_delete 中删除，这里仍可读取
+    group = _group(*(_previous(target, name) for name in ('user_id', 'created_at', 'category', 'source')))
+    _apply(connection, group, _stored_term_counts(connection, target.id), -1)
+
+
+def ensure_tables(engine):
+    """已有数据库升级时补建汇总表（之后运行 `flask rollups-rebuild` 回填）"""
+    DOCUMENTS.create(engine, checkfirst=True)
+    TERMS.create(engine, checkfirst=True)
+
+
+def rebuild(batch_size: int = 500, processes: int = 0) -> int:
+    """
+    清空并按现有文档重新计算汇总表
+
+    词频取自富化记录，缺少记录的文档当场分词补算（见 enrichment.document_term_counts），
+    各批文档共用同一个进程池（见 keyword_engine.worker_pool）。
+
+    Args:
+        batch_size: 每批读取的文档数量
+        processes: 补算词频时分词的并行进程数
+
+    Returns:
+        汇总的文档数量
+    """
+    connection = db.session.connection()
+    ensure_tables(connection)
+    connection.execute(delete(DOCUMENTS))
+    connection.execute(delete(TERMS))
+
+    documents: Counter = Counter()
+    terms: Counter = Counter()
+    count = 0
+    last_id = 0
+    with keyword_engine.worker_pool(processes) as pool:
+        while True:
+            batch = db.session.query(Document.id, Document.user_id, Document.created_at, Document.category,
+                                     Document.source)\
+                .filter(Document.id > last_id).order_by(Document.id).limit(batch_size).all()
+            if not batch:
+                break
+            term_counts = enrichment.document_term_counts((doc_id for doc_id, *_ in batch), pool)
+            for doc_id, *fields in batch:
+                group = _group(*fields)
+                documents[group] += 1
+                for term, occurrences in term_counts.get(doc_id, {}).items():
+                    if len(term) <= MAX_TERM_LENGTH:
+                        terms[group + (term,)] += occurrences
+            count += len(batch)
+            last_id = batch[-1].id
+
+    if documents:
+        connection.execute(insert(DOCUMENTS), [
+            dict(zip(GROUP_COLUMNS, group), doc_count=value) for group, value in documents.items()
+        ])
+    if terms:
+        connection.execute(insert(TERMS), [
+            dict(zip(GROUP_COLUMNS + ('term',), key), count=value) for key, value in terms.items()
+        ])
+    db.session.commit()
+    return count
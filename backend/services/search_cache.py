@@ -0,0 +1,112 @@
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+from embedding_cache import normalize_text
+
+
+class SearchCache:
+    """
+    检索结果缓存
+
+    键为 (用户, 接口, 规范化查询, 参数)，值附带生成时的用户数据版本（见 services.data_version）。
+    读取时版本与当前版本不一致即视为过期并丢弃，文档新增、修改、删除后不会返回旧结果；
+    另按LRU限制条目数、按TTL限制存活时间（覆盖联网结果等不随文档变化的内容）。
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl: float = 300):
+        """
+        Args:
+            max_entries: 最多保留的条目数，超出时淘汰最久未使用的
+            ttl: 条目存活秒数
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self.stale = 0
+        self._entries: "OrderedDict[Hashable, Tuple[int, float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(user_id: int, endpoint: str, query, **params) -> Tuple:
+        """
+        计算缓存键
+
+        Args:
+            user_id: 用户ID
+            endpoint: 接口名
+            query: 查询文本，或查询文本列表（批量检索）
+            params: 影响结果的其他参数（k、阈值、过滤条件等），取自请求JSON，值可以是列表或对象
+        """
+        if isinstance(query, str):
+            query = normalize_text(query)
+        else:
+            query = tuple(normalize_text(item) for item in query)
+        # 参数按JSON序列化（键排序）后参与缓存键，列表、对象等不可哈希的值也能作为键
+        return int(user_id), endpoint, query, json.dumps(params, sort_keys=True, ensure_ascii=False)
+
+    def get(self, key: Hashable, version: int) -> Optional[Any]:
+        """
+        读取缓存
+
+        Args:
+            key: make_key 计算的键
+            version: 用户当前的数据版本
+
+        Returns:
+            缓存的结果；未命中、已过期或版本不一致时返回 None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                cached_version, expires_at, value = entry
+                if cached_version != version:
+                    self.stale += 1
+                elif expires_at <= time.monotonic():
+                    self.expired += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, version: int, value: Any):
+        """
+        写入缓存（结果不可再被修改）
+
+        Args:
+            key: make_key 计算的键
+            version: 检索开始前读取的数据版本
+            value: 检索结果
+        """
+        with self._lock:
+            self._entries[key] = (version, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """清空全部条目"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'entries': len(self._entries),
+                'evictions': self.evictions,
+                'expired': self.expired,
+                'stale': self.stale,
+            }
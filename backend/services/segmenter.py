@@ -0,0 +1,113 @@
+import os
+import multiprocessing
+import jieba
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+
+def _cut_for_search(query: str) -> Tuple[str, ...]:
+    return tuple(jieba.cut_for_search(query))
+
+
+# 查询分词结果的有界LRU缓存（结果为元组，调用方不能修改）
+_memo = lru_cache(maxsize=4096)(_cut_for_search)
+
+
+def configure(cache_dir: str = '', dictionary: str = '', memo_items: int = 4096):
+    """
+    设置jieba词典与查询分词缓存，需在首次分词之前调用
+
+    Args:
+        cache_dir: 词典模型缓存文件（jieba.cache）所在目录，为空时使用系统临时目录；
+            部署时指向持久目录（或随镜像预先生成，见 `flask jieba-cache`），进程启动时直接加载
+        dictionary: 自定义主词典路径，为空时使用jieba自带词典
+        memo_items: 查询分词缓存的条目数（0则不缓存）
+    """
+    global _memo
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        jieba.dt.tmp_dir = cache_dir
+    if dictionary:
+        jieba.set_dictionary(dictionary)
+    _memo = lru_cache(maxsize=memo_items)(_cut_for_search) if memo_items > 0 else _cut_for_search
+
+
+def initialize():
+    """加载词典（缓存文件不存在时构建并写入，之后的进程直接读取）"""
+    jieba.initialize()
+
+
+def cache_file() -> str:
+    """词典模型缓存文件路径"""
+    dictionary = jieba.dt.dictionary
+    if jieba.dt.cache_file:
+        name = jieba.dt.cache_file
+    elif dictionary == jieba.DEFAULT_DICT:
+        name = 'jieba.cache'
+    else:
+        name = 'jieba.u%s.cache' % jieba.md5(dictionary.encode('utf-8', 'replace')).hexdigest()
+    return os.path.join(jieba.dt.tmp_dir or jieba.tempfile.gettempdir(), name)
+
+
+def cut(text: str) -> List[str]:
+    """
+    精确模式分词（文档标题、正文等）
+
+    也是进程池按名称引用的模块级函数（jieba.lcut 是绑定方法，无法序列化到子进程）。
+    """
+    return jieba.lcut(text or '')
+
+
+def cut_for_search(text: str) -> List[str]:
+    """搜索引擎模式分词，用于文档建索引（不经过查询缓存）"""
+    return jieba.lcut_for_search(text or '')
+
+
+def cut_query(query: str) -> Tuple[str, ...]:
+    """
+    查询的搜索引擎模式分词（带缓存）
+
+    只用于查询：文档正文各不相同，放入缓存只会挤掉热门查询。
+    """
+    return _memo(query)
+
+
+def memo_info() -> Optional[dict]:
+    """查询分词缓存的命中统计，未启用缓存时返回 None"""
+    if not hasattr(_memo, 'cache_info'):
+        return None
+    info = _memo.cache_info()
+    total = info.hits + info.misses
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'hit_rate': round(info.hits / total, 4) if total else 0.0,
+        'entries': info.currsize,
+        'max_entries': info.maxsize,
+    }
+
+
+def _initialize_worker(cache_dir: Optional[str], dictionary: Optional[str]):
+    configure(cache_dir=cache_dir or '', dictionary=dictionary or '', memo_items=0)
+    initialize()
+
+
+def process_pool(processes: int) -> ProcessPoolExecutor:
+    """
+    批量分词的进程池（keyword_engine.worker_pool 在多次统计之间共用）
+
+    Web进程中运行着请求、报告任务等线程，fork 会把其他线程持有的锁原样复制到子进程，
+    因此子进程由 forkserver（不支持的平台上为 spawn）启动，按父进程的设置从预先生成的词典缓存加载词典。
+    调用方负责关闭（with 语句）。
+
+    Args:
+        processes: 进程数
+    """
+    # 缓存文件不存在时由父进程构建一次，子进程直接读取
+    initialize()
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return ProcessPoolExecutor(
+        processes, mp_context=multiprocessing.get_context(method),
+        initializer=_initialize_worker, initargs=(jieba.dt.tmp_dir, jieba.dt.dictionary)
+    )
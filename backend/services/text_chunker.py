@@ -0,0 +1,101 @@
+import re
+from collections import deque
+from typing import Iterator, NamedTuple, Optional
+
+# 句子结束位置: 中英文句末标点（含其后的引号/括号）、英文句点后接空白、换行
+SENTENCE_END = re.compile(r'[。！？!?；;…]+[”’"\'）)]*|\.(?=\s)|\n+')
+
+# 长度估算单位: 每个汉字、每个英文单词/数字、每个其他符号各计1，近似模型的词元数
+TOKEN = re.compile(r'[㐀-鿿豈-﫿]|[A-Za-z0-9_]+|[^\sA-Za-z0-9_]')
+
+
+class Chunk(NamedTuple):
+    """文本片段，start/end 为在原文中的字符偏移"""
+    start: int
+    end: int
+    text: str
+
+
+class TextChunker:
+    """
+    将长文本切分为相互重叠的片段
+    
+    嵌入模型只编码前约256个词元，长文章整体编码时只有开头参与检索。
+    片段优先在句子边界切分，超长句子按词元硬切；相邻片段重叠约 overlap 个词元，
+    使跨片段的句子仍能完整出现在某个片段中。
+    """
+    
+    def __init__(self, chunk_size: int = 200, overlap: int = 40):
+        """
+        Args:
+            chunk_size: 每个片段的最大长度（估算词元数）
+            overlap: 相邻片段的重叠长度（估算词元数）
+        """
+        if overlap >= chunk_size:
+            raise ValueError("overlap must be smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+    
+    def _pieces(self, text: str) -> Iterator[tuple]:
+        """按句子切分，超长句子再按词元切分，产出 (start, end, 长度)"""
+        start = 0
+        boundaries = [m.end() for m in SENTENCE_END.finditer(text)]
+        for end in boundaries + [len(text)]:
+            if end <= start:
+                continue
+            tokens = [m.end() for m in TOKEN.finditer(text, start, end)]
+            if not tokens:
+                start = end
+                continue
+            # 超长句子每 chunk_size 个词元切一段
+            piece_start = start
+            for offset in range(self.chunk_size, len(tokens), self.chunk_size):
+                yield piece_start, tokens[offset - 1], self.chunk_size
+                piece_start = tokens[offset - 1]
+            yield piece_start, end, len(tokens) - (len(tokens) - 1) // self.chunk_size * self.chunk_size
+            start = end
+    
+    def iter_chunks(self, text: str) -> Iterator[Chunk]:
+        """
+        流式切分文本
+        
+        Args:
+            text: 原文
+        
+        Yields:
+            Chunk(start, end, text)，片段文本已去除首尾空白
+        """
+        window = deque()
+        total = 0
+        emitted_end = 0
+        for piece in self._pieces(text):
+            length = piece[2]
+            if window and total + length > self.chunk_size:
+                yield self._chunk(text, window[0][0], window[-1][1])
+                emitted_end = window[-1][1]
+                # 保留末尾不超过 overlap 的句子作为下一个片段的开头
+                while window and (total > self.overlap or total + length > self.chunk_size):
+                    total -= window.popleft()[2]
+            window.append(piece)
+            total += length
+        
+        if window and window[-1][1] > emitted_end:
+            yield self._chunk(text, window[0][0], window[-1][1])
+        elif emitted_end == 0 and text.strip():
+            yield self._chunk(text, 0, len(text))
+    
+    @staticmethod
+    def _chunk(text: str, start: int, end: int) -> Chunk:
+        """构造去除首尾空白的片段，偏移随之调整"""
+        segment = text[start:end]
+        stripped = segment.strip()
+        if stripped:
+            start += len(segment) - len(segment.lstrip())
+        return Chunk(start, start + len(stripped), stripped)
+    
+    def passage(self, text: str, chunk_no: int) -> Optional[Chunk]:
+        """取第 chunk_no 个片段（切分到该片段即停止）"""
+        for number, chunk in enumerate(self.iter_chunks(text)):
+            if number == chunk_no:
+                return chunk
+        return None
@@ -1,16 +1,19 @@
 import pytest
 import os
 import sys
+import shutil
 
 # 添加backend目录到Python路径
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from app import create_app
+from app import create_app, shutdown
+from config import TEST_DATA_DIR
 from models import db, User
 
 @pytest.fixture
 def app():
-    """创建测试应用"""
+    """创建测试应用，结束后关闭向量库并删除测试数据目录"""
+    os.makedirs(TEST_DATA_DIR, exist_ok=True)
     app = create_app('testing')
     
     with app.app_context():
@@ -18,6 +21,8 @@ def app():
         yield app
         db.session.remove()
         db.drop_all()
+    shutdown(app)
+    shutil.rmtree(TEST_DATA_DIR, ignore_errors=True)
 
 @pytest.fixture
 def client(app):
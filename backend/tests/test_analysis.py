@@ -1,5 +1,5 @@
 import pytest
-from models import Document, db
+from models import Document, User, db
 from datetime import datetime, timedelta
 
 class TestAnalysis:
@@ -27,6 +27,21 @@ class TestAnalysis:
         assert response.json['total_documents'] == 5
         assert 'category_distribution' in response.json
     
+    def test_recent_counts_whole_days(self, client, auth_headers, app):
+        """测试近7天按整日统计：起始日零点创建的文档也计入，响应给出起始日"""
+        week_ago = datetime.utcnow() - timedelta(days=7)
+        with app.app_context():
+            user_id = User.query.filter_by(username='testuser').one().id
+            for created_at in (datetime.combine(week_ago.date(), datetime.min.time()), week_ago - timedelta(days=1)):
+                db.session.add(Document(user_id=user_id, title='新闻', content='正文', created_at=created_at))
+            db.session.commit()
+        
+        response = client.get('/api/analysis/stats', headers=auth_headers)
+        
+        assert response.status_code == 200
+        assert response.json['recent_7days'] == 1
+        assert response.json['recent_7days_since'] == week_ago.date().isoformat()
+    
     def test_get_category_distribution(self, client, auth_headers, app, test_user):
         """测试获取分类分布"""
         # 创建不同分类的文档
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+from models import db, Document
+from services import analytics_query
+from services.analysis_service import AnalysisService
+
+USER = 1
+
+def add_documents(rows):
+    """rows: [(user_id, category, source, created_at), ...]"""
+    db.session.add_all([
+        Document(user_id=user_id, title='新闻', content='正文', category=category, source=source, created_at=created_at)
+        for user_id, category, source, created_at in rows
+    ])
+    db.session.commit()
+
+class TestAnalyticsQuery:
+    """分析聚合查询相关测试"""
+
+    def test_group_counts(self, app):
+        """测试分组计数只统计当前用户，空值单独成组"""
+        now = datetime.utcnow()
+        add_documents([
+            (USER, '科技', 'RSS', now),
+            (USER, '科技', 'web', now),
+            (USER, None, 'RSS', now),
+            (2, '科技', 'RSS', now),
+        ])
+
+        assert analytics_query.category_distribution(USER) == {'科技': 2, None: 1}
+        assert analytics_query.source_distribution(USER) == {'RSS': 2, 'web': 1}
+        assert analytics_query.count_documents(USER) == 3
+        assert analytics_query.count_documents(USER, category='科技') == 2
+        assert AnalysisService.user_category_distribution(USER) == {'科技': 2, '未分类': 1}
+
+    def test_daily_counts_match_python_trend(self, app):
+        """测试按日期分组的结果与逐篇解析日期统计一致，范围外的文档不计入"""
+        now = datetime.utcnow()
+        add_documents([
+            (USER, '科技', 'RSS', now - timedelta(hours=1)),
+            (USER, '科技', 'RSS', now - timedelta(days=1, hours=1)),
+            (USER, '体育', 'RSS', now - timedelta(days=1, hours=2)),
+            (USER, '体育', 'RSS', now - timedelta(days=10)),
+        ])
+
+        trend = AnalysisService.user_time_trend(USER, days=7)
+
+        expected = {}
+        for doc in Document.query.filter_by(user_id=USER).all():
+            if doc.created_at >= now - timedelta(days=7):
+                date = doc.created_at.strftime('%Y-%m-%d')
+                expected[date] = expected.get(date, 0) + 1
+        assert trend == expected
+        assert sum(trend.values()) == 3
+        assert (now - timedelta(days=10)).strftime('%Y-%m-%d') not in trend
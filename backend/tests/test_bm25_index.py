@@ -0,0 +1,124 @@
+import math
+import pytest
+import services.bm25_index as bm25_module
+from models import db, Document
+from services.bm25_index import BM25Index, KeywordIndex, tokenize
+
+USER = 1
+
+def reference_bm25(corpus, terms, doc_id, k1=1.5, b=0.75):
+    """按定义逐项计算BM25（对照用）"""
+    avgdl = sum(len(tokens) for tokens in corpus.values()) / len(corpus)
+    tokens = corpus[doc_id]
+    score = 0.0
+    for term in terms:
+        df = sum(1 for doc in corpus.values() if term in doc)
+        tf = tokens.count(term)
+        if tf:
+            idf = math.log(1 + (len(corpus) - df + 0.5) / (df + 0.5))
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(tokens) / avgdl))
+    return score
+
+class TestBM25Index:
+    """内存BM25倒排索引相关测试"""
+    
+    def test_scores_match_definition(self):
+        """测试向量化得分与按定义计算一致，结果按得分排序"""
+        corpus = {
+            1: ['人工智能', '芯片', '芯片', '产业'],
+            2: ['足球', '联赛'],
+            3: ['芯片', '出口', '数据', '产业', '报告'],
+        }
+        index = BM25Index()
+        index.add_many(corpus.items())
+        
+        hits = index.search(['芯片', '产业'], 10)
+        
+        assert [doc_id for doc_id, _ in hits] == [1, 3]
+        for doc_id, score in hits:
+            assert score == pytest.approx(reference_bm25(corpus, ['芯片', '产业'], doc_id))
+        assert index.search(['芯片'], 1)[0][0] == 1
+        assert index.search(['不存在'], 10) == []
+    
+    def test_incremental_updates_equal_rebuild(self, monkeypatch):
+        """测试增量写入、覆盖、删除与合并后的结果与重新构建一致"""
+        monkeypatch.setattr(bm25_module, 'MERGE_THRESHOLD', 3)
+        index = BM25Index()
+        index.add_many([(1, ['新闻', '科技']), (2, ['新闻', '体育'])])
+        index.add(3, ['科技', '芯片'])
+        index.add(1, ['财经', '新闻'])
+        assert index.remove(2) is True
+        assert index.remove(2) is False
+        index.add(4, ['科技', '科技', '新闻'])
+        
+        rebuilt = BM25Index()
+        rebuilt.add_many([(1, ['财经', '新闻']), (3, ['科技', '芯片']), (4, ['科技', '科技', '新闻'])])
+        
+        assert index.size == 3
+        assert index.search(['科技'], 10) == [(doc_id, pytest.approx(score)) for doc_id, score in rebuilt.search(['科技'], 10)]
+        assert [doc_id for doc_id, _ in index.search(['体育'], 10)] == []
+    
+    def test_explain_reports_matched_terms(self):
+        """测试返回指定文档的得分与命中的查询词"""
+        index = BM25Index()
+        index.add_many([(1, ['人工智能', '芯片']), (2, ['足球'])])
+        
+        explained = index.explain(['芯片', '人工智能', '足球'], [1, 2, 9])
+        
+        assert explained[1][0] > 0
+        assert explained[1][1] == ['芯片', '人工智能']
+        assert explained[2][1] == ['足球']
+        assert explained[9] == (0.0, [])
+    
+    def test_tokenize_drops_punctuation(self):
+        """测试分词去掉标点与空白"""
+        assert tokenize('人工智能，AI！') == ['人工', '智能', '人工智能', 'ai']
+
+class TestKeywordIndex:
+    """按用户加载的关键词索引相关测试"""
+    
+    def test_follows_committed_writes_only(self, app):
+        """测试提交后的增删改同步到已加载的索引，回滚的写入不进入索引"""
+        keyword_index = app.config['KEYWORD_INDEX']
+        doc = Document(user_id=USER, title='人工智能', content='芯片产业报告')
+        db.session.add(doc)
+        db.session.commit()
+        
+        assert [doc_id for doc_id, _ in keyword_index.search(USER, ['芯片'], 10)] == [doc.id]
+        
+        other = Document(user_id=USER, title='足球联赛', content='国家队胜利')
+        db.session.add(other)
+        db.session.flush()
+        db.session.rollback()
+        assert keyword_index.search(USER, ['足球'], 10) == []
+        
+        doc = db.session.get(Document, doc.id)
+        doc.content = '量子计算突破'
+        db.session.commit()
+        assert keyword_index.search(USER, ['芯片'], 10) == []
+        assert [doc_id for doc_id, _ in keyword_index.search(USER, ['量子'], 10)] == [doc.id]
+        
+        db.session.delete(doc)
+        db.session.commit()
+        assert keyword_index.search(USER, ['量子'], 10) == []
+    
+    def test_changes_during_build_are_replayed(self):
+        """测试构建期间提交的变更在构建完成后重放"""
+        keyword_index = None
+        
+        def loader(user_id):
+            # 读取语料后、注册索引前，另一个线程提交了删除与新增
+            keyword_index.apply([(user_id, 1, None), (user_id, 2, '足球联赛')])
+            return [(1, ['芯片'])]
+        keyword_index = KeywordIndex(loader)
+        
+        assert keyword_index.search(USER, ['芯片'], 10) == []
+        assert [doc_id for doc_id, _ in keyword_index.search(USER, ['足球'], 10)] == [2]
+    
+    def test_least_recently_used_evicted(self):
+        """测试超过上限时淘汰最久未用的用户索引"""
+        keyword_index = KeywordIndex(lambda user_id: [(user_id, ['新闻'])], max_loaded_users=2)
+        for user_id in (1, 2, 1, 3):
+            keyword_index.get(user_id)
+        
+        assert keyword_index.loaded_users() == [1, 3]
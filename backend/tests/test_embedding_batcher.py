@@ -0,0 +1,88 @@
+import time
+import threading
+import numpy as np
+import pytest
+from embedding_batcher import EmbeddingBatcher
+from vector_store import VectorStore
+
+def fake_encode(calls):
+    """记录每次调用的批量，向量第一维为文本长度"""
+    def encode(texts):
+        calls.append(list(texts))
+        return np.array([[len(text), i] for i, text in enumerate(texts)], dtype='float32')
+    return encode
+
+class TestEmbeddingBatcher:
+    """嵌入微批处理相关测试"""
+    
+    def test_concurrent_requests_coalesced(self):
+        """测试并发的单条请求合并为一次模型调用，各自得到自己的结果"""
+        calls = []
+        batcher = EmbeddingBatcher(fake_encode(calls), max_batch=8, max_wait_ms=200)
+        texts = ['a' * n for n in range(1, 9)]
+        
+        futures = [batcher.submit([text]) for text in texts]
+        results = [future.result(timeout=5) for future in futures]
+        
+        assert len(calls) == 1
+        assert [int(result[0][0]) for result in results] == list(range(1, 9))
+        batcher.close()
+    
+    def test_flushes_after_max_wait(self):
+        """测试未凑满一批时最多等待 max_wait_ms 后发出"""
+        calls = []
+        batcher = EmbeddingBatcher(fake_encode(calls), max_batch=64, max_wait_ms=20)
+        
+        started = time.monotonic()
+        result = batcher.encode(['新闻'])
+        
+        assert time.monotonic() - started < 1.0
+        assert result.shape == (1, 2)
+        assert calls == [['新闻']]
+        batcher.close()
+    
+    def test_duplicate_texts_encoded_once(self):
+        """测试批内重复文本只编码一次"""
+        calls = []
+        batcher = EmbeddingBatcher(fake_encode(calls), max_batch=3, max_wait_ms=200)
+        
+        first = batcher.submit(['新闻', '体育'])
+        second = batcher.submit(['新闻'])
+        
+        assert first.result(timeout=5)[0].tolist() == second.result(timeout=5)[0].tolist()
+        assert calls == [['新闻', '体育']]
+        batcher.close()
+    
+    def test_encode_error_propagates_to_callers(self):
+        """测试模型异常传给该批的所有调用方，之后的请求不受影响"""
+        def encode(texts):
+            if 'bad' in texts:
+                raise ValueError('encode failed')
+            return np.zeros((len(texts), 2), dtype='float32')
+        batcher = EmbeddingBatcher(encode, max_batch=1, max_wait_ms=1)
+        
+        with pytest.raises(ValueError):
+            batcher.encode(['bad'])
+        assert batcher.encode(['good']).shape == (1, 2)
+        batcher.close()
+        with pytest.raises(RuntimeError):
+            batcher.encode(['late'])
+    
+    def test_vector_store_batches_concurrent_searches(self, tmp_path):
+        """测试向量库中并发检索的查询编码被合并"""
+        store = VectorStore(index_path=str(tmp_path / 'faiss_index'), embedding_batch_wait_ms=50)
+        store.add_documents([1, 2], ['人工智能', '足球比赛'], 1)
+        batches = store.batcher.batches
+        results = {}
+        
+        def search(query):
+            results[query] = store.search(query, 1, k=1)[0][0]
+        threads = [threading.Thread(target=search, args=(query,)) for query in ('人工智能新闻', '足球比赛结果')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert results == {'人工智能新闻': 1, '足球比赛结果': 2}
+        assert store.batcher.batches - batches == 1
+        store.close()
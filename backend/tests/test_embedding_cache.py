@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from embedding_cache import EmbeddingCache
+from vector_store import VectorStore
+
+class TestEmbeddingCache:
+    """嵌入缓存相关测试"""
+    
+    def test_normalized_text_shares_key(self):
+        """测试仅空白/全角差异的文本命中同一缓存项，换模型则不命中"""
+        cache = EmbeddingCache('model-a')
+        
+        assert cache.key('人工智能  新闻\n') == cache.key(' 人工智能 新闻')
+        assert cache.key('ＡＩ新闻') == cache.key('AI新闻')
+        assert cache.key('新闻') != EmbeddingCache('model-b').key('新闻')
+    
+    def test_disk_tier_survives_restart(self, tmp_path):
+        """测试磁盘层在重新打开后仍可命中"""
+        path = str(tmp_path / 'embeddings.db')
+        cache = EmbeddingCache('model-a', path)
+        cache.put_many(['新闻一'], np.ones((1, 4), dtype='float32'))
+        cache.close()
+        
+        reopened = EmbeddingCache('model-a', path)
+        vector, missing = reopened.get_many(['新闻一', '新闻二'])
+        
+        assert np.array_equal(vector, np.ones(4, dtype='float32'))
+        assert missing is None
+        assert reopened.stats()['hits'] == 1
+    
+    def test_memory_tier_is_bounded(self):
+        """测试内存层按LRU淘汰"""
+        cache = EmbeddingCache('model-a', memory_items=2)
+        cache.put_many(['一', '二', '三'], np.eye(3, dtype='float32'))
+        
+        assert cache.get_many(['一'])[0] is None
+        assert cache.stats()['memory_items'] == 2
+    
+    def test_vector_store_skips_model_for_cached_text(self, tmp_path, monkeypatch):
+        """测试重复内容不再调用嵌入模型"""
+        store = VectorStore(
+            index_path=str(tmp_path / 'faiss_index'),
+            embedding_cache_path=str(tmp_path / 'embeddings.db')
+        )
+        store.add_documents([1, 2], ['新闻一', '新闻二'], 1)
+        
+        calls = []
+        encode = store.model.encode
+        monkeypatch.setattr(store.model, 'encode', lambda texts, **kwargs: calls.append(list(texts)) or encode(texts, **kwargs))
+        store.add_documents([3, 4, 5], ['新闻一', '新闻三', '新闻三'], 1)
+        
+        assert calls == [['新闻三']]
+        assert store.search('新闻一', 1, k=1)[0] == (1, pytest.approx(1.0, abs=1e-5))
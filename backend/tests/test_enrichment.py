@@ -0,0 +1,78 @@
+import json
+import jieba
+import jieba.analyse
+from models import db, Document, DocumentEnrichment
+from services import enrichment
+
+USER = 1
+
+CONTENT = (
+    '人工智能芯片产业快速发展。'
+    '国产人工智能芯片出口数据创新高。'
+    '今天天气晴朗。'
+    '多家企业发布人工智能芯片新产品，芯片产业链持续完善。'
+    '周末去公园散步。'
+)
+
+class TestEnrichment:
+    """入库富化相关测试"""
+
+    def test_enrich_counts_and_keywords(self):
+        """测试词频只保留两个字符以上的词，关键词权重与 extract_tags 一致"""
+        enriched = enrichment.enrich('芯片产业报告', CONTENT)
+
+        words = jieba.lcut('芯片产业报告') + [w for s in enrichment.split_sentences(CONTENT) for w in jieba.lcut(s)]
+        assert enriched['term_counts']['芯片'] == words.count('芯片')
+        assert all(len(word.strip()) >= 2 for word in enriched['term_counts'])
+        expected = jieba.analyse.extract_tags('芯片产业报告' + CONTENT, topK=3, withWeight=True)
+        assert [word for word, _ in enriched['keywords'][:3]] == [word for word, _ in expected]
+
+    def test_textrank_summary_keeps_central_sentences_in_order(self):
+        """测试摘要选出与其他句子联系最多的句子，并保持原文顺序"""
+        summary = enrichment.enrich('', CONTENT)['summary']
+        sentences = enrichment.split_sentences(CONTENT)
+
+        assert '今天天气晴朗。' not in summary
+        assert '周末去公园散步。' not in summary
+        chosen = [sentence for sentence in sentences if sentence in summary]
+        assert len(chosen) == enrichment.SUMMARY_SENTENCES
+        assert summary == ''.join(chosen)
+        assert enrichment.enrich('', '只有一句。')['summary'] == '只有一句。'
+
+    def test_follows_document_writes(self, app):
+        """测试文档新增、修改正文、删除时同步富化记录，只改备注时不重新计算"""
+        doc = Document(user_id=USER, title='足球联赛', content='国家队赢得比赛。')
+        db.session.add(doc)
+        db.session.commit()
+        row = db.session.get(DocumentEnrichment, doc.id)
+        assert '比赛' in json.loads(row.term_counts)
+
+        doc.content = '芯片产业报告。'
+        db.session.commit()
+        db.session.expire_all()
+        row = db.session.get(DocumentEnrichment, doc.id)
+        assert '芯片' in json.loads(row.term_counts)
+        updated_at = row.updated_at
+
+        doc.notes = '备注'
+        db.session.commit()
+        db.session.expire_all()
+        assert db.session.get(DocumentEnrichment, doc.id).updated_at == updated_at
+
+        db.session.delete(doc)
+        db.session.commit()
+        assert db.session.get(DocumentEnrichment, doc.id) is None
+
+    def test_missing_rows_are_computed(self, app):
+        """测试缺少富化记录的文档当场补算词频，与预计算结果合并"""
+        first = Document(user_id=USER, title='芯片', content='芯片产业。')
+        second = Document(user_id=USER, title='芯片出口', content='国家队赢得比赛。')
+        db.session.add_all([first, second])
+        db.session.commit()
+        db.session.delete(db.session.get(DocumentEnrichment, second.id))
+        db.session.commit()
+
+        counts = enrichment.document_term_counts([first.id, second.id])
+
+        assert counts[first.id]['芯片'] == 2
+        assert counts[second.id] == {'芯片': 1, '出口': 1, '国家队': 1, '赢得': 1, '比赛': 1}
@@ -0,0 +1,75 @@
+import pytest
+from sqlalchemy import text
+from models import db, Document
+from services import bm25_index, fulltext_index
+
+USER = 1
+
+def add_document(user_id, title, content):
+    doc = Document(user_id=user_id, title=title, content=content)
+    db.session.add(doc)
+    db.session.commit()
+    return doc
+
+class TestFulltextIndex:
+    """FTS5全文索引相关测试"""
+    
+    def test_index_follows_document_changes(self, app):
+        """测试文档增删改同步到全文索引"""
+        # 路由写入的用户ID是JWT中的字符串
+        doc = add_document(str(USER), '人工智能最新进展', '深度学习技术日益成熟。')
+        other = add_document(USER, '足球联赛', '国家队取得胜利。')
+        
+        assert fulltext_index.search(['人工智能'], USER, 10) == [doc.id]
+        
+        doc.content = '量子计算取得突破。'
+        db.session.commit()
+        assert fulltext_index.search(['量子'], USER, 10) == [doc.id]
+        assert fulltext_index.search(['深度学习'], USER, 10) == []
+        
+        db.session.delete(other)
+        db.session.commit()
+        assert fulltext_index.search(['足球'], USER, 10) == []
+    
+    def test_ranked_by_bm25_and_scoped_to_user(self, app):
+        """测试结果按bm25排序（标题命中优先），且只返回该用户的文档"""
+        body = add_document(USER, '科技新闻', '报道提到了芯片产业。')
+        titled = add_document(USER, '芯片产业报告', '本季度的产业数据。')
+        add_document(USER + 1, '芯片产业', '其他用户的文档。')
+        
+        assert fulltext_index.search(['芯片'], USER, 10) == [titled.id, body.id]
+        assert fulltext_index.search(['芯片'], USER, 1) == [titled.id]
+    
+    def test_query_quoting(self, app):
+        """测试关键词中的FTS5语法字符按普通文本处理"""
+        add_document(USER, '标题', '内容')
+        
+        assert fulltext_index.search(['"OR', 'NEAR('], USER, 10) == []
+    
+    def test_rebuild_backfills_existing_documents(self, app):
+        """测试已有数据库（建表前写入的文档）经重建后可检索"""
+        db.session.execute(text(f'DROP TABLE {fulltext_index.FTS_TABLE}'))
+        db.session.commit()
+        fulltext_index._available.clear()
+        doc = add_document(USER, '人工智能', '新闻内容')
+        assert fulltext_index.is_available(db.session.connection()) is False
+        
+        assert fulltext_index.rebuild() == 1
+        assert fulltext_index.search(['人工智能'], USER, 10) == [doc.id]
+    
+    def test_old_layout_waits_for_rebuild(self, app):
+        """测试没有 owner 列的旧表视为未建；重建后按 owner 词限定用户，正文中的同名词不影响范围"""
+        db.session.execute(text(f'DROP TABLE {fulltext_index.FTS_TABLE}'))
+        db.session.execute(text(
+            f'CREATE VIRTUAL TABLE {fulltext_index.FTS_TABLE} USING fts5(title, content, user_id UNINDEXED)'
+        ))
+        db.session.commit()
+        fulltext_index._available.clear()
+        assert fulltext_index.is_available(db.session.connection()) is False
+        
+        doc = add_document(USER, '芯片产业', '新闻内容')
+        add_document(USER + 1, '芯片', f'{fulltext_index.owner_token(USER)} 芯片')
+        assert fulltext_index.rebuild() == 2
+        
+        assert fulltext_index.search(['芯片'], USER, 10) == [doc.id]
+        assert dict(bm25_index.load_user_tokens(USER)) == {doc.id: ['芯片', '产业', '新闻', '内容']}
@@ -0,0 +1,49 @@
+import pytest
+from services.hybrid_search import reciprocal_rank_fusion, extract_keywords
+
+class TestHybridSearch:
+    """混合检索相关测试"""
+    
+    def test_rrf_rewards_documents_found_by_both(self):
+        """测试两路都命中的文档排在只被一路命中的文档之前"""
+        fused = reciprocal_rank_fusion([[1, 2, 3], [3, 4]], k=60)
+        
+        assert [doc_id for doc_id, _ in fused] == [3, 1, 2, 4]
+        assert fused[0][1] == pytest.approx(1 / 63 + 1 / 61)
+    
+    def test_rrf_empty(self):
+        """测试两路都没有结果"""
+        assert reciprocal_rank_fusion([[], []]) == []
+    
+    def test_extract_keywords_filters_stopwords(self):
+        """测试分词后去掉停用词与单字，没有关键词时使用原始查询"""
+        keywords = extract_keywords('人工智能的发展')
+        
+        assert '的' not in keywords
+        assert '人工智能' in keywords
+        assert extract_keywords('的') == ['的']
+    
+    def test_semantic_search_fuses_vector_and_keyword_hits(self, client, auth_headers):
+        """测试知识库检索融合向量命中与关键词命中，按融合顺序返回"""
+        titles = ['量子计算突破', '量子通信网络建成', '足球联赛开幕']
+        for title in titles:
+            client.post(
+                '/api/documents/create',
+                headers=auth_headers,
+                json={'title': title, 'content': f'{title}。'}
+            )
+        
+        response = client.post(
+            '/api/search/semantic',
+            headers=auth_headers,
+            json={'query': '量子计算突破 量子计算突破。', 'min_similarity': 0.99}
+        )
+        
+        assert response.status_code == 200
+        results = response.json['results']
+        # 向量与关键词都命中的文档排第一；只含“量子”的文档仅被关键词检索命中
+        assert results[0]['title'] == '量子计算突破'
+        assert results[0]['similarity'] >= 0.99
+        assert '量子通信网络建成' in [doc['title'] for doc in results]
+        assert '足球联赛开幕' not in [doc['title'] for doc in results]
+        assert results[0]['score'] > results[-1]['score']
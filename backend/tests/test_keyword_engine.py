@@ -0,0 +1,54 @@
+import math
+import pytest
+from services import keyword_engine
+from services.enrichment import tfidf_keywords
+from services.analysis_service import AnalysisService
+
+TEXTS = [f'第{i}篇新闻：人工智能芯片产业发展，芯片出口增长' if i % 2 else f'第{i}篇新闻：国家队赢得比赛'
+         for i in range(20)]
+
+class TestKeywordEngine:
+    """关键词统计 map-reduce 相关测试"""
+
+    def test_counts(self):
+        """测试词频按出现次数、文档频率按文本数统计，单字不计入"""
+        term_frequency, document_frequency, count = keyword_engine.term_statistics(TEXTS[:2])
+
+        assert count == 2
+        assert term_frequency['芯片'] == 2
+        assert document_frequency['芯片'] == 1
+        assert document_frequency['新闻'] == 2
+        assert all(len(word) >= 2 for word in term_frequency)
+
+    def test_parallel_matches_serial(self):
+        """测试多进程分块统计的结果与单进程一致，输入可以是生成器"""
+        serial = keyword_engine.term_statistics(TEXTS)
+        parallel = keyword_engine.term_statistics((text for text in TEXTS), processes=2, chunk_size=3)
+
+        assert parallel == serial
+        assert serial[2] == len(TEXTS)
+
+    def test_extract_keywords_document_frequency(self):
+        """测试关键词结果附带包含该词的文本数，空输入返回空列表"""
+        keywords = {item['keyword']: item for item in AnalysisService.extract_keywords(TEXTS, topK=20)}
+
+        assert keywords['芯片']['count'] == 20
+        assert keywords['芯片']['documents'] == 10
+        assert AnalysisService.extract_keywords(iter([])) == []
+
+    def test_document_frequency_adjusts_idf(self):
+        """测试合并后的文档频率参与IDF：出现在每篇文本中的词不加权，只出现在一半文本中的词乘以 1 + log 2"""
+        term_frequency, document_frequency, count = keyword_engine.term_statistics(TEXTS)
+        plain = dict(tfidf_keywords(term_frequency, 50))
+        adjusted = dict(tfidf_keywords(term_frequency, 50, document_frequency, count))
+
+        assert adjusted['新闻'] == pytest.approx(plain['新闻'])
+        assert adjusted['芯片'] == pytest.approx(plain['芯片'] * (1 + math.log(2)))
+
+    def test_term_counts_per_document(self):
+        """测试逐篇统计与单篇统计一致，进程池分块后顺序不变"""
+        with keyword_engine.worker_pool(2) as pool:
+            parallel = keyword_engine.term_counts(TEXTS, pool, chunk_size=3)
+
+        assert parallel == keyword_engine.term_counts(TEXTS)
+        assert parallel[1] == {'新闻': 1, '人工智能': 1, '芯片': 2, '产业': 1, '发展': 1, '出口': 1, '增长': 1}
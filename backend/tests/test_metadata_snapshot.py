@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+import numpy as np
+from models import db, Document
+from services import analytics_query
+from services.metadata_snapshot import MetadataSnapshot
+
+USER = 1
+
+NOW = datetime(2025, 10, 1, 12, 0, 0)
+
+ROWS = [
+    (1, NOW - timedelta(days=3), '科技', 'RSS'),
+    (2, NOW - timedelta(days=1, hours=2), '体育', 'web'),
+    (3, NOW - timedelta(hours=1), '科技', 'web'),
+    (4, NOW - timedelta(days=1, hours=1), None, 'RSS'),
+    (5, NOW, '', None),
+]
+
+def brute_force(rows, category=None, source=None, since=None, until=None):
+    """逐行筛选（时间按日期比较）"""
+    return [
+        row for row in rows
+        if (not category or row[2] == category) and (not source or row[3] == source)
+        and (since is None or row[1].date() >= since.date()) and (until is None or row[1].date() <= until.date())
+    ]
+
+class TestMetadataSnapshot:
+    """文档元数据列式快照相关测试"""
+
+    def test_queries_match_row_filters(self):
+        """测试计数、分布、按日趋势与逐行筛选结果一致，时间按日期比较，空分类计入 None"""
+        snapshot = MetadataSnapshot.build(ROWS)
+        since = NOW - timedelta(days=1, hours=1, minutes=30)
+
+        assert list(snapshot.ids) == [1, 2, 4, 3, 5]
+        assert snapshot.count() == 5
+        assert snapshot.count(since=since) == len(brute_force(ROWS, since=since)) == 4
+        assert snapshot.count(until=since) == len(brute_force(ROWS, until=since)) == 3
+        assert snapshot.count(category='科技', source='web') == 1
+        assert snapshot.count(category='财经') == 0
+        assert snapshot.distribution('category') == {'科技': 2, '体育': 1, None: 2}
+        assert snapshot.distribution('source', category='科技') == {'RSS': 1, 'web': 1}
+        assert snapshot.daily_counts(since=NOW - timedelta(days=2)) == {'2025-09-30': 2, '2025-10-01': 2}
+        assert MetadataSnapshot.empty().daily_counts() == {}
+
+    def test_with_changes_keeps_time_order(self):
+        """测试新增、修改、删除后生成的新快照仍按时间有序，原快照不变"""
+        snapshot = MetadataSnapshot.build(ROWS)
+
+        updated = snapshot.with_changes([
+            (2, None),
+            (3, (NOW - timedelta(days=5), '财经', 'RSS')),
+            (6, (NOW - timedelta(days=2), '科技', 'RSS')),
+        ])
+
+        assert list(updated.ids) == [3, 1, 6, 4, 5]
+        assert np.all(np.diff(updated.created_at) >= 0)
+        assert updated.distribution('category') == {'科技': 2, '财经': 1, None: 2}
+        assert snapshot.count() == 5
+
+    def test_cache_follows_commits(self, app):
+        """测试已加载的快照随提交增量更新，回滚的写入不生效，结果与汇总表一致"""
+        now = datetime.utcnow()
+        chip = Document(user_id=USER, title='芯片', content='正文', category='科技', source='RSS', created_at=now)
+        football = Document(user_id=USER, title='足球', content='正文', category='体育', source='web',
+                            created_at=now - timedelta(days=2))
+        db.session.add_all([chip, football])
+        db.session.commit()
+
+        cache = app.config['METADATA_CACHE']
+        assert analytics_query.category_distribution(USER) == {'科技': 1, '体育': 1}
+        loaded = cache.get(USER)
+
+        chip.category = '财经'
+        db.session.commit()
+        football.user_id = 2
+        db.session.commit()
+        db.session.add(Document(user_id=USER, title='草稿', content='正文', category='科技'))
+        db.session.flush()
+        db.session.rollback()
+
+        assert analytics_query.category_distribution(USER) == {'财经': 1}
+        assert cache.get(USER) is not loaded
+        assert cache.loaded_users() == [USER]
+        assert analytics_query.daily_counts(USER, since=now - timedelta(days=7), until=now) == \
+            {now.strftime('%Y-%m-%d'): 1}
+
+        app.config['METADATA_CACHE'] = None
+        assert analytics_query.category_distribution(USER) == {'财经': 1}
+        assert analytics_query.count_documents(2, source='web') == 1
+
+    def test_snapshot_matches_rollups(self, app):
+        """测试时间条件落在一天中间时，快照与按日汇总表的结果相同"""
+        now = datetime.utcnow()
+        midnight = datetime.combine(now.date(), datetime.min.time())
+        db.session.add_all([
+            Document(user_id=USER, title=str(hours), content='正文', category='科技', source='RSS',
+                     created_at=midnight - timedelta(hours=hours))
+            for hours in (1, 20, 30, 50, 70)
+        ])
+        db.session.commit()
+        windows = [
+            (midnight - timedelta(hours=25), now, {}),
+            (midnight - timedelta(hours=60), midnight - timedelta(hours=40), {}),
+            (midnight - timedelta(hours=60), midnight - timedelta(hours=25), {'category': '科技'}),
+        ]
+
+        def query():
+            return [(analytics_query.count_documents(USER, since=since, until=until, **f),
+                     analytics_query.category_distribution(USER, since=since, until=until, **f),
+                     analytics_query.daily_counts(USER, since, until, **f)) for since, until, f in windows]
+        cached = query()
+        app.config['METADATA_CACHE'] = None
+
+        assert cached == query()
+        assert [count for count, _, _ in cached] == [3, 3, 3]
@@ -0,0 +1,70 @@
+from app import warm_up_steps
+from readiness import Readiness
+from vector_store import VectorStore
+
+class TestReadiness:
+    """启动预热与就绪探针相关测试"""
+    
+    def test_readiness_states(self):
+        """测试预热完成后就绪"""
+        readiness = Readiness()
+        assert readiness.state == 'starting'
+        
+        readiness.start([('noop', lambda: None)])
+        
+        assert readiness.wait(timeout=5) is True
+        assert readiness.report()['ready_seconds'] > 0
+        assert 'noop' in readiness.report()['warm_up']
+    
+    def test_model_loaded_lazily(self, client, app):
+        """测试创建应用时不加载嵌入模型，未开启预热时直接就绪"""
+        response = client.get('/ready')
+        
+        assert response.status_code == 200
+        assert response.json['status'] == 'ready'
+        assert response.json['model_loaded'] is False
+        assert response.json['app_created_seconds'] >= 0
+    
+    def test_warm_up_steps(self, client, app):
+        """测试应用预热加载模型与jieba词典，并记录各步骤耗时"""
+        app.config['READINESS'].warm_up(warm_up_steps(app))
+        
+        response = client.get('/ready')
+        assert response.status_code == 200
+        assert response.json['model_loaded'] is True
+        assert set(response.json['warm_up']) == {'vector_store', 'jieba'}
+        assert set(response.json['warm_up']['vector_store']) == {'model', 'encode', 'partitions'}
+    
+    def test_failed_warm_up_is_not_ready(self, client, app):
+        """测试预热失败时 /ready 返回503"""
+        readiness = app.config['READINESS']
+        
+        def broken():
+            raise RuntimeError('model download failed')
+        readiness.warm_up([('vector_store', broken)])
+        
+        response = client.get('/ready')
+        assert response.status_code == 503
+        assert response.json['status'] == 'failed'
+        assert 'model download failed' in response.json['error']
+    
+    def test_time_to_first_query_recorded(self, client, auth_headers, app):
+        """测试记录进程启动到首个查询完成的耗时"""
+        assert client.get('/ready').json['time_to_first_query_seconds'] is None
+        
+        client.post('/api/search/vector', headers=auth_headers, json={'query': '人工智能'})
+        
+        assert client.get('/ready').json['time_to_first_query_seconds'] > 0
+    
+    def test_vector_store_warm_up(self, tmp_path):
+        """测试向量库预热加载指定用户的分区"""
+        store = VectorStore(index_path=str(tmp_path / 'faiss_index'))
+        store.add_document(1, '人工智能', 7)
+        store.close()
+        store = VectorStore(index_path=store.index_path)
+        
+        timings = store.warm_up([7])
+        
+        assert store.model_loaded is True
+        assert store.loaded_partitions() == [7]
+        assert set(timings) == {'model', 'encode', 'partitions'}
@@ -0,0 +1,112 @@
+import time
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy.exc import IntegrityError
+from models import db, Document, ReportJob
+from services import report_jobs
+from services.analysis_service import AnalysisService
+
+USER = 1
+
+def add_documents(count, user_id=USER):
+    db.session.add_all([
+        Document(user_id=user_id, title='芯片', content='芯片产业报告。', category='科技', source='RSS')
+        for _ in range(count)
+    ])
+    db.session.commit()
+
+def wait_until_finished(job, timeout=30):
+    """轮询任务直到完成或失败"""
+    deadline = time.monotonic() + timeout
+    while job.status in report_jobs.ACTIVE and time.monotonic() < deadline:
+        time.sleep(0.05)
+        db.session.refresh(job)
+    return job
+
+class TestReportJobs:
+    """分析报告后台任务相关测试"""
+
+    def test_finished_report_reused_until_data_changes(self, app):
+        """测试数据版本不变时复用已完成的报告，文档写入后重新生成并删除旧结果"""
+        add_documents(3)
+
+        job = report_jobs.submit(USER, 'all', run_inline=True)
+        assert job.status == 'done'
+        assert job.progress == 1.0
+        assert job.to_dict()['report']['total_documents'] == 3
+
+        first_id = job.id
+        assert report_jobs.submit(USER, 'all', run_inline=True).id == first_id
+
+        add_documents(1)
+        refreshed = report_jobs.submit(USER, 'all', run_inline=True)
+        assert refreshed.id != first_id
+        assert refreshed.to_dict()['report']['total_documents'] == 4
+        assert db.session.get(ReportJob, first_id) is None
+
+    def test_background_job_reports_progress(self, app):
+        """测试后台线程生成报告，提交立即返回，轮询得到进度与结果"""
+        add_documents(2)
+
+        job = report_jobs.submit(USER, '7days')
+        assert job.status in report_jobs.ACTIVE or job.status == 'done'
+        assert report_jobs.submit(USER, '7days').id == job.id
+
+        job = wait_until_finished(job)
+        data = job.to_dict()
+        assert data['status'] == 'done'
+        assert data['stage'] == 'time_trend'
+        assert data['report']['top_keywords'][0]['keyword'] == '芯片'
+        assert report_jobs.get(job.id, 2) is None
+
+    def test_failed_job_records_error(self, app, monkeypatch):
+        """测试报告生成出错时任务标记为失败并记录原因，失败的任务不被复用"""
+        add_documents(1)
+
+        def broken(*args, **kwargs):
+            raise RuntimeError('rollups unavailable')
+        monkeypatch.setattr(AnalysisService, 'user_summary_report', broken)
+
+        job = report_jobs.submit(USER, 'all', run_inline=True)
+        assert job.status == 'failed'
+        assert job.error == 'rollups unavailable'
+        assert 'report' not in job.to_dict()
+        assert report_jobs.find(USER, 'all', job.data_version) is None
+
+    def test_dated_report_expires_next_day(self, app, monkeypatch):
+        """测试7天报告在数据版本不变时只当天复用，次日重新生成；全部时间范围的报告不受日期影响"""
+        add_documents(2)
+        dated = report_jobs.submit(USER, '7days', run_inline=True).id
+        whole = report_jobs.submit(USER, 'all', run_inline=True).id
+        assert report_jobs.submit(USER, '7days', run_inline=True).id == dated
+
+        tomorrow = datetime.utcnow() + timedelta(days=1)
+
+        class Tomorrow(datetime):
+            @classmethod
+            def utcnow(cls):
+                return tomorrow
+        monkeypatch.setattr(report_jobs, 'datetime', Tomorrow)
+
+        refreshed = report_jobs.submit(USER, '7days', run_inline=True)
+        assert refreshed.id != dated
+        assert refreshed.status == 'done'
+        assert report_jobs.submit(USER, 'all', run_inline=True).id == whole
+
+    def test_one_active_job_per_version(self, app):
+        """测试同一版本只能有一个活跃任务，超时的活跃任务在重新提交时标记为失败并被清理"""
+        version = report_jobs.data_version.current(USER)
+        stale = ReportJob(id='a' * 32, user_id=USER, time_range='all', data_version=version, status='running',
+                          created_at=datetime.utcnow() - timedelta(days=1))
+        db.session.add(stale)
+        db.session.commit()
+
+        db.session.add(ReportJob(id='b' * 32, user_id=USER, time_range='all', data_version=version))
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+
+        job = report_jobs.submit(USER, 'all', run_inline=True)
+        assert job.status == 'done'
+        # 标记为失败后随新任务完成一并清理
+        assert db.session.get(ReportJob, 'a' * 32) is None
@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from models import db, Document, DocumentEnrichment, DailyDocumentRollup, DailyTermRollup
+from services import analytics_query, rollups
+from services.analysis_service import AnalysisService
+
+USER = 1
+
+def snapshot():
+    """两张汇总表的全部行"""
+    documents = {
+        (row.user_id, row.day, row.category, row.source): row.doc_count
+        for row in db.session.execute(select(DailyDocumentRollup)).scalars()
+    }
+    terms = {
+        (row.user_id, row.day, row.category, row.source, row.term): row.count
+        for row in db.session.execute(select(DailyTermRollup)).scalars()
+    }
+    return documents, terms
+
+class TestRollups:
+    """按日汇总表相关测试"""
+
+    def test_incremental_maintenance_equals_rebuild(self, app):
+        """测试新增、修改分类与正文、修改创建时间、删除后的汇总与重新计算一致"""
+        yesterday = datetime.utcnow() - timedelta(days=1)
+        chip = Document(user_id=USER, title='芯片', content='芯片产业报告。', category='科技', source='RSS')
+        football = Document(user_id=USER, title='足球', content='国家队赢得比赛。', category='体育')
+        other = Document(user_id=2, title='芯片', content='芯片出口。', category='科技', created_at=yesterday)
+        db.session.add_all([chip, football, other])
+        db.session.commit()
+
+        chip.category = '财经'
+        football.content = '联赛冠军产生。'
+        other.created_at = yesterday - timedelta(days=3)
+        db.session.commit()
+        db.session.delete(football)
+        db.session.commit()
+
+        incremental = snapshot()
+        rollups.rebuild()
+
+        assert snapshot() == incremental
+        assert all(count > 0 for count in incremental[0].values())
+        assert not any(key[4] == '比赛' for key in incremental[1])
+
+    def test_parallel_rebuild_without_enrichment(self, app):
+        """测试缺少富化记录时由进程池补算词频，多批文档共用进程池，结果与增量维护一致"""
+        db.session.add_all([
+            Document(user_id=USER, title=f'第{i}篇', content='芯片产业报告。' if i % 2 else '国家队赢得比赛。',
+                     category='科技' if i % 3 else '体育')
+            for i in range(80)
+        ])
+        db.session.commit()
+        incremental = snapshot()
+        DocumentEnrichment.query.delete()
+        db.session.commit()
+
+        assert rollups.rebuild(batch_size=50, processes=2) == 80
+        assert snapshot() == incremental
+
+    def test_queries_read_rollups(self, app):
+        """测试计数、分布、按日趋势与词频从汇总表读取"""
+        now = datetime.utcnow()
+        db.session.add_all([
+            Document(user_id=USER, title='芯片', content='芯片产业。', category='科技', source='RSS', created_at=now),
+            Document(user_id=USER, title='芯片出口', content='数据创新高。', category='科技', source='web',
+                     created_at=now - timedelta(days=2)),
+            Document(user_id=USER, title='足球', content='联赛。', source='RSS', created_at=now - timedelta(days=40)),
+        ])
+        db.session.commit()
+        week_ago = now - timedelta(days=7)
+
+        assert analytics_query.count_documents(USER) == 3
+        assert analytics_query.count_documents(USER, since=week_ago) == 2
+        assert analytics_query.count_documents(USER, category='科技') == 2
+        assert analytics_query.category_distribution(USER) == {'科技': 2, None: 1}
+        assert analytics_query.term_counts(USER, since=week_ago)['芯片'] == 3
+        assert '足球' not in analytics_query.term_counts(USER, since=week_ago)
+
+        report = AnalysisService.user_summary_report(USER, time_range='7days')
+        assert report['total_documents'] == 2
+        assert report['top_keywords'][0]['keyword'] == '芯片'
+        assert report['source_distribution'] == {'RSS': 1, 'web': 1}
+        assert sum(report['time_trend'].values()) == 2
+        assert AnalysisService.user_summary_report(USER)['category_distribution'] == {'科技': 2, '未分类': 1}
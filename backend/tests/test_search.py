@@ -33,7 +33,7 @@ class TestSearch:
             # 添加到向量库
             vector_store = app.config['VECTOR_STORE']
             text = f"{doc.title} {doc.content}"
-            vector_store.add_document(doc.id, text)
+            vector_store.add_document(doc.id, text, doc.user_id)
             doc.vector_id = doc.id
             db.session.commit()
         
@@ -48,6 +48,55 @@ class TestSearch:
         assert response.json['count'] >= 0
         assert 'results' in response.json
     
+    def test_vector_search_applies_similarity_threshold(self, client, auth_headers):
+        """测试向量检索只返回相似度不低于阈值的文档"""
+        created = client.post(
+            '/api/documents/create',
+            headers=auth_headers,
+            json={'title': '量子计算突破', 'content': '科学家实现了新的量子纠错方案。'}
+        )
+        doc_id = created.json['document']['id']
+        
+        response = client.post(
+            '/api/search/vector',
+            headers=auth_headers,
+            json={'query': '量子计算突破 科学家实现了新的量子纠错方案。', 'min_similarity': 0.99}
+        )
+        assert response.status_code == 200
+        assert [doc['id'] for doc in response.json['results']] == [doc_id]
+        assert response.json['results'][0]['similarity'] >= 0.99
+        assert response.json['results'][0]['passage'] == '量子计算突破 科学家实现了新的量子纠错方案。'
+        
+        response = client.post(
+            '/api/search/vector',
+            headers=auth_headers,
+            json={'query': '足球联赛', 'min_similarity': 0.99}
+        )
+        assert response.status_code == 200
+        assert response.json['count'] == 0
+    
+    def test_batch_search_returns_results_per_query(self, client, auth_headers):
+        """测试批量检索按查询顺序分别返回结果"""
+        created = client.post(
+            '/api/documents/create',
+            headers=auth_headers,
+            json={'title': '量子计算突破', 'content': '科学家实现了新的量子纠错方案。'}
+        )
+        doc_id = created.json['document']['id']
+        
+        response = client.post(
+            '/api/search/batch',
+            headers=auth_headers,
+            json={'queries': ['量子计算突破 科学家实现了新的量子纠错方案。', '足球联赛'], 'k': 1}
+        )
+        assert response.status_code == 200
+        assert [item['query'] for item in response.json['results']] == ['量子计算突破 科学家实现了新的量子纠错方案。', '足球联赛']
+        assert response.json['results'][0]['results'][0]['id'] == doc_id
+        assert response.json['results'][0]['results'][0]['passage'] == '量子计算突破 科学家实现了新的量子纠错方案。'
+        
+        response = client.post('/api/search/batch', headers=auth_headers, json={'queries': []})
+        assert response.status_code == 400
+    
     def test_web_search(self, client, auth_headers):
         """测试联网搜索"""
         response = client.post(
@@ -0,0 +1,154 @@
+import pytest
+import services.search_cache as search_cache_module
+from models import db, Document, SearchHistory
+from routes.search import cached_search
+from services import data_version
+from services.bm25_index import KeywordIndex
+from services.search_cache import SearchCache
+
+USER = 1
+
+class TestSearchCache:
+    """检索结果缓存相关测试"""
+
+    def test_hit_requires_same_version(self):
+        """测试同一版本命中，版本变化后视为过期"""
+        cache = SearchCache()
+        key = cache.make_key(USER, 'hybrid', '人工智能', k=10)
+        cache.put(key, 3, ['结果'])
+
+        assert cache.get(key, 3) == ['结果']
+        assert cache.get(key, 4) is None
+        assert cache.get(key, 3) is None
+
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses'], stats['stale']) == (1, 2, 1)
+        assert stats['hit_rate'] == pytest.approx(1 / 3, abs=1e-4)
+
+    def test_key_normalizes_query(self):
+        """测试查询中仅空白或全角差异时使用同一键，参数不同时键不同"""
+        assert SearchCache.make_key(USER, 'hybrid', ' 人工智能　芯片 ', k=10, min_similarity=0.6) == \
+            SearchCache.make_key('1', 'hybrid', '人工智能 芯片', min_similarity=0.6, k=10)
+        assert SearchCache.make_key(USER, 'hybrid', '芯片', k=10) != SearchCache.make_key(USER, 'hybrid', '芯片', k=5)
+        assert SearchCache.make_key(USER, 'batch', ['a', 'b  c']) == SearchCache.make_key(USER, 'batch', ['a', 'b c'])
+
+    def test_key_accepts_json_params(self):
+        """测试参数值为列表或对象时也能计算键，对象的键顺序不影响结果"""
+        cache = SearchCache()
+        key = cache.make_key(USER, 'hybrid', '芯片', k=[10], filters={'source': 'RSS', 'category': '科技'})
+        cache.put(key, 0, ['结果'])
+
+        assert cache.get(
+            SearchCache.make_key(USER, 'hybrid', '芯片', filters={'category': '科技', 'source': 'RSS'}, k=[10]), 0
+        ) == ['结果']
+        assert SearchCache.make_key(USER, 'hybrid', '芯片', k=[10]) != key
+
+    def test_least_recently_used_evicted(self):
+        """测试超过条目上限时淘汰最久未用的条目"""
+        cache = SearchCache(max_entries=2)
+        for name in ('a', 'b'):
+            cache.put(name, 0, name)
+        cache.get('a', 0)
+        cache.put('c', 0, 'c')
+
+        assert cache.get('b', 0) is None
+        assert cache.get('a', 0) == 'a'
+        assert cache.stats()['evictions'] == 1
+
+    def test_ttl_expiry(self, monkeypatch):
+        """测试超过存活时间的条目不再返回"""
+        now = [100.0]
+        monkeypatch.setattr(search_cache_module.time, 'monotonic', lambda: now[0])
+        cache = SearchCache(ttl=10)
+        cache.put('a', 0, 'a')
+
+        now[0] = 109.0
+        assert cache.get('a', 0) == 'a'
+        now[0] = 110.0
+        assert cache.get('a', 0) is None
+        assert cache.stats()['expired'] == 1
+
+class TestDataVersion:
+    """用户数据版本相关测试"""
+
+    def test_document_writes_bump_version(self, app):
+        """测试文档新增、修改、删除各使版本加1，回滚与其他表的写入不改变版本"""
+        assert data_version.current(USER) == 0
+
+        doc = Document(user_id=USER, title='人工智能', content='芯片')
+        db.session.add(doc)
+        db.session.commit()
+        assert data_version.current(USER) == 1
+
+        doc.content = '量子计算'
+        db.session.commit()
+        assert data_version.current(USER) == 2
+
+        db.session.add(Document(user_id=USER, title='足球', content='联赛'))
+        db.session.flush()
+        db.session.rollback()
+        db.session.add(SearchHistory(user_id=USER, query='芯片', result_count=0, search_type='knowledge_base'))
+        db.session.commit()
+        assert data_version.current(USER) == 2
+
+        db.session.delete(db.session.get(Document, doc.id))
+        db.session.commit()
+        assert data_version.current(USER) == 3
+
+    def test_moving_document_bumps_both_users(self, app):
+        """测试修改文档所属用户时新旧用户的版本都变化"""
+        doc = Document(user_id=USER, title='人工智能', content='芯片')
+        db.session.add(doc)
+        db.session.commit()
+
+        doc.user_id = 2
+        db.session.commit()
+
+        assert data_version.current(USER) == 2
+        assert data_version.current(2) == 1
+
+class TestCachedSearch:
+    """检索接口缓存相关测试"""
+
+    def test_edit_invalidates_cached_results(self, app):
+        """测试重复查询命中缓存，文档变更后重新检索"""
+        calls = []
+
+        def compute(version):
+            calls.append(version)
+            return ['结果']
+
+        with app.test_request_context():
+            assert cached_search(USER, 'hybrid', '芯片', compute, k=10) == ['结果']
+            assert cached_search(USER, 'hybrid', ' 芯片 ', compute, k=10) == ['结果']
+            assert calls == [0]
+
+            db.session.add(Document(user_id=USER, title='芯片', content='产业报告'))
+            db.session.commit()
+            cached_search(USER, 'hybrid', '芯片', compute, k=10)
+
+            assert calls == [0, 1]
+            stats = app.config['SEARCH_CACHE'].stats()
+            assert (stats['hits'], stats['misses'], stats['stale']) == (1, 2, 1)
+
+class TestKeywordIndexVersion:
+    """关键词索引版本跟踪相关测试"""
+
+    def test_rebuilds_only_when_behind(self):
+        """测试本进程提交的写入推进索引版本，出现其他进程的写入（版本不连续）时重新构建"""
+        loads = []
+
+        def loader(user_id):
+            loads.append(user_id)
+            return [(1, ['芯片'])]
+        keyword_index = KeywordIndex(loader)
+
+        keyword_index.get(USER, version=1)
+        keyword_index.apply([(USER, 2, '足球联赛')], {USER: (1, 2)})
+        assert [doc_id for doc_id, _ in keyword_index.search(USER, ['足球'], 10, version=2)] == [2]
+        assert len(loads) == 1
+
+        # 版本3来自其他进程，本进程只看到 3 -> 4
+        keyword_index.apply([(USER, 3, '量子计算')], {USER: (3, 4)})
+        keyword_index.get(USER, version=4)
+        assert len(loads) == 2
@@ -0,0 +1,74 @@
+import os
+from collections import Counter
+import jieba
+import jieba.analyse
+import pytest
+import services.segmenter as segmenter
+from services import keyword_engine
+from services.analysis_service import AnalysisService
+
+@pytest.fixture(autouse=True)
+def restore_segmenter():
+    """测试结束后恢复默认的jieba缓存目录与查询分词缓存"""
+    tmp_dir = jieba.dt.tmp_dir
+    yield
+    jieba.dt.tmp_dir = tmp_dir
+    segmenter.configure()
+
+class TestSegmenter:
+    """jieba分词封装相关测试"""
+
+    def test_query_memo(self):
+        """测试重复查询命中缓存，结果与直接分词一致"""
+        segmenter.configure(memo_items=2)
+
+        first = segmenter.cut_query('人工智能芯片')
+        second = segmenter.cut_query('人工智能芯片')
+
+        assert first == tuple(jieba.cut_for_search('人工智能芯片'))
+        assert second is first
+        info = segmenter.memo_info()
+        assert (info['hits'], info['misses'], info['entries']) == (1, 1, 1)
+
+    def test_memo_disabled(self):
+        """测试缓存条目数为0时不缓存"""
+        segmenter.configure(memo_items=0)
+
+        assert segmenter.cut_query('足球联赛') == tuple(jieba.cut_for_search('足球联赛'))
+        assert segmenter.memo_info() is None
+
+    def test_cache_dir(self, tmp_path):
+        """测试词典模型缓存文件放在指定目录"""
+        segmenter.configure(cache_dir=str(tmp_path / 'jieba'))
+
+        assert os.path.dirname(segmenter.cache_file()) == str(tmp_path / 'jieba')
+
+    def test_parallel_matches_serial(self):
+        """测试进程池中的分词结果与当前进程一致"""
+        texts = [f'第{i}篇新闻报道人工智能芯片产业' for i in range(10)]
+
+        term_frequency, _, _ = keyword_engine.term_statistics(texts, processes=2, chunk_size=3)
+
+        assert term_frequency == Counter(
+            word for text in texts for word in segmenter.cut(text) if keyword_engine.is_term(word)
+        )
+
+    def test_process_pool_uses_parent_settings(self, tmp_path):
+        """测试进程池的子进程不经fork启动，按父进程的设置从同一词典缓存加载"""
+        segmenter.configure(cache_dir=str(tmp_path / 'jieba'))
+
+        with segmenter.process_pool(1) as pool:
+            assert pool.submit(segmenter.cache_file).result() == segmenter.cache_file()
+            assert pool.submit(segmenter.cut, '人工智能芯片').result() == segmenter.cut('人工智能芯片')
+        assert os.path.exists(segmenter.cache_file())
+
+    def test_keyword_weights_match_extract_tags(self):
+        """测试关键词权重与 jieba.analyse.extract_tags 一致"""
+        text = '人工智能芯片产业快速发展，芯片出口数据创新高，人工智能应用持续扩大'
+
+        keywords = AnalysisService.extract_keywords([text], topK=5)
+        expected = jieba.analyse.extract_tags(text, topK=5, withWeight=True)
+
+        assert [item['keyword'] for item in keywords] == [word for word, _ in expected]
+        assert [item['weight'] for item in keywords] == pytest.approx([weight for _, weight in expected])
+        assert keywords[0]['count'] >= 1
@@ -0,0 +1,50 @@
+import pytest
+from services.text_chunker import TextChunker
+
+class TestTextChunker:
+    """文本切分相关测试"""
+    
+    def test_short_text_is_single_chunk(self):
+        """测试短文本整体作为一个片段，空白文本不产生片段"""
+        chunker = TextChunker()
+        
+        assert [chunk.text for chunk in chunker.iter_chunks('  短文本 ')] == ['短文本']
+        assert list(chunker.iter_chunks('   ')) == []
+    
+    def test_splits_at_sentence_boundaries_with_overlap(self):
+        """测试优先在句子边界切分，片段偏移与原文一致，相邻片段有重叠"""
+        chunker = TextChunker(chunk_size=16, overlap=8)
+        text = '第一句话在这里。第二句话在这里。第三句话在这里。'
+        
+        chunks = list(chunker.iter_chunks(text))
+        
+        assert [chunk.text for chunk in chunks] == ['第一句话在这里。第二句话在这里。', '第二句话在这里。第三句话在这里。']
+        assert all(text[chunk.start:chunk.end] == chunk.text for chunk in chunks)
+    
+    def test_long_sentence_is_hard_split(self):
+        """测试超过片段长度的句子按词元硬切分"""
+        chunker = TextChunker(chunk_size=5, overlap=1)
+        
+        chunks = [chunk.text for chunk in chunker.iter_chunks('一二三四五六七八九十一二三')]
+        
+        assert chunks == ['一二三四五', '六七八九十', '一二三']
+    
+    def test_english_words_count_as_single_units(self):
+        """测试英文单词按整词计数，不在单词中间切开"""
+        chunker = TextChunker(chunk_size=4, overlap=1)
+        
+        chunks = [chunk.text for chunk in chunker.iter_chunks('alpha beta gamma delta epsilon')]
+        
+        assert chunks == ['alpha beta gamma delta', 'epsilon']
+    
+    def test_passage_returns_numbered_chunk(self):
+        """测试按序号取片段"""
+        chunker = TextChunker(chunk_size=5, overlap=1)
+        
+        assert chunker.passage('一二三四五六七八九十', 1).text == '六七八九十'
+        assert chunker.passage('一二三四五六七八九十', 5) is None
+    
+    def test_overlap_must_be_smaller_than_chunk_size(self):
+        """测试重叠长度不小于片段长度时报错"""
+        with pytest.raises(ValueError):
+            TextChunker(chunk_size=10, overlap=10)
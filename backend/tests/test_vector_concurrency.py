@@ -0,0 +1,129 @@
+import random
+import threading
+import numpy as np
+import pytest
+import vector_view
+from vector_partition import VectorPartition
+
+DIMENSION = 16
+STABLE = 200  # 从不修改的向量ID为 0..STABLE-1
+
+def unit_vectors(rng, count):
+    vectors = rng.standard_normal((count, DIMENSION)).astype('float32')
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+@pytest.fixture
+def partition(tmp_path, monkeypatch):
+    """小合并阈值的分区，使压测期间频繁合并"""
+    monkeypatch.setattr(vector_view, 'MERGE_THRESHOLD', 16)
+    partition = VectorPartition(str(tmp_path / 'partition'), 'test-model', DIMENSION)
+    yield partition
+    partition.close()
+
+class TestVectorConcurrency:
+    """读写并发相关测试"""
+    
+    def test_writes_publish_new_views(self, partition):
+        """测试写操作发布新视图，旧视图保持不变"""
+        rng = np.random.default_rng(0)
+        partition.add(np.arange(3, dtype='int64'), unit_vectors(rng, 3))
+        before = partition.view
+        
+        partition.remove(np.array([0], dtype='int64'))
+        
+        assert before.size == 3
+        assert partition.view.size == 2
+        assert partition.view.version > before.version
+        assert sorted(before.stored_ids().tolist()) == [0, 1, 2]
+    
+    def test_mixed_searches_and_writes_stay_consistent(self, partition):
+        """压测：并发检索、写入、检查点与索引迁移，检索结果始终一致"""
+        rng = np.random.default_rng(1)
+        stable = unit_vectors(rng, STABLE)
+        partition.add(np.arange(STABLE, dtype='int64'), stable)
+        churn_ids = np.arange(1000, 1400, dtype='int64')
+        churn_vectors = unit_vectors(rng, len(churn_ids))
+        
+        errors = []
+        stop = threading.Event()
+        live = {}
+        live_lock = threading.Lock()
+        
+        def record(fn):
+            def run():
+                try:
+                    fn()
+                except Exception as e:  # 交给主线程断言
+                    errors.append(e)
+                    stop.set()
+            return run
+        
+        @record
+        def writer():
+            local = random.Random(2)
+            for _ in range(600):
+                if stop.is_set():
+                    return
+                picked = np.array(local.sample(range(len(churn_ids)), 5))
+                ids = churn_ids[picked]
+                if local.random() < 0.3:
+                    partition.remove(ids)
+                    with live_lock:
+                        for doc_id in ids.tolist():
+                            live.pop(doc_id, None)
+                else:
+                    partition.add(ids, churn_vectors[picked])
+                    with live_lock:
+                        for doc_id in ids.tolist():
+                            live[doc_id] = True
+        
+        @record
+        def reader():
+            local = np.random.default_rng(threading.get_ident() % 1000)
+            while not stop.is_set():
+                targets = local.integers(0, STABLE, 4)
+                distances, ids = partition.search(stable[targets], 5)
+                for row, target in enumerate(targets):
+                    found = ids[row][ids[row] != -1]
+                    assert found[0] == target, (found, target)
+                    assert distances[row][0] == pytest.approx(0.0, abs=1e-4)
+                    assert len(set(found.tolist())) == len(found)
+                    assert np.all(np.diff(distances[row][:len(found)]) >= -1e-5)
+                    assert all(doc_id < STABLE or doc_id in range(1000, 1400) for doc_id in found)
+                view = partition.view
+                assert view.size == len(view.stored_ids())
+                assert len(np.unique(view.stored_ids())) == view.size
+        
+        @record
+        def maintainer():
+            for _ in range(20):
+                if stop.is_set():
+                    return
+                partition.checkpoint()
+            partition.migrate('hnsw')
+            for _ in range(20):
+                if stop.is_set():
+                    return
+                partition.checkpoint()
+        
+        readers = [threading.Thread(target=reader) for _ in range(4)]
+        writers = [threading.Thread(target=writer), threading.Thread(target=maintainer)]
+        for thread in readers + writers:
+            thread.start()
+        for thread in writers:
+            thread.join(timeout=120)
+        stop.set()
+        for thread in readers:
+            thread.join(timeout=30)
+        
+        assert errors == []
+        assert partition.index_kind == 'hnsw'
+        expected = set(range(STABLE)) | set(live)
+        assert set(partition.view.stored_ids().tolist()) == expected
+        assert partition.size == len(expected)
+        
+        # 重启后从快照与日志恢复到同样的状态
+        partition.close()
+        reloaded = VectorPartition(partition.path, 'test-model', DIMENSION)
+        assert set(reloaded.view.stored_ids().tolist()) == expected
+        reloaded.close()
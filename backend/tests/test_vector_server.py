@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import threading
+import numpy as np
+import pytest
+from vector_store import VectorStore
+from vector_server import VectorServer
+from vector_client import VectorStoreClient, VectorServerError
+
+USER = 1
+
+@pytest.fixture
+def server(tmp_path):
+    """在后台线程运行向量服务（套接字放在短路径下，Unix套接字路径有长度限制）"""
+    socket_dir = tempfile.mkdtemp(prefix='vs-')
+    store = VectorStore(index_path=str(tmp_path / 'faiss_index'))
+    server = VectorServer(store, os.path.join(socket_dir, 'vector.sock'))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    store.close()
+    shutil.rmtree(socket_dir, ignore_errors=True)
+
+@pytest.fixture
+def client(server):
+    client = VectorStoreClient(server.server_address)
+    yield client
+    client.close()
+
+class TestVectorServer:
+    """向量服务与客户端相关测试"""
+
+    def test_round_trip(self, client):
+        """测试经服务端增删查，结果格式与本地 VectorStore 一致"""
+        client.add_documents([1, 2], ['人工智能新闻', '体育赛事报道'], USER)
+
+        results = client.search('人工智能新闻', USER, k=2)
+
+        assert results[0][0] == 1
+        assert isinstance(results[0], tuple)
+        assert client.get_index_size(USER) == 2
+        assert client.remove_documents([1], USER) == 1
+        assert client.get_index_size(USER) == 1
+        assert client.update_document(2, '体育赛事新闻', USER) is True
+
+    def test_workers_share_one_index(self, server, client):
+        """测试多个客户端（多个worker）看到同一份索引"""
+        other = VectorStoreClient(server.server_address)
+        client.add_document(7, '经济发展动态', USER)
+
+        assert other.search('经济发展动态', USER, k=1)[0][0] == 7
+        assert server.store.get_index_size(USER) == 1
+        other.close()
+
+    def test_vectors_transferred_as_arrays(self, server, client):
+        """测试向量以原始数组传输，与服务端本地编码一致"""
+        vectors = client.encode_texts(['新闻一', '新闻二'])
+
+        assert isinstance(vectors, np.ndarray)
+        assert vectors.dtype == np.float32
+        assert np.allclose(vectors, server.store.encode_texts(['新闻一', '新闻二']))
+
+    def test_passages_and_batched_range_search(self, client):
+        """测试带片段的结果与批量范围检索的嵌套结构"""
+        client.add_document(3, '人工智能新闻', USER)
+
+        doc_id, score, chunk_no = client.search('人工智能新闻', USER, k=1, with_passages=True)[0]
+        batched = client.search_range(['人工智能新闻', '体育'], USER, min_similarity=0.0, max_k=1)
+
+        assert (doc_id, chunk_no) == (3, 0)
+        assert len(batched) == 2 and batched[0][0][0] == 3
+
+    def test_errors_propagate(self, client):
+        """测试服务端异常以原类型返回给调用方，连接仍可继续使用"""
+        with pytest.raises(ValueError):
+            client.add_documents([1, 2], ['只有一条'], USER)
+        with pytest.raises(VectorServerError):
+            client._call('no_such_method_on_store')
+
+        assert client.get_index_size(USER) == 0
+
+    def test_reconnects_after_server_restart(self, tmp_path):
+        """测试服务重启后客户端自动重连"""
+        socket_dir = tempfile.mkdtemp(prefix='vs-')
+        socket_path = os.path.join(socket_dir, 'vector.sock')
+        store = VectorStore(index_path=str(tmp_path / 'faiss_index'))
+        client = VectorStoreClient(socket_path)
+        for _ in range(2):
+            server = VectorServer(store, socket_path)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            assert client.get_index_size(USER) == 0
+            server.shutdown()
+            server.server_close()
+        client.close()
+        store.close()
+        shutil.rmtree(socket_dir, ignore_errors=True)
@@ -0,0 +1,344 @@
+import os
+import time
+import pytest
+from vector_store import VectorStore
+from vector_partition import VectorPartition, PartitionLocked
+from vector_snapshot import SnapshotError
+
+USER = 1
+
+@pytest.fixture
+def vector_store(tmp_path):
+    """创建使用临时目录的向量库"""
+    return VectorStore(index_path=str(tmp_path / 'faiss_index'))
+
+def partition_of(store, user_id=USER):
+    """获取用户分区（测试检查内部状态用）"""
+    return store._partition(user_id)
+
+def crash(store):
+    """模拟进程崩溃：停止后台线程，不写检查点，关闭日志并释放分区锁"""
+    store._closed = True
+    store._wake.set()
+    store._checkpointer.join(timeout=10)
+    for partition in store._partitions.values():
+        partition.closed = True
+        partition.wal.close()
+        partition._lock_file.close()
+
+class TestVectorStore:
+    """向量存储相关测试"""
+    
+    def test_remove_documents_by_id(self, vector_store):
+        """测试按文档ID批量删除"""
+        vector_store.add_documents([1, 2, 3], ['人工智能', '财经新闻', '体育赛事'], USER)
+        
+        removed = vector_store.remove_documents([1, 3, 99], USER)
+        
+        assert removed == 2
+        assert vector_store.get_index_size(USER) == 1
+        assert [doc_id for doc_id, _ in vector_store.search('人工智能', USER, k=5)] == [2]
+    
+    def test_add_document_overwrites_existing_id(self, vector_store):
+        """测试重复添加同一文档不会产生重复向量"""
+        vector_store.add_document(7, '第一版内容', USER)
+        vector_store.add_document(7, '第二版内容', USER)
+        
+        assert vector_store.get_index_size(USER) == 1
+    
+    def test_update_document(self, vector_store):
+        """测试原地更新文档向量"""
+        vector_store.add_documents([1, 2], ['量子计算', '足球比赛'], USER)
+        
+        assert vector_store.update_document(1, '足球比赛', USER) is True
+        assert vector_store.get_index_size(USER) == 2
+        assert vector_store.search('足球比赛', USER, k=1)[0][1] == pytest.approx(1.0, abs=1e-3)
+    
+    def test_index_persists_across_instances(self, vector_store):
+        """测试索引重启后可恢复"""
+        vector_store.add_documents([10, 11], ['新闻一', '新闻二'], USER)
+        vector_store.remove_document(10, USER)
+        crash(vector_store)
+        
+        reloaded = VectorStore(index_path=vector_store.index_path)
+        
+        assert reloaded.get_index_size(USER) == 1
+        assert reloaded.search('新闻二', USER, k=1)[0][0] == 11
+    
+    def test_wal_replay_ignores_torn_tail(self, vector_store):
+        """测试预写日志尾部残缺时按已完整写入的记录恢复"""
+        vector_store.add_documents([1, 2], ['新闻一', '新闻二'], USER)
+        vector_store.remove_document(1, USER)
+        wal = partition_of(vector_store).wal
+        with open(wal._segment_path(wal.segments()[-1]), 'ab') as f:
+            f.write(b'\x01\x05\x00')
+        crash(vector_store)
+        
+        reloaded = VectorStore(index_path=vector_store.index_path)
+        
+        assert reloaded.get_index_size(USER) == 1
+    
+    def test_writes_after_torn_record_survive_restarts(self, vector_store):
+        """测试头部完整、负载残缺的记录被截断，重启后写入新日志段的记录在再次重启后仍可回放"""
+        vector_store.add_documents([1], ['新闻一'], USER)
+        wal = partition_of(vector_store).wal
+        torn_segment = wal._segment_path(wal.segments()[-1])
+        with open(torn_segment, 'rb') as f:
+            record = f.read()
+        with open(torn_segment, 'ab') as f:
+            f.write(record[:-8])
+        
+        # 不关闭实例（关闭会写检查点），模拟两次崩溃后重启
+        crash(vector_store)
+        restarted = VectorStore(index_path=vector_store.index_path)
+        restarted.add_documents([2], ['新闻二'], USER)
+        crash(restarted)
+        
+        assert os.path.getsize(torn_segment) == len(record)
+        reloaded = VectorStore(index_path=vector_store.index_path)
+        assert reloaded.get_index_size(USER) == 2
+        assert reloaded.search('新闻二', USER, k=1)[0][0] == 2
+    
+    def test_checkpoint_drops_wal_segments(self, vector_store):
+        """测试检查点后旧日志段被删除且状态不变"""
+        vector_store.add_documents([1, 2, 3], ['新闻一', '新闻二', '新闻三'], USER)
+        vector_store.checkpoint()
+        
+        assert len(partition_of(vector_store).wal.segments()) == 1
+        vector_store.close()
+        assert VectorStore(index_path=vector_store.index_path).get_index_size(USER) == 3
+    
+    def test_second_writer_is_refused(self, vector_store):
+        """测试同一分区目录同时只能有一个写入者，第一个关闭后才能打开，已写入的记录不丢失"""
+        vector_store.add_documents([1, 2], ['新闻一', '新闻二'], USER)
+        path = partition_of(vector_store).path
+        other = VectorStore(index_path=vector_store.index_path)
+        
+        with pytest.raises(PartitionLocked):
+            VectorPartition(path, vector_store.model_name, vector_store.dimension)
+        with pytest.raises(PartitionLocked):
+            other.add_document(3, '新闻三', USER)
+        assert len(partition_of(vector_store).wal.segments()) == 1
+        
+        vector_store.close()
+        assert other.get_index_size(USER) == 2
+        other.close()
+    
+    def test_close_stops_background_threads(self, vector_store):
+        """测试关闭后后台检查点线程退出，不再写入索引目录"""
+        vector_store.add_document(1, '新闻一', USER)
+        vector_store.close()
+        
+        assert not vector_store._checkpointer.is_alive()
+        assert vector_store.loaded_partitions() == []
+    
+    def test_snapshot_loaded_read_only_then_writable(self, vector_store):
+        """测试快照以mmap加载，写入后合并时转为内存副本"""
+        vector_store.add_documents([1, 2], ['新闻一', '新闻二'], USER)
+        vector_store.close()
+        
+        reloaded = VectorStore(index_path=vector_store.index_path)
+        partition = partition_of(reloaded)
+        assert partition.view.mapped is True
+        assert partition.verify_snapshot() is True
+        
+        # 写入记录在视图增量中，映射的快照索引不被修改，合并时才读入可写副本
+        reloaded.remove_document(1, USER)
+        assert partition.view.mapped is True
+        assert reloaded.get_index_size(USER) == 1
+        reloaded.checkpoint()
+        assert partition.view.mapped is False
+        assert partition.view.pending == 0
+        assert reloaded.get_index_size(USER) == 1
+    
+    def test_unpublished_snapshot_is_ignored(self, vector_store):
+        """测试未完成发布的临时快照不影响加载"""
+        vector_store.add_document(1, '新闻一', USER)
+        vector_store.close()
+        partial = os.path.join(vector_store._partition_path(USER), 'snapshots', '.tmp-snap-partial')
+        os.makedirs(partial)
+        with open(os.path.join(partial, 'index.faiss'), 'wb') as f:
+            f.write(b'torn')
+        
+        assert VectorStore(index_path=vector_store.index_path).get_index_size(USER) == 1
+    
+    def test_snapshot_rejects_different_model(self, vector_store):
+        """测试快照与当前嵌入模型不一致时拒绝加载"""
+        vector_store.add_document(1, '新闻一', USER)
+        vector_store.close()
+        
+        with pytest.raises(SnapshotError):
+            VectorPartition(vector_store._partition_path(USER), 'paraphrase-MiniLM-L3-v2', 384)
+    
+    def test_partitions_are_isolated_by_user(self, vector_store):
+        """测试不同用户的向量互不可见"""
+        vector_store.add_document(1, '人工智能', 1)
+        vector_store.add_document(2, '人工智能', 2)
+        
+        assert [doc_id for doc_id, _ in vector_store.search('人工智能', 1)] == [1]
+        assert vector_store.remove_document(2, 1) is False
+        assert vector_store.get_index_size(2) == 1
+    
+    def test_cold_partitions_are_evicted(self, tmp_path):
+        """测试超过上限时按LRU淘汰分区且数据不丢失"""
+        store = VectorStore(index_path=str(tmp_path / 'faiss_index'), max_loaded_partitions=2)
+        for user_id in (1, 2, 3):
+            store.add_document(user_id * 10, f'用户{user_id}的新闻', user_id)
+        
+        assert store.loaded_partitions() == [2, 3]
+        assert store.get_index_size(1) == 1
+        assert store.loaded_partitions() == [3, 1]
+    
+    def test_migrate_shared_index(self, vector_store):
+        """测试将分区化之前的全局索引按用户拆分"""
+        shared = VectorPartition(vector_store.index_path, vector_store.model_name, vector_store.dimension)
+        shared.id_scheme = 'document'  # 全局索引早于片段ID，直接以文档ID存储
+        shared.add(VectorStore._as_ids([1, 2, 3]), vector_store.encode_texts(['新闻一', '新闻二', '已删除']))
+        shared.close()
+        assert vector_store.has_shared_index()
+        
+        migrated = vector_store.migrate_shared_index({1: 5, 2: 6})
+        
+        assert migrated == 2
+        assert not vector_store.has_shared_index()
+        assert vector_store.get_index_size(5) == 1
+        assert vector_store.get_index_size(6) == 1
+    
+    @pytest.mark.parametrize('kind', ['ivf', 'hnsw'])
+    def test_partition_promoted_to_ann_index(self, tmp_path, kind):
+        """测试分区超过阈值后在后台升级为近似索引，并可继续增删与重启恢复"""
+        store = VectorStore(index_path=str(tmp_path / 'faiss_index'), ann_index=kind, ann_threshold=100)
+        store.add_documents(list(range(1, 121)), [f'第{i}条新闻内容' for i in range(1, 121)], USER)
+        partition = partition_of(store)
+        for _ in range(100):
+            if partition.index_kind == kind and not partition.migrating:
+                break
+            time.sleep(0.05)
+        
+        assert partition.index_kind == kind
+        assert partition.last_migration['recall_at_k'] > 0.5
+        store.remove_documents([1, 2], USER)
+        store.add_document(3, '第3条新闻内容', USER)
+        assert store.get_index_size(USER) == 118
+        assert store.search('第3条新闻内容', USER, k=1)[0][0] == 3
+        assert store.evaluate_index(USER)['index_type'] == kind
+        store.close()
+        
+        reloaded = VectorStore(index_path=store.index_path, ann_index=kind, ann_threshold=100)
+        assert partition_of(reloaded).index_kind == kind
+        assert reloaded.get_index_size(USER) == 118
+    
+    def test_compressed_partition_reranks_with_raw_vectors(self, tmp_path):
+        """测试压缩存储模式：检索结果经原始向量精确重排，原始向量随快照持久化"""
+        store = VectorStore(index_path=str(tmp_path / 'faiss_index'), compression='sq8', ann_threshold=50)
+        store.add_documents(list(range(1, 61)), [f'第{i}条新闻内容' for i in range(1, 61)], USER)
+        partition = partition_of(store)
+        for _ in range(100):
+            if partition.index_kind == 'sq8' and not partition.migrating:
+                break
+            time.sleep(0.05)
+        
+        assert partition.index_kind == 'sq8'
+        store.remove_document(5, USER)
+        store.update_document(6, '完全不同的体育赛事报道', USER)
+        assert store.search('完全不同的体育赛事报道', USER, k=1)[0] == (6, pytest.approx(1.0, abs=1e-5))
+        store.checkpoint()
+        assert partition.raw.tail == {}
+        store.close()
+        
+        reloaded = VectorStore(index_path=store.index_path, compression='sq8', ann_threshold=50)
+        partition = partition_of(reloaded)
+        assert partition.index_kind == 'sq8'
+        assert reloaded.get_index_size(USER) == 59
+        assert 5 not in [doc_id for doc_id, _ in reloaded.search('第5条新闻内容', USER, k=5)]
+        assert reloaded.search('第7条新闻内容', USER, k=1)[0] == (7, pytest.approx(1.0, abs=1e-5))
+        assert reloaded.search_range('第7条新闻内容', USER, min_similarity=0.99) == [(7, pytest.approx(1.0, abs=1e-5))]
+    
+    def test_search_range_filters_by_similarity(self, vector_store):
+        """测试范围检索在索引内按阈值过滤，并支持批量查询"""
+        vector_store.add_documents([1, 2, 3], ['人工智能', '人工智能芯片', '足球比赛'], USER)
+        
+        hits = vector_store.search_range('人工智能', USER, min_similarity=0.99)
+        assert hits == [(1, pytest.approx(1.0, abs=1e-5))]
+        
+        batch = vector_store.search_range(['足球比赛', '篮球'], USER, min_similarity=0.99, max_k=5)
+        assert [[doc_id for doc_id, _ in hits] for hits in batch] == [[3], []]
+        
+        ranked = vector_store.search_range('人工智能', USER, min_similarity=0.01, max_k=2)
+        assert [doc_id for doc_id, _ in ranked] == [1, 2]
+    
+    def test_search_batch_matches_single_queries(self, vector_store):
+        """测试批量检索一次编码、一次检索，结果与逐条检索一致"""
+        vector_store.add_documents([1, 2, 3], ['人工智能', '人工智能芯片', '足球比赛'], USER)
+        queries = ['人工智能', '足球比赛', '篮球']
+        
+        calls = []
+        encode = vector_store.model.encode
+        vector_store.model.encode = lambda texts, **kwargs: calls.append(list(texts)) or encode(texts, **kwargs)
+        batch = vector_store.search_batch(queries, USER, k=2)
+        vector_store.model.encode = encode
+        
+        assert len(calls) == 1
+        assert batch == [vector_store.search(query, USER, k=2) for query in queries]
+        assert vector_store.search_batch([], USER) == []
+        assert vector_store.search_batch(['人工智能'], 999) == [[]]
+    
+    def test_cosine_metric(self, tmp_path):
+        """测试余弦度量：相似度为归一化向量的内积"""
+        store = VectorStore(index_path=str(tmp_path / 'faiss_index'), metric='cosine')
+        store.add_documents([1, 2], ['人工智能', '足球比赛'], USER)
+        
+        assert store.search('人工智能', USER, k=1)[0] == (1, pytest.approx(1.0, abs=1e-5))
+        assert [doc_id for doc_id, _ in store.search_range('人工智能', USER, min_similarity=0.5)] == [1]
+        store.close()
+        
+        with pytest.raises(SnapshotError):
+            VectorStore(index_path=store.index_path, metric='l2').get_index_size(USER)
+    
+    def test_long_document_indexed_as_passages(self, tmp_path):
+        """测试长文档按片段编码，检索聚合回文档并返回命中片段"""
+        store = VectorStore(index_path=str(tmp_path / 'faiss_index'), chunk_size=20, chunk_overlap=5)
+        text = '人工智能技术在各个领域都取得了重大突破。深度学习与自然语言处理等技术日益成熟。国家队在世界杯预选赛中取得了关键胜利。'
+        chunks = list(store.chunker.iter_chunks(text))
+        store.add_documents([1, 2], [text, '财经新闻'], USER)
+        
+        # 索引大小按文档计，片段向量数见分区
+        assert store.get_index_size(USER) == 2
+        assert partition_of(store).size == len(chunks) + 1
+        hits = store.search(chunks[-1].text, USER, k=5, with_passages=True)
+        assert hits[0] == (1, pytest.approx(1.0, abs=1e-5), len(chunks) - 1)
+        assert [doc_id for doc_id, _ in store.search(chunks[0].text, USER, k=5)] == [1, 2]
+        ranged = store.search_range(chunks[1].text, USER, min_similarity=0.99, with_passages=True)
+        assert ranged == [(1, pytest.approx(1.0, abs=1e-5), 1)]
+        
+        # 文档变短后多出的旧片段被删除
+        assert store.update_document(1, '短文本', USER) is True
+        assert partition_of(store).size == 2
+        assert store.remove_document(1, USER) is True
+        assert store.get_index_size(USER) == 1
+    
+    def test_sum_pooling_favors_documents_with_more_matching_passages(self, tmp_path):
+        """测试sum池化累加同一文档多个片段的相似度"""
+        store = VectorStore(index_path=str(tmp_path / 'faiss_index'), chunk_size=5, chunk_overlap=1,
+                            passage_pooling='sum')
+        store.add_documents([1, 2], ['新闻一。新闻一。新闻一。', '新闻一。'], USER)
+        
+        hits = store.search('新闻一。', USER, k=2)
+        assert [doc_id for doc_id, _ in hits] == [1, 2]
+        assert hits[0][1] == pytest.approx(3.0, abs=1e-4)
+    
+    def test_document_id_partition_upgraded_to_chunk_ids(self, vector_store):
+        """测试按文档ID存储的旧分区加载时转换为片段ID"""
+        path = partition_of(vector_store).path
+        vector_store.close()
+        legacy = VectorPartition(path, vector_store.model_name, vector_store.dimension)
+        legacy.id_scheme = 'document'
+        legacy.add(VectorStore._as_ids([3, 4]), vector_store.encode_texts(['新闻一', '新闻二']))
+        legacy.close()
+        
+        reloaded = VectorStore(index_path=vector_store.index_path)
+        
+        assert partition_of(reloaded).id_scheme == 'chunk'
+        assert reloaded.search('新闻二', USER, k=1)[0][0] == 4
+        assert reloaded.remove_document(3, USER) is True
+        assert reloaded.get_index_size(USER) == 1
@@ -0,0 +1,182 @@
+import time
+import socket
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+import numpy as np
+from services.text_chunker import TextChunker
+from vector_protocol import send_message, recv_message, as_tuples, ProtocolError
+
+# 服务端异常按类型名还原为同类异常，其余包装为 VectorServerError
+_BUILTIN_ERRORS = {'ValueError': ValueError, 'KeyError': KeyError, 'TypeError': TypeError}
+
+
+class VectorServerError(RuntimeError):
+    """向量服务端执行请求时出错"""
+
+
+class VectorStoreClient:
+    """
+    向量服务的客户端，接口与 VectorStore 一致
+
+    多worker部署时，嵌入模型与索引只由向量服务进程（flask vector-serve）持有一份，
+    Web worker 通过Unix域套接字转发编码、检索与增删请求，自身不加载模型与索引。
+    每个线程使用独立的长连接，连接断开时重连并重试一次（写操作均为幂等的覆盖或删除）。
+    """
+
+    def __init__(self, socket_path: str, chunk_size: int = 200, chunk_overlap: int = 40,
+                 timeout: float = 60.0):
+        """
+        Args:
+            socket_path: 向量服务的套接字路径
+            chunk_size: 片段长度（须与服务端一致，用于在本地还原命中片段的文本）
+            chunk_overlap: 相邻片段的重叠长度
+            timeout: 单次请求超时（秒）
+        """
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.chunker = TextChunker(chunk_size, chunk_overlap)
+        self._local = threading.local()
+        self._connections: List[socket.socket] = []
+        self._connections_lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        with self._connections_lock:
+            self._connections.append(sock)
+        return sock
+
+    def _disconnect(self, sock: socket.socket):
+        self._local.sock = None
+        with self._connections_lock:
+            if sock in self._connections:
+                self._connections.remove(sock)
+        sock.close()
+
+    def _call(self, method: str, *args, **kwargs):
+        """调用服务端方法并返回结果"""
+        if self._closed:
+            raise VectorServerError("Vector client is closed")
+        request = {'method': method, 'args': list(args), 'kwargs': kwargs}
+        for attempt in range(2):
+            sock = getattr(self._local, 'sock', None)
+            if sock is None:
+                sock = self._local.sock = self._connect()
+            try:
+                send_message(sock, request)
+                response = recv_message(sock)
+                break
+            except (ProtocolError, OSError):
+                # 服务重启等导致连接失效：重连后重试一次
+                self._disconnect(sock)
+                if attempt:
+                    raise
+        if 'error' in response:
+            raise _BUILTIN_ERRORS.get(response.get('type'), VectorServerError)(response['error'])
+        return response['result']
+
+    def wait_until_available(self, timeout: float = 60.0):
+        """等待向量服务可连接（服务与Web进程同时启动时）"""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return self._call('info')
+            except OSError:
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.2)
+
+    def info(self) -> Dict:
+        """服务端模型名、维度、度量与模型是否已加载"""
+        return self._call('info')
+
+    @property
+    def model_loaded(self) -> bool:
+        try:
+            return self.info()['model_loaded']
+        except OSError:
+            return False
+
+    def warm_up(self, user_ids: Iterable[int] = ()) -> Dict[str, float]:
+        """等待服务可用后在服务端预热"""
+        self.wait_until_available()
+        return self._call('warm_up', [int(user_id) for user_id in user_ids])
+
+    def encode_text(self, text: str) -> np.ndarray:
+        return self._call('encode_text', text)
+
+    def encode_texts(self, texts: List[str]) -> np.ndarray:
+        return self._call('encode_texts', list(texts))
+
+    def add_document(self, doc_id: int, text: str, user_id: int):
+        self._call('add_documents', [int(doc_id)], [text], int(user_id), show_progress_bar=False)
+
+    def add_documents(self, doc_ids: List[int], texts: List[str], user_id: int,
+                      show_progress_bar: bool = True) -> int:
+        return self._call('add_documents', [int(doc_id) for doc_id in doc_ids], list(texts), int(user_id),
+                          show_progress_bar=False)
+
+    def update_document(self, doc_id: int, text: str, user_id: int) -> bool:
+        return self._call('update_document', int(doc_id), text, int(user_id))
+
+    def search(self, query: str, user_id: int, k: int = 10,
+               with_passages: bool = False) -> List[Tuple[int, float]]:
+        return as_tuples(self._call('search', query, int(user_id), k, with_passages=with_passages))
+
+    def search_batch(self, queries: List[str], user_id: int, k: int = 10,
+                     with_passages: bool = False) -> List[List[Tuple[int, float]]]:
+        results = self._call('search_batch', list(queries), int(user_id), k, with_passages=with_passages)
+        return [as_tuples(hits) for hits in results]
+
+    def search_range(self, query: Union[str, List[str]], user_id: int,
+                     min_similarity: Optional[float] = None, max_k: int = 10,
+                     with_passages: bool = False) -> Union[List[Tuple[int, float]], List[List[Tuple[int, float]]]]:
+        results = self._call('search_range', query, int(user_id), min_similarity, max_k,
+                             with_passages=with_passages)
+        if isinstance(query, str):
+            return as_tuples(results)
+        return [as_tuples(hits) for hits in results]
+
+    def remove_document(self, doc_id: int, user_id: int) -> bool:
+        return self.remove_documents([doc_id], user_id) > 0
+
+    def remove_documents(self, doc_ids: Iterable[int], user_id: int) -> int:
+        return self._call('remove_documents', [int(doc_id) for doc_id in doc_ids], int(user_id))
+
+    def get_index_size(self, user_id: int) -> int:
+        return self._call('get_index_size', int(user_id))
+
+    def evaluate_index(self, user_id: int, k: int = 10, sample: int = 100) -> Dict:
+        return self._call('evaluate_index', int(user_id), k, sample)
+
+    def clear_index(self, user_id: int = None):
+        self._call('clear_index', None if user_id is None else int(user_id))
+
+    def loaded_partitions(self) -> List[int]:
+        return self._call('loaded_partitions')
+
+    def checkpoint(self):
+        self._call('checkpoint')
+
+    def save_index(self):
+        self.checkpoint()
+
+    def has_shared_index(self) -> bool:
+        return self._call('has_shared_index')
+
+    def migrate_shared_index(self, owners: Dict[int, int]) -> int:
+        return self._call('migrate_shared_index', [[int(doc_id), int(user_id)] for doc_id, user_id in owners.items()])
+
+    def close(self):
+        """关闭本进程的全部连接（不影响服务端）"""
+        self._closed = True
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for sock in connections:
+            sock.close()
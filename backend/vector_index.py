@@ -0,0 +1,305 @@
+import math
+import numpy as np
+import faiss
+from typing import List, Tuple
+
+# 支持的索引类型
+#   flat:  精确暴力检索（IndexIDMap2 + IndexFlatL2）
+#   ivf:   倒排聚类（IndexIVFFlat，原生存储ID，哈希表直接映射支持按ID删除）
+#   hnsw:  分层图（IndexIDMap2 + IndexHNSWFlat，不支持删除，删除以ID置为-1的墓碑表示）
+#   sq8:   8bit标量量化（IndexIDMap2 + IndexScalarQuantizer，每维1字节，内存为flat的1/4）
+#   ivfpq: 倒排聚类 + 乘积量化（IndexIVFPQ，每4维1字节，内存约为flat的1/16）
+INDEX_KINDS = ('flat', 'ivf', 'hnsw', 'sq8', 'ivfpq')
+
+# 压缩索引只保存近似向量，检索结果需用原始向量重排
+COMPRESSED_KINDS = ('sq8', 'ivfpq')
+
+# 距离度量
+#   l2:     欧氏距离平方，越小越相似
+#   cosine: 归一化向量的内积，越大越相似（由调用方负责归一化）
+METRICS = ('l2', 'cosine')
+
+HNSW_M = 32
+
+# IVF训练样本上限（至少覆盖PQ每个子量化器256个中心的训练需要）
+MAX_TRAIN_SAMPLES = 25600
+
+# 向量ID = 文档ID << CHUNK_BITS | 片段序号，每个文档最多 MAX_CHUNKS 个片段
+CHUNK_BITS = 10
+MAX_CHUNKS = 1 << CHUNK_BITS
+
+
+def faiss_metric(metric: str) -> int:
+    """度量名称对应的FAISS度量类型"""
+    if metric == 'l2':
+        return faiss.METRIC_L2
+    if metric == 'cosine':
+        return faiss.METRIC_INNER_PRODUCT
+    raise ValueError(f"Unknown vector metric: {metric}")
+
+
+def index_metric(index) -> str:
+    """识别索引的度量"""
+    return 'cosine' if index.metric_type == faiss.METRIC_INNER_PRODUCT else 'l2'
+
+
+def create_index(kind: str, dimension: int, nlist: int = 0, metric: str = 'l2'):
+    """
+    创建空索引（IVF需随后训练）
+
+    Args:
+        kind: 索引类型
+        dimension: 向量维度
+        nlist: IVF聚类中心数量
+        metric: 距离度量
+    """
+    metric_type = faiss_metric(metric)
+    if kind in ('ivf', 'ivfpq'):
+        factory = f'IVF{nlist},Flat' if kind == 'ivf' else f'IVF{nlist},PQ{pq_subquantizers(dimension)}'
+        index = faiss.index_factory(dimension, factory, metric_type)
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+        return index
+    if kind == 'flat':
+        return faiss.index_factory(dimension, 'IDMap2,Flat', metric_type)
+    if kind == 'hnsw':
+        return faiss.index_factory(dimension, f'IDMap2,HNSW{HNSW_M}', metric_type)
+    if kind == 'sq8':
+        return faiss.index_factory(dimension, 'IDMap2,SQ8', metric_type)
+    raise ValueError(f"Unknown index type: {kind}")
+
+
+def pq_subquantizers(dimension: int) -> int:
+    """PQ子量化器数量: 每4维编码为1字节（需整除维度）"""
+    m = max(1, dimension // 4)
+    while dimension % m:
+        m -= 1
+    return m
+
+
+def min_vectors(kind: str) -> int:
+    """构建该类型索引所需的最少向量数（PQ每个子量化器训练256个中心，每个中心约39个样本）"""
+    return 39 * 256 if kind == 'ivfpq' else 1
+
+
+def index_kind(index) -> str:
+    """识别索引类型"""
+    if isinstance(index, faiss.IndexIVF):
+        return 'ivfpq' if isinstance(index, faiss.IndexIVFPQ) else 'ivf'
+    inner = faiss.downcast_index(index.index)
+    if isinstance(inner, faiss.IndexHNSW):
+        return 'hnsw'
+    if isinstance(inner, faiss.IndexScalarQuantizer):
+        return 'sq8'
+    return 'flat'
+
+
+def is_ivf(kind: str) -> bool:
+    """是否为原生存储ID的倒排索引"""
+    return kind in ('ivf', 'ivfpq')
+
+
+def configure(index, nprobe: int = 16, ef_search: int = 64):
+    """设置检索参数（IVF探测的聚类数、HNSW搜索宽度）"""
+    kind = index_kind(index)
+    if is_ivf(kind):
+        index.nprobe = min(nprobe, index.nlist)
+    elif kind == 'hnsw':
+        faiss.downcast_index(index.index).hnsw.efSearch = ef_search
+
+
+def chunk_ids(doc_id: int, count: int) -> np.ndarray:
+    """文档前count个片段的向量ID"""
+    return (np.int64(doc_id) << CHUNK_BITS) + np.arange(count, dtype='int64')
+
+
+def split_ids(ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """向量ID拆分为 (文档ID数组, 片段序号数组)"""
+    return ids >> CHUNK_BITS, ids & (MAX_CHUNKS - 1)
+
+
+def choose_nlist(count: int) -> int:
+    """按数据量选择IVF聚类中心数（约4*sqrt(N)，且每个中心至少39个训练样本）"""
+    return max(1, min(int(4 * math.sqrt(count)), count // 39))
+
+
+def build_index(kind: str, dimension: int, ids: np.ndarray, vectors: np.ndarray,
+                nprobe: int = 16, ef_search: int = 64, metric: str = 'l2'):
+    """
+    按指定类型构建并填充索引
+
+    Args:
+        kind: 索引类型
+        dimension: 向量维度
+        ids: 文档ID数组
+        vectors: 向量矩阵
+        metric: 距离度量
+
+    Returns:
+        已训练并写入全部向量的索引
+    """
+    nlist = choose_nlist(len(ids)) if is_ivf(kind) else 0
+    index = create_index(kind, dimension, nlist, metric)
+    if not index.is_trained:
+        # 训练样本取每个中心约100个
+        sample = vectors
+        limit = max(nlist * 100, MAX_TRAIN_SAMPLES)
+        if len(vectors) > limit:
+            rng = np.random.default_rng(0)
+            sample = vectors[rng.choice(len(vectors), limit, replace=False)]
+        index.train(sample)
+    if len(ids):
+        index.add_with_ids(vectors, ids)
+    configure(index, nprobe, ef_search)
+    return index
+
+
+def count_tombstones(index) -> int:
+    """统计HNSW索引中已删除（ID为-1）的向量数量"""
+    if index_kind(index) != 'hnsw' or index.ntotal == 0:
+        return 0
+    return int(np.count_nonzero(faiss.vector_to_array(index.id_map) == -1))
+
+
+def remove_ids(index, ids: np.ndarray) -> int:
+    """
+    按ID删除向量
+
+    Returns:
+        删除的向量数量
+    """
+    if index.ntotal == 0 or len(ids) == 0:
+        return 0
+    kind = index_kind(index)
+    if is_ivf(kind):
+        # 哈希表直接映射，按ID删除无需扫描
+        return int(index.remove_ids(ids))
+
+    stored = faiss.vector_to_array(index.id_map)
+    mask = np.isin(stored, ids)
+    removed = int(np.count_nonzero(mask))
+    if removed == 0:
+        return 0
+    if kind == 'hnsw':
+        # HNSW图不支持删除节点，把ID置为-1，检索结果中自然被过滤
+        stored[mask] = -1
+        faiss.copy_array_to_vector(stored, index.id_map)
+        return removed
+    index.remove_ids(ids[np.isin(ids, stored)])
+    return removed
+
+
+def upsert(index, ids: np.ndarray, vectors: np.ndarray) -> int:
+    """按ID写入向量，已存在的ID先删除，返回被覆盖的数量"""
+    replaced = remove_ids(index, ids)
+    index.add_with_ids(vectors, ids)
+    return replaced
+
+
+def stored_ids(index) -> np.ndarray:
+    """返回索引中全部有效的ID（不解码向量）"""
+    if is_ivf(index_kind(index)):
+        invlists = index.invlists
+        all_ids = [
+            faiss.rev_swig_ptr(invlists.get_ids(list_no), invlists.list_size(list_no)).copy()
+            for list_no in range(index.nlist)
+            if invlists.list_size(list_no)
+        ]
+        return np.concatenate(all_ids) if all_ids else np.zeros(0, dtype='int64')
+    ids = faiss.vector_to_array(index.id_map)
+    return ids[ids != -1]
+
+
+def contents(index) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    返回索引中全部有效的 (ID数组, 向量矩阵)
+
+    压缩索引（sq8 / ivfpq）返回的是解码后的近似向量。
+    """
+    kind = index_kind(index)
+    if is_ivf(kind):
+        invlists = index.invlists
+        all_ids, all_vectors = [], []
+        for list_no in range(index.nlist):
+            size = invlists.list_size(list_no)
+            if size == 0:
+                continue
+            ids = faiss.rev_swig_ptr(invlists.get_ids(list_no), size).copy()
+            all_ids.append(ids)
+            if kind == 'ivf':
+                codes = faiss.rev_swig_ptr(invlists.get_codes(list_no), size * invlists.code_size).copy()
+                all_vectors.append(codes.view('float32').reshape(size, index.d))
+            else:
+                all_vectors.append(index.reconstruct_batch(ids))
+        if not all_ids:
+            return np.zeros(0, dtype='int64'), np.zeros((0, index.d), dtype='float32')
+        return np.concatenate(all_ids), np.concatenate(all_vectors)
+
+    ids = faiss.vector_to_array(index.id_map)
+    vectors = index.index.reconstruct_n(0, index.ntotal)
+    live = ids != -1
+    return ids[live], vectors[live]
+
+
+def search(index, query_vectors: np.ndarray, k: int, tombstones: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    检索，HNSW存在墓碑时多取 tombstones 个候选再过滤
+
+    Returns:
+        (距离矩阵, ID矩阵)，不足k个时以 (最差距离, -1) 补齐
+    """
+    fetch = min(k + tombstones, index.ntotal)
+    distances, ids = index.search(query_vectors, fetch)
+    if tombstones == 0 or fetch == k:
+        return distances[:, :k], ids[:, :k]
+
+    # 每行把有效结果前移，保留前k个
+    out_distances = np.full((len(ids), k), worst_distance(index_metric(index)), dtype='float32')
+    out_ids = np.full((len(ids), k), -1, dtype='int64')
+    for row in range(len(ids)):
+        live = ids[row] != -1
+        kept = ids[row][live][:k]
+        out_ids[row, :len(kept)] = kept
+        out_distances[row, :len(kept)] = distances[row][live][:k]
+    return out_distances, out_ids
+
+
+def worst_distance(metric: str) -> float:
+    """空位使用的距离值"""
+    return -np.inf if metric == 'cosine' else np.inf
+
+
+def rank_order(distances: np.ndarray, metric: str) -> np.ndarray:
+    """按相似度从高到低排序的下标"""
+    return np.argsort(-distances if metric == 'cosine' else distances, kind='stable')
+
+
+def within(distances: np.ndarray, radius: float, metric: str) -> np.ndarray:
+    """距离是否满足阈值（L2: 小于半径；内积: 大于阈值）"""
+    return distances > radius if metric == 'cosine' else distances < radius
+
+
+def range_search(index, query_vectors: np.ndarray, radius: float,
+                 max_k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    范围检索：每个查询只返回满足阈值的向量，按相似度排序后最多保留max_k个
+
+    Args:
+        index: 索引
+        query_vectors: 查询向量矩阵
+        radius: 阈值（L2为距离上限，内积为相似度下限）
+        max_k: 每个查询最多返回的数量
+
+    Returns:
+        每个查询一项 (距离数组, ID数组)
+    """
+    metric = index_metric(index)
+    lims, distances, ids = index.range_search(query_vectors, radius)
+    results = []
+    for row in range(len(query_vectors)):
+        row_distances = distances[lims[row]:lims[row + 1]]
+        row_ids = ids[lims[row]:lims[row + 1]]
+        live = row_ids != -1  # HNSW墓碑
+        row_distances, row_ids = row_distances[live], row_ids[live]
+        order = rank_order(row_distances, metric)[:max_k]
+        results.append((row_distances[order], row_ids[order]))
+    return results
@@ -0,0 +1,586 @@
+import os
+import time
+import pickle
+import shutil
+import threading
+import numpy as np
+import faiss
+from typing import Callable, Dict, List, Optional, Tuple
+import vector_index
+from vector_rerank import RawVectors
+from vector_view import PartitionView
+from vector_wal import VectorWAL, OP_ADD, OP_REMOVE, OP_CLEAR
+from vector_snapshot import SnapshotStore, SnapshotError, INDEX_FILE
+
+try:
+    import fcntl
+except ImportError:  # Windows: 不加锁
+    fcntl = None
+
+
+# 分区目录中的锁文件：写入者在分区打开期间持有排他锁
+LOCK_FILE = 'LOCK'
+
+# 向量ID编码方式: chunk 为 文档ID<<CHUNK_BITS|片段序号；旧快照未记录时为 document（直接使用文档ID）
+ID_SCHEME = 'chunk'
+
+
+class PartitionClosed(Exception):
+    """分区已被淘汰或关闭"""
+
+
+class PartitionLocked(Exception):
+    """分区目录正被另一个写入者使用"""
+
+
+def _lock_directory(path: str):
+    """
+    获取分区目录的排他锁，返回持有锁的文件对象（关闭即释放，进程退出时由系统释放）
+
+    两个写入者使用同一目录时会追加同一日志段，检查点会删除对方尚未落盘的日志段与正在写出的快照，
+    因此第二个写入者直接失败。多个Web worker需通过 `flask vector-serve`（VECTOR_SERVER_SOCKET）共用索引。
+    """
+    handle = open(os.path.join(path, LOCK_FILE), 'a')
+    if fcntl is None:
+        return handle
+    try:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        handle.close()
+        raise PartitionLocked(
+            f"Vector partition {path} is in use by another writer; run multiple workers against "
+            f"one index through `flask vector-serve` (VECTOR_SERVER_SOCKET)"
+        )
+    return handle
+
+
+class VectorPartition:
+    """
+    单个向量分区：ID映射索引 + 预写日志 + 快照
+    
+    不负责文本编码，只处理已编码的向量。所有写操作先追加预写日志，
+    再在写锁内生成并发布新的不可变视图（PartitionView），检索无需加锁；
+    检查点把视图合并为一个索引发布为快照并删除已覆盖的日志段。
+    """
+    
+    def __init__(self, path: str, model_name: str, dimension: int,
+                 nprobe: int = 16, ef_search: int = 64, rerank_factor: int = 4,
+                 metric: str = 'l2'):
+        """
+        初始化并加载分区
+        
+        Args:
+            path: 分区目录
+            model_name: 嵌入模型名称（写入快照manifest并在加载时校验）
+            dimension: 向量维度
+            nprobe: IVF索引检索时探测的聚类数
+            ef_search: HNSW索引检索宽度
+            rerank_factor: 压缩索引检索时取 k * rerank_factor 个候选做精确重排
+            metric: 距离度量（l2 / cosine），cosine要求写入与查询的向量已归一化
+        """
+        self.path = path
+        self.model_name = model_name
+        self.dimension = dimension
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.rerank_factor = rerank_factor
+        self.metric = metric
+        self.view: Optional[PartitionView] = None  # 当前发布的视图，整体替换，不原地修改
+        self.closed = False
+        self.id_scheme = ID_SCHEME
+        
+        # 后台迁移索引类型期间，记录迁移开始后的写操作，切换前重放到新索引
+        self._pending_ops: Optional[list] = None
+        self.last_migration: Optional[Dict] = None
+        
+        # 写操作之间、写操作与检查点互斥；检索不加锁
+        self.lock = threading.RLock()
+        self._checkpoint_lock = threading.Lock()
+        self._dirty = False
+        self._last_checkpoint = time.monotonic()
+        self._snapshot_path = None
+        self._migrated_files = False
+        
+        os.makedirs(path, exist_ok=True)
+        self._lock_file = _lock_directory(path)
+        try:
+            self.snapshots = SnapshotStore(path)
+            self.wal = VectorWAL(os.path.join(path, 'wal'), dimension)
+            self._load_or_create_index()
+        except Exception:
+            self._lock_file.close()
+            raise
+    
+    def _new_index(self):
+        """创建以文档ID为键的空索引（新分区总是从精确索引开始）"""
+        return vector_index.create_index('flat', self.dimension, metric=self.metric)
+    
+    def _load_or_create_index(self):
+        """加载或创建FAISS索引"""
+        snapshot = self.snapshots.current()
+        
+        if snapshot:
+            # 从当前快照加载，向量数据以只读mmap方式映射，冷启动无需读入整个文件
+            manifest = self.snapshots.read_manifest(snapshot)
+            if manifest['model_name'] != self.model_name or manifest['dimension'] != self.dimension:
+                raise SnapshotError(
+                    f"Index snapshot was built with {manifest['model_name']} ({manifest['dimension']}d), "
+                    f"current model is {self.model_name} ({self.dimension}d); rebuild the index"
+                )
+            if manifest.get('metric', 'l2') != self.metric:
+                raise SnapshotError(
+                    f"Index snapshot uses the {manifest.get('metric', 'l2')} metric, "
+                    f"current metric is {self.metric}; rebuild the index"
+                )
+            index = faiss.read_index(os.path.join(snapshot, INDEX_FILE), faiss.IO_FLAG_MMAP_IFC)
+            self._snapshot_path = snapshot
+            self.id_scheme = manifest.get('id_scheme', 'document')
+            raw = None
+            if manifest.get('index_type') in vector_index.COMPRESSED_KINDS:
+                raw = RawVectors.load(snapshot, self.dimension, self.metric)
+            vector_index.configure(index, self.nprobe, self.ef_search)
+            self.view = PartitionView(index, raw, self.metric, mapped=True)
+            # 快照已包含这些日志段的内容
+            self.wal.drop_segments(manifest['wal_segment'])
+        elif os.path.exists(os.path.join(self.path, 'faiss.index')):
+            self.id_scheme = 'document'
+            self._migrate_flat_files()
+        else:
+            self.view = PartitionView(self._new_index(), metric=self.metric)
+        
+        # 回放上次检查点之后的预写日志
+        replayed = self._replay_wal()
+        if replayed:
+            print(f"Replayed {replayed} WAL records in {self.path}, partition has {self.size} vectors.")
+            self._dirty = True
+            if self.view.needs_merge:
+                self._merge()
+            if snapshot is None and self.id_scheme == ID_SCHEME and not self._migrated_files:
+                # 新分区创建时即发布空快照，没有快照却有日志说明是旧版分区
+                self.id_scheme = 'document'
+        self.wal.open()
+        
+        if self.id_scheme != ID_SCHEME:
+            self._upgrade_ids()
+        elif snapshot is None and not replayed:
+            self.save()
+    
+    def _upgrade_ids(self):
+        """
+        将按文档ID存储的旧分区转换为片段ID（原向量作为文档的第0个片段）
+        
+        整篇文档的向量保留可用，重新编码（flask vector-reindex）后才按片段检索。
+        """
+        with self.lock:
+            ids, vectors = self.vectors()
+            index = self._new_index()
+            if len(ids):
+                index.add_with_ids(vectors, ids << vector_index.CHUNK_BITS)
+            self.view = PartitionView(index, metric=self.metric)
+            self.id_scheme = ID_SCHEME
+        self.save()
+        print(f"Upgraded {len(ids)} document vectors in {self.path} to chunk ids.")
+    
+    def _migrate_flat_files(self):
+        """将旧版 faiss.index（及 doc_mapping.pkl）迁移为快照目录格式"""
+        index_file = os.path.join(self.path, 'faiss.index')
+        mapping_file = os.path.join(self.path, 'doc_mapping.pkl')
+        
+        index = faiss.read_index(index_file)
+        if isinstance(index, faiss.IndexIDMap2):
+            if self.metric == 'cosine':
+                ids, vectors = vector_index.contents(index)
+                index = self._new_index()
+                faiss.normalize_L2(vectors)
+                index.add_with_ids(vectors, ids)
+        else:
+            # 旧格式: 顺序索引 + pickle的ID列表，迁移为ID映射索引
+            doc_ids = []
+            if os.path.exists(mapping_file):
+                with open(mapping_file, 'rb') as f:
+                    doc_ids = pickle.load(f)
+            index = self._migrate_legacy_index(index, doc_ids)
+        self.view = PartitionView(index, metric=self.metric)
+        
+        self._migrated_files = True
+        self._publish(faiss.serialize_index(index), 'flat', index.ntotal, wal_segment=0)
+        for legacy_file in (index_file, mapping_file):
+            if os.path.exists(legacy_file):
+                os.remove(legacy_file)
+        print(f"Migrated index files to snapshot format with {index.ntotal} vectors.")
+    
+    def _migrate_legacy_index(self, legacy_index, doc_ids: List[int]):
+        """
+        将旧版顺序索引迁移为IndexIDMap2
+        
+        Args:
+            legacy_index: 旧版IndexFlatL2
+            doc_ids: 与向量顺序对应的文档ID列表
+        
+        Returns:
+            新的ID映射索引
+        """
+        index = self._new_index()
+        count = min(legacy_index.ntotal, len(doc_ids))
+        if count > 0:
+            vectors = legacy_index.reconstruct_n(0, count)
+            if self.metric == 'cosine':
+                faiss.normalize_L2(vectors)
+            index.add_with_ids(vectors, np.asarray(doc_ids[:count], dtype='int64'))
+        print(f"Migrated legacy index with {count} vectors.")
+        return index
+    
+    def _replay_wal(self) -> int:
+        """将预写日志中的记录按顺序应用到视图"""
+        replayed = 0
+        for op, ids, vectors in self.wal.replay():
+            self._apply(op, ids, vectors)
+            replayed += 1
+        return replayed
+    
+    def _apply(self, op: int, ids: np.ndarray, vectors: Optional[np.ndarray]) -> int:
+        """
+        基于当前视图生成包含该写操作的新视图并发布
+        
+        Returns:
+            受影响（被覆盖或删除）的向量数量
+        """
+        if op == OP_CLEAR:
+            self.view = PartitionView(self._new_index(), metric=self.metric, version=self.view.version + 1)
+            return 0
+        if op == OP_ADD:
+            self.view, affected = self.view.add(ids, vectors)
+        else:
+            self.view, affected = self.view.remove(ids)
+        return affected
+    
+    def _write(self, op: int, ids: np.ndarray, vectors: Optional[np.ndarray] = None) -> int:
+        """先写预写日志再发布新视图；迁移进行中时同时记录操作供新索引重放"""
+        with self.lock:
+            if self.closed:
+                raise PartitionClosed(self.path)
+            if op == OP_CLEAR:
+                self.wal.append_clear()
+            elif op == OP_ADD:
+                self.wal.append_add(ids, vectors)
+            else:
+                self.wal.append_remove(ids)
+            affected = self._apply(op, ids, vectors)
+            if self._pending_ops is not None:
+                self._pending_ops.append((op, ids, vectors))
+            elif self.view.needs_merge:
+                self._merge()
+            self._dirty = True
+        return affected
+    
+    def _merge(self):
+        """
+        将当前视图的增量合并为新的基础索引并发布，调用方需持有写锁
+        
+        合并在索引副本上进行，检索继续使用旧视图直到新视图发布。
+        """
+        index, raw = self.view.materialize()
+        vector_index.configure(index, self.nprobe, self.ef_search)
+        self.view = PartitionView(index, raw, self.metric, version=self.view.version + 1)
+    
+    @property
+    def index(self):
+        """当前视图的基础索引（只读）"""
+        return self.view.index
+    
+    @property
+    def raw(self) -> Optional[RawVectors]:
+        """当前视图的原始向量（压缩索引）"""
+        return self.view.raw
+    
+    @property
+    def index_kind(self) -> str:
+        """当前索引类型"""
+        return vector_index.index_kind(self.index)
+    
+    @property
+    def migrating(self) -> bool:
+        """是否正在后台迁移索引类型"""
+        return self._pending_ops is not None
+    
+    @property
+    def tombstones(self) -> int:
+        """HNSW中已删除但尚未压缩的向量数"""
+        return self.view.tombstones
+    
+    @property
+    def size(self) -> int:
+        """分区中的有效向量（片段）数量"""
+        return self.view.size
+    
+    @property
+    def document_count(self) -> int:
+        """分区中的文档数量（一篇文档的多个片段只计一次）"""
+        return len(np.unique(self.view.stored_ids() >> vector_index.CHUNK_BITS))
+    
+    @property
+    def pending_bytes(self) -> int:
+        """上次检查点以来的日志字节数"""
+        return self.wal.pending_bytes
+    
+    def add(self, ids: np.ndarray, vectors: np.ndarray) -> int:
+        """
+        写入（覆盖）向量
+        
+        Returns:
+            被覆盖的已有向量数量
+        """
+        return self._write(OP_ADD, ids, vectors)
+    
+    def remove(self, ids: np.ndarray) -> int:
+        """
+        按ID删除向量
+        
+        Returns:
+            实际删除的向量数量
+        """
+        return self._write(OP_REMOVE, ids)
+    
+    def clear(self):
+        """清空分区"""
+        self._write(OP_CLEAR, None)
+    
+    def search(self, query_vectors: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        向量检索
+        
+        Returns:
+            (距离矩阵, 文档ID矩阵)，空位ID为-1
+        """
+        return self.view.search(query_vectors, k, self.rerank_factor)
+    
+    def search_range(self, query_vectors: np.ndarray, radius: float,
+                     max_k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        范围检索，只返回满足阈值的向量
+        
+        Args:
+            query_vectors: 查询向量矩阵
+            radius: 阈值（l2为距离上限，cosine为内积下限）
+            max_k: 每个查询最多返回的数量
+        
+        Returns:
+            每个查询一项 (距离数组, 文档ID数组)，按相似度从高到低排列
+        """
+        return self.view.range_search(query_vectors, radius, max_k, self.rerank_factor)
+    
+    def ids_of_documents(self, doc_ids: np.ndarray) -> np.ndarray:
+        """返回属于指定文档的全部片段ID"""
+        ids = self.view.stored_ids()
+        return ids[np.isin(ids >> vector_index.CHUNK_BITS, doc_ids)]
+    
+    def vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """返回分区内全部有效的 (ID数组, 原始向量矩阵)"""
+        return self.view.vectors()
+    
+    def migrate(self, kind: str) -> Dict:
+        """
+        将分区迁移为指定类型的索引（也用于压缩HNSW墓碑）
+        
+        在锁内只取出当前全部向量并开始记录后续写操作；训练与构建新索引在锁外进行，
+        期间检索继续使用旧索引。构建完成后在锁内重放迁移期间的写操作并原子切换。
+        
+        Args:
+            kind: 目标索引类型
+            
+        Returns:
+            迁移报告（向量数、耗时、相对精确检索的召回率与延迟）
+        """
+        with self.lock:
+            if self._pending_ops is not None:
+                raise RuntimeError(f"Partition {self.path} is already migrating")
+            self._pending_ops = []
+        
+        started = time.monotonic()
+        try:
+            ids, vectors = self.vectors()
+            new_index = vector_index.build_index(
+                kind, self.dimension, ids, vectors, self.nprobe, self.ef_search, self.metric
+            )
+            # 压缩索引另存原始向量用于重排，首次检查点后转为快照中的mmap文件
+            new_raw = None
+            if kind in vector_index.COMPRESSED_KINDS:
+                new_raw = RawVectors(self.dimension, ids, vectors, self.metric)
+        except Exception:
+            with self.lock:
+                self._pending_ops = None
+            raise
+        build_seconds = time.monotonic() - started
+        
+        # 新索引尚未对外可见，在切换前评估
+        report = {
+            'index_type': kind,
+            'vectors': int(len(ids)),
+            'build_seconds': round(build_seconds, 3),
+        }
+        candidate = PartitionView(new_index, new_raw, self.metric)
+        report.update(evaluate_recall(
+            lambda queries, k: candidate.search(queries, k, self.rerank_factor),
+            ids, vectors, metric=self.metric,
+        ))
+        
+        with self.lock:
+            pending, self._pending_ops = self._pending_ops, None
+            if self.closed:
+                return {}
+            for op, op_ids, op_vectors in pending:
+                if op == OP_CLEAR:
+                    # 清空后回到精确索引，之后按数据量重新升级
+                    new_index, new_raw = self._new_index(), None
+                elif op == OP_ADD:
+                    vector_index.upsert(new_index, op_ids, op_vectors)
+                    if new_raw is not None:
+                        new_raw.add(op_ids, op_vectors)
+                else:
+                    vector_index.remove_ids(new_index, op_ids)
+                    if new_raw is not None:
+                        new_raw.remove(op_ids)
+            self.view = PartitionView(new_index, new_raw, self.metric, version=self.view.version + 1)
+            self._dirty = True
+        
+        report['replayed_writes'] = len(pending)
+        self.last_migration = report
+        print(f"Partition {self.path} migrated to {self.index_kind}: {report}")
+        return report
+    
+    def _publish(self, data: np.ndarray, kind: str, count: int, wal_segment: int,
+                 raw: Optional[RawVectors] = None):
+        """发布新快照，manifest记录快照已覆盖到的WAL段号"""
+        self._snapshot_path = self.snapshots.publish(data, {
+            'model_name': self.model_name,
+            'dimension': self.dimension,
+            'index_type': kind,
+            'metric': self.metric,
+            'id_scheme': self.id_scheme,
+            'count': int(count),
+            'wal_segment': wal_segment,
+        }, write_extra=raw.write if raw is not None else None)
+    
+    def checkpoint(self):
+        """
+        将当前索引发布为新快照并删除已被覆盖的预写日志段
+        
+        只在持锁期间序列化索引并切换日志段，写盘在锁外进行，不阻塞并发写入。
+        """
+        with self._checkpoint_lock:
+            self._checkpoint()
+    
+    def _checkpoint(self):
+        """执行检查点，调用方需持有 _checkpoint_lock"""
+        with self.lock:
+            if not self._dirty:
+                return
+            # 快照是单个索引文件，先把增量合并进去；迁移进行中时只合并副本，不切换视图
+            index, raw = self.view.materialize()
+            if self._pending_ops is None and index is not self.view.index:
+                vector_index.configure(index, self.nprobe, self.ef_search)
+                self.view = PartitionView(index, raw, self.metric, version=self.view.version + 1)
+            data = faiss.serialize_index(index)
+            kind = vector_index.index_kind(index)
+            ntotal = index.ntotal
+            frozen = raw.freeze() if raw is not None else None
+            sealed = self.wal.rotate()
+            self._dirty = False
+        
+        try:
+            self._publish(data, kind, ntotal, wal_segment=sealed, raw=frozen)
+        except Exception:
+            self._dirty = True
+            raise
+        if frozen is not None:
+            # 已落盘的原始向量改为从新快照mmap读取，释放内存
+            with self.lock:
+                if self.view.raw is raw:
+                    rebased = raw.freeze()
+                    rebased.rebase(self._snapshot_path, frozen)
+                    self.view = self.view.with_raw(rebased)
+        self.wal.drop_segments(sealed)
+        self._last_checkpoint = time.monotonic()
+        print(f"Index checkpoint saved for {self.path} with {ntotal} vectors.")
+    
+    def maybe_checkpoint(self, max_bytes: int, interval: float):
+        """日志超过大小阈值，或有修改且距上次检查点超过间隔时执行检查点"""
+        overdue = time.monotonic() - self._last_checkpoint >= interval
+        if self._dirty and (overdue or self.wal.pending_bytes >= max_bytes):
+            self.checkpoint()
+    
+    def verify_snapshot(self) -> bool:
+        """完整校验当前快照的校验和"""
+        if not self._snapshot_path:
+            return True
+        return self.snapshots.verify(self._snapshot_path)
+    
+    def save(self):
+        """立即执行检查点"""
+        with self.lock:
+            self._dirty = True
+        self.checkpoint()
+    
+    def close(self):
+        """写出最终检查点并关闭日志，之后的写入会抛出PartitionClosed"""
+        with self._checkpoint_lock:
+            with self.lock:
+                if self.closed:
+                    return
+                self.closed = True
+            try:
+                self._checkpoint()
+            finally:
+                self.wal.close()
+                self._lock_file.close()
+    
+    def destroy(self):
+        """关闭并删除分区的所有磁盘文件"""
+        with self.lock:
+            self.closed = True
+            self.wal.close()
+        shutil.rmtree(self.path, ignore_errors=True)
+        self._lock_file.close()
+
+
+def evaluate_recall(search: Callable[[np.ndarray, int], Tuple[np.ndarray, np.ndarray]],
+                    ids: np.ndarray, vectors: np.ndarray, k: int = 10, sample: int = 100,
+                    metric: str = 'l2') -> Dict:
+    """
+    以精确暴力检索为基准评估索引的召回率与延迟
+
+    从已有向量中抽样作为查询，比较 recall@k 与单次查询平均耗时。
+
+    Args:
+        search: 被评估的检索函数 (查询矩阵, k) -> (距离矩阵, ID矩阵)
+        ids: 全部向量ID
+        vectors: 全部原始向量
+        metric: 精确基准使用的距离度量
+
+    Returns:
+        {'recall_at_k', 'k', 'latency_ms', 'exact_latency_ms'}
+    """
+    if len(ids) == 0:
+        return {'recall_at_k': 1.0, 'k': k, 'latency_ms': 0.0, 'exact_latency_ms': 0.0}
+    k = min(k, len(ids))
+    rng = np.random.default_rng(0)
+    queries = vectors[rng.choice(len(vectors), min(sample, len(vectors)), replace=False)]
+
+    exact = faiss.IndexFlat(vectors.shape[1], vector_index.faiss_metric(metric))
+    exact.add(vectors)
+    started = time.perf_counter()
+    _, exact_positions = exact.search(queries, k)
+    exact_ms = (time.perf_counter() - started) * 1000 / len(queries)
+    expected = ids[exact_positions]
+
+    started = time.perf_counter()
+    _, found = search(queries, k)
+    latency_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+    hits = sum(len(np.intersect1d(expected[row], found[row])) for row in range(len(queries)))
+    return {
+        'recall_at_k': round(hits / (len(queries) * k), 4),
+        'k': k,
+        'latency_ms': round(latency_ms, 4),
+        'exact_latency_ms': round(exact_ms, 4),
+    }
@@ -0,0 +1,94 @@
+import json
+import struct
+import socket
+from typing import Any, List, Tuple
+import numpy as np
+
+# 向量服务的帧格式（Unix域套接字上的长度前缀帧）:
+#   帧头   !II  元数据长度, 数组个数
+#   元数据 UTF-8 JSON（方法名、参数或返回值），其中的numpy数组以 {"__nd__": 序号} 占位
+#   数组   每个 !I 字节长度 + 原始内存，dtype与shape记录在占位对象中
+# 文本、ID列表等小数据走JSON，向量矩阵按原始float32字节传输，不做文本编码。
+FRAME_HEADER = struct.Struct('!II')
+ARRAY_HEADER = struct.Struct('!I')
+
+# 单帧元数据上限，防止损坏的帧头导致超大内存分配
+MAX_META_BYTES = 64 * 1024 * 1024
+
+
+class ProtocolError(Exception):
+    """帧格式错误或连接意外断开"""
+
+
+def _pack_value(value: Any, arrays: List[np.ndarray]) -> Any:
+    """把值中的numpy数组替换为占位对象，数组本身收集到arrays"""
+    if isinstance(value, np.ndarray):
+        arrays.append(np.ascontiguousarray(value))
+        return {'__nd__': len(arrays) - 1, 'dtype': value.dtype.str, 'shape': list(value.shape)}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return [_pack_value(item, arrays) for item in value]
+    if isinstance(value, dict):
+        return {key: _pack_value(item, arrays) for key, item in value.items()}
+    return value
+
+
+def _unpack_value(value: Any, arrays: List[bytearray]) -> Any:
+    """还原占位对象为numpy数组"""
+    if isinstance(value, list):
+        return [_unpack_value(item, arrays) for item in value]
+    if isinstance(value, dict):
+        if '__nd__' in value:
+            data = arrays[value['__nd__']]
+            return np.frombuffer(data, dtype=np.dtype(value['dtype'])).reshape(value['shape'])
+        return {key: _unpack_value(item, arrays) for key, item in value.items()}
+    return value
+
+
+def send_message(sock: socket.socket, message: Any):
+    """发送一条消息"""
+    arrays: List[np.ndarray] = []
+    meta = json.dumps(_pack_value(message, arrays), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    parts = [FRAME_HEADER.pack(len(meta), len(arrays)), meta]
+    for array in arrays:
+        data = array.tobytes()
+        parts.append(ARRAY_HEADER.pack(len(data)))
+        parts.append(data)
+    sock.sendall(b''.join(parts))
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytearray:
+    """读满size字节（返回可写缓冲，还原的数组无需再复制即可原地修改）"""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:], size - received)
+        if count == 0:
+            raise ProtocolError("Connection closed")
+        received += count
+    return buffer
+
+
+def recv_message(sock: socket.socket) -> Any:
+    """
+    接收一条消息
+
+    Raises:
+        ProtocolError: 连接在帧边界处关闭或帧格式错误
+    """
+    meta_size, array_count = FRAME_HEADER.unpack(_recv_exact(sock, FRAME_HEADER.size))
+    if meta_size > MAX_META_BYTES:
+        raise ProtocolError(f"Frame metadata too large: {meta_size} bytes")
+    meta = json.loads(_recv_exact(sock, meta_size).decode('utf-8'))
+    arrays = []
+    for _ in range(array_count):
+        (size,) = ARRAY_HEADER.unpack(_recv_exact(sock, ARRAY_HEADER.size))
+        arrays.append(_recv_exact(sock, size))
+    return _unpack_value(meta, arrays)
+
+
+def as_tuples(hits: list) -> List[Tuple]:
+    """JSON把结果元组还原成了列表，转换回元组"""
+    return [tuple(hit) for hit in hits]
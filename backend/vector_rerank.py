@@ -0,0 +1,221 @@
+import os
+import numpy as np
+from typing import Dict, List, Optional, Set, Tuple
+import vector_index
+
+IDS_FILE = 'ids.npy'
+VECTORS_FILE = 'vectors.npy'
+
+# 写出快照时每批复制的向量数
+WRITE_CHUNK = 65536
+
+
+class RawVectors:
+    """
+    压缩索引的原始向量存储，用于精确重排
+    
+    上次检查点时的全部原始向量按ID排序存放在快照的 ids.npy / vectors.npy 中，
+    以只读mmap方式打开，只有重排时访问到的行会被读入内存；之后写入的向量保存在
+    内存中的 tail，被删除或覆盖的快照内ID记录在 removed 中。检查点把两者合并
+    写入新快照后，tail 中已落盘的部分被释放。
+    """
+    
+    def __init__(self, dimension: int, ids: Optional[np.ndarray] = None,
+                 vectors: Optional[np.ndarray] = None, metric: str = 'l2'):
+        """
+        Args:
+            dimension: 向量维度
+            ids: 基础向量ID（无需排序）
+            vectors: 与ids对应的原始向量
+            metric: 重排使用的距离度量
+        """
+        self.dimension = dimension
+        self.metric = metric
+        self.base_ids = np.zeros(0, dtype='int64')
+        self.base_vectors = np.zeros((0, dimension), dtype='float32')
+        if ids is not None and len(ids):
+            order = np.argsort(ids, kind='stable')
+            self.base_ids = np.ascontiguousarray(ids[order], dtype='int64')
+            self.base_vectors = np.ascontiguousarray(vectors[order], dtype='float32')
+        self.tail: Dict[int, np.ndarray] = {}
+        self.removed: Set[int] = set()
+    
+    @classmethod
+    def load(cls, path: str, dimension: int, metric: str = 'l2') -> 'RawVectors':
+        """以只读mmap方式打开快照目录中的原始向量"""
+        raw = cls(dimension, metric=metric)
+        raw.base_ids = np.load(os.path.join(path, IDS_FILE), mmap_mode='r')
+        raw.base_vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode='r')
+        return raw
+    
+    def _base_positions(self, ids: np.ndarray) -> np.ndarray:
+        """返回ids在基础向量中的行号，不存在时为-1"""
+        if len(self.base_ids) == 0:
+            return np.full(len(ids), -1, dtype='int64')
+        positions = np.searchsorted(self.base_ids, ids)
+        positions = np.minimum(positions, len(self.base_ids) - 1)
+        return np.where(self.base_ids[positions] == ids, positions, -1)
+    
+    def add(self, ids: np.ndarray, vectors: np.ndarray):
+        """写入（覆盖）原始向量"""
+        for doc_id, vector in zip(ids.tolist(), vectors):
+            self.tail[doc_id] = np.array(vector, dtype='float32')
+            self.removed.discard(doc_id)
+    
+    def remove(self, ids: np.ndarray):
+        """删除原始向量（不在基础向量中的ID在下次切换快照时从 removed 中清理）"""
+        for doc_id in ids.tolist():
+            self.tail.pop(doc_id, None)
+            self.removed.add(doc_id)
+    
+    def get(self, ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        按ID取原始向量
+        
+        Returns:
+            (是否找到的布尔数组, 向量矩阵)
+        """
+        vectors = np.zeros((len(ids), self.dimension), dtype='float32')
+        found = np.zeros(len(ids), dtype=bool)
+        positions = self._base_positions(ids)
+        for row, doc_id in enumerate(ids.tolist()):
+            vector = self.tail.get(doc_id)
+            if vector is not None:
+                vectors[row] = vector
+                found[row] = True
+            elif positions[row] >= 0 and doc_id not in self.removed:
+                vectors[row] = self.base_vectors[positions[row]]
+                found[row] = True
+        return found, vectors
+    
+    def rerank(self, query_vectors: np.ndarray, candidate_ids: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        用原始向量重新计算候选的精确距离（L2距离或内积）并取前k个
+        
+        Args:
+            query_vectors: 查询向量矩阵
+            candidate_ids: 压缩索引返回的候选ID矩阵（-1为空位）
+            k: 每个查询返回的数量
+        
+        Returns:
+            (距离矩阵, ID矩阵)，不足k个时以 (最差距离, -1) 补齐
+        """
+        distances = np.full((len(query_vectors), k), vector_index.worst_distance(self.metric), dtype='float32')
+        ids = np.full((len(query_vectors), k), -1, dtype='int64')
+        for row, query in enumerate(query_vectors):
+            candidates = candidate_ids[row][candidate_ids[row] != -1]
+            found, vectors = self.get(candidates)
+            candidates, vectors = candidates[found], vectors[found]
+            exact = self.distances(query, vectors)
+            order = vector_index.rank_order(exact, self.metric)[:k]
+            distances[row, :len(order)] = exact[order]
+            ids[row, :len(order)] = candidates[order]
+        return distances, ids
+    
+    def distances(self, query: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+        """查询向量与一组原始向量的精确距离"""
+        if self.metric == 'cosine':
+            return vectors @ query
+        return ((vectors - query) ** 2).sum(axis=1)
+    
+    def freeze(self) -> 'RawVectors':
+        """返回当前状态的浅拷贝（基础向量只读共享），供锁外写出快照"""
+        frozen = RawVectors(self.dimension, metric=self.metric)
+        frozen.base_ids, frozen.base_vectors = self.base_ids, self.base_vectors
+        frozen.tail = dict(self.tail)
+        frozen.removed = set(self.removed)
+        return frozen
+    
+    def _merged_layout(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        计算合并后的布局: 先是保留的基础向量，再是tail中的向量
+        
+        Returns:
+            (保留的基础行号, tail中的ID, 合并后的ID)
+        """
+        keep = np.ones(len(self.base_ids), dtype=bool)
+        superseded = np.fromiter(self.removed | set(self.tail), dtype='int64')
+        if len(superseded) and len(self.base_ids):
+            keep &= ~np.isin(self.base_ids, superseded)
+        kept_rows = np.flatnonzero(keep)
+        tail_ids = np.fromiter(self.tail.keys(), dtype='int64', count=len(self.tail))
+        return kept_rows, tail_ids, np.concatenate([np.asarray(self.base_ids)[kept_rows], tail_ids])
+    
+    def vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """返回全部有效的 (ID数组, 原始向量矩阵)"""
+        kept_rows, tail_ids, ids = self._merged_layout()
+        tail = np.asarray([self.tail[doc_id] for doc_id in tail_ids.tolist()], dtype='float32')
+        vectors = np.concatenate([
+            np.asarray(self.base_vectors[kept_rows]),
+            tail.reshape(-1, self.dimension),
+        ])
+        return ids, vectors
+    
+    def write(self, path: str):
+        """将合并后的原始向量按ID排序分批写入目录（不一次性读入全部基础向量）"""
+        kept_rows, tail_ids, ids = self._merged_layout()
+        order = np.argsort(ids, kind='stable')
+        np.save(os.path.join(path, IDS_FILE), ids[order])
+        
+        tail = np.asarray([self.tail[doc_id] for doc_id in tail_ids.tolist()], dtype='float32')
+        tail = tail.reshape(-1, self.dimension)
+        out = np.lib.format.open_memmap(
+            os.path.join(path, VECTORS_FILE), mode='w+', dtype='float32', shape=(len(ids), self.dimension)
+        )
+        for start in range(0, len(order), WRITE_CHUNK):
+            sources = order[start:start + WRITE_CHUNK]
+            from_base = sources < len(kept_rows)
+            chunk = np.empty((len(sources), self.dimension), dtype='float32')
+            chunk[from_base] = self.base_vectors[kept_rows[sources[from_base]]]
+            chunk[~from_base] = tail[sources[~from_base] - len(kept_rows)]
+            out[start:start + len(sources)] = chunk
+        out.flush()
+        del out
+    
+    def rebase(self, path: str, frozen: 'RawVectors'):
+        """
+        切换到新快照中的原始向量
+        
+        frozen 之后的写入仍保留在 tail / removed 中。
+        """
+        fresh = RawVectors.load(path, self.dimension, self.metric)
+        self.base_ids, self.base_vectors = fresh.base_ids, fresh.base_vectors
+        for doc_id, vector in frozen.tail.items():
+            if self.tail.get(doc_id) is vector:
+                del self.tail[doc_id]
+        removed = np.fromiter(self.removed, dtype='int64', count=len(self.removed))
+        self.removed = set(removed[self._base_positions(removed) >= 0].tolist())
+
+
+def search(index, raw: Optional[RawVectors], query_vectors: np.ndarray, k: int,
+           tombstones: int = 0, rerank_factor: int = 4) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    检索索引；有原始向量时先从压缩索引多取 k * rerank_factor 个候选，再精确重排
+
+    Returns:
+        (距离矩阵, ID矩阵)
+    """
+    if raw is None:
+        return vector_index.search(index, query_vectors, k, tombstones)
+    _, candidates = vector_index.search(index, query_vectors, k * rerank_factor, tombstones)
+    return raw.rerank(query_vectors, candidates, k)
+
+
+def range_search(index, raw: Optional[RawVectors], query_vectors: np.ndarray, radius: float, max_k: int,
+                 tombstones: int = 0, rerank_factor: int = 4) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    范围检索；有原始向量时取 max_k * rerank_factor 个候选精确重排后再按阈值过滤
+
+    压缩索引的近似距离会把阈值附近的结果错判，因此不直接在压缩索引上做范围检索。
+
+    Returns:
+        每个查询一项 (距离数组, ID数组)
+    """
+    if raw is None:
+        return vector_index.range_search(index, query_vectors, radius, max_k)
+    distances, ids = search(index, raw, query_vectors, max_k, tombstones, rerank_factor)
+    results = []
+    for row_distances, row_ids in zip(distances, ids):
+        keep = (row_ids != -1) & vector_index.within(row_distances, radius, raw.metric)
+        results.append((row_distances[keep], row_ids[keep]))
+    return results
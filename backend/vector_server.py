@@ -0,0 +1,127 @@
+import os
+import socket
+import socketserver
+import threading
+from typing import Callable, Dict
+from vector_protocol import send_message, recv_message, ProtocolError
+
+
+def _methods(store) -> Dict[str, Callable]:
+    """客户端可调用的方法（只暴露 VectorStore 的公开接口）"""
+    return {
+        'info': lambda: {
+            'model_name': store.model_name,
+            'dimension': store.dimension,
+            'metric': store.metric,
+            'model_loaded': store.model_loaded,
+        },
+        'encode_texts': store.encode_texts,
+        'encode_text': store.encode_text,
+        'add_documents': store.add_documents,
+        'update_document': store.update_document,
+        'remove_documents': store.remove_documents,
+        'search': store.search,
+        'search_batch': store.search_batch,
+        'search_range': store.search_range,
+        'get_index_size': store.get_index_size,
+        'evaluate_index': store.evaluate_index,
+        'clear_index': store.clear_index,
+        'checkpoint': store.checkpoint,
+        'warm_up': store.warm_up,
+        'loaded_partitions': store.loaded_partitions,
+        'has_shared_index': store.has_shared_index,
+        # JSON对象的键只能是字符串，映射以 [doc_id, user_id] 列表传输
+        'migrate_shared_index': lambda owners: store.migrate_shared_index(dict(owners)),
+    }
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    """一个客户端连接：循环读取请求帧并依次应答，直到对方断开"""
+
+    def setup(self):
+        self.server.track(self.request, True)
+
+    def finish(self):
+        self.server.track(self.request, False)
+
+    def handle(self):
+        methods = self.server.methods
+        while True:
+            try:
+                request = recv_message(self.request)
+            except (ProtocolError, OSError):
+                return
+            method = methods.get(request.get('method'))
+            try:
+                if method is None:
+                    raise AttributeError(f"Unknown method: {request.get('method')}")
+                result = method(*request.get('args', []), **request.get('kwargs', {}))
+                response = {'result': result}
+            except Exception as e:
+                response = {'error': str(e), 'type': type(e).__name__}
+            try:
+                send_message(self.request, response)
+            except (ConnectionError, OSError):
+                return
+
+
+class VectorServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    向量服务进程：独占嵌入模型与全部向量分区，通过Unix域套接字为多个Web worker提供
+    编码、检索与增删
+
+    每个连接一个线程；并发请求共用同一个 VectorStore（检索无锁读视图，编码经微批处理合并），
+    所有worker看到的是同一份索引。
+    """
+
+    daemon_threads = True
+
+    def __init__(self, store, socket_path: str):
+        """
+        Args:
+            store: 本地 VectorStore
+            socket_path: 套接字文件路径（已存在的残留文件会被替换）
+        """
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        self.store = store
+        self.methods = _methods(store)
+        self._connections = set()
+        self._connections_lock = threading.Lock()
+        super().__init__(socket_path, _Handler)
+        # 只允许同一用户（及同组）的进程连接
+        os.chmod(socket_path, 0o660)
+
+    def track(self, connection, active: bool):
+        """登记/注销活动连接"""
+        with self._connections_lock:
+            if active:
+                self._connections.add(connection)
+            else:
+                self._connections.discard(connection)
+
+    def server_close(self):
+        # 断开仍在等待请求的连接，客户端会重连到新的服务进程
+        with self._connections_lock:
+            connections = list(self._connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+def serve(store, socket_path: str):
+    """前台运行向量服务，直到进程被中断"""
+    server = VectorServer(store, socket_path)
+    print(f"Vector server listening on {socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        store.close()
@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import numpy as np
+from typing import Callable, Dict, Optional
+
+# 快照格式版本，格式不兼容时递增
+SNAPSHOT_FORMAT_VERSION = 1
+
+INDEX_FILE = 'index.faiss'
+MANIFEST_FILE = 'manifest.json'
+CURRENT_FILE = 'CURRENT'
+
+
+class SnapshotError(Exception):
+    """快照缺失文件、校验失败或与当前配置不兼容"""
+
+
+def _fsync_dir(path: str):
+    """将目录项（新建/重命名）持久化"""
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class SnapshotStore:
+    """
+    向量索引快照目录
+    
+    每个快照是 snapshots/ 下的一个不可变子目录，包含FAISS索引文件
+    （ID映射以原始int64数组序列化在其中）、压缩索引的原始向量文件，以及
+    记录格式版本、模型、维度、数量与各文件校验和的manifest。快照先完整写入临时目录，
+    再通过重命名发布，最后原子替换 CURRENT 指针，任何时刻崩溃都只会
+    留下旧快照或新快照之一。
+    """
+    
+    def __init__(self, root: str):
+        """
+        初始化快照目录
+        
+        Args:
+            root: 索引根目录
+        """
+        self.root = root
+        self.snapshot_dir = os.path.join(root, 'snapshots')
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+    
+    def current(self) -> Optional[str]:
+        """返回当前快照目录路径，尚无快照时返回None"""
+        pointer = os.path.join(self.root, CURRENT_FILE)
+        if not os.path.exists(pointer):
+            return None
+        with open(pointer, 'r', encoding='utf-8') as f:
+            name = f.read().strip()
+        path = os.path.join(self.snapshot_dir, name)
+        if not os.path.isdir(path):
+            raise SnapshotError(f"CURRENT points to missing snapshot {name}")
+        return path
+    
+    def read_manifest(self, path: str) -> Dict:
+        """读取快照manifest并校验文件大小"""
+        manifest_file = os.path.join(path, MANIFEST_FILE)
+        if not os.path.exists(manifest_file):
+            raise SnapshotError(f"Snapshot {path} has no manifest")
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+            raise SnapshotError(f"Unsupported snapshot format {manifest.get('format_version')}")
+        for name, meta in manifest['files'].items():
+            file_path = os.path.join(path, name)
+            if not os.path.exists(file_path) or os.path.getsize(file_path) != meta['size']:
+                raise SnapshotError(f"Snapshot file {name} is missing or truncated")
+        return manifest
+    
+    def verify(self, path: str) -> bool:
+        """完整校验快照文件的SHA-256（开销与索引大小成正比）"""
+        manifest = self.read_manifest(path)
+        return all(
+            _sha256(os.path.join(path, name)) == meta['sha256']
+            for name, meta in manifest['files'].items()
+        )
+    
+    def publish(self, index_data: np.ndarray, meta: Dict,
+                write_extra: Optional[Callable[[str], None]] = None) -> str:
+        """
+        写入并原子发布新快照
+        
+        Args:
+            index_data: faiss.serialize_index 得到的字节数组
+            meta: 写入manifest的附加字段（模型、维度、数量、WAL段号等）
+            write_extra: 向临时快照目录写入附加文件的回调（如压缩索引的原始向量）
+        
+        Returns:
+            新快照目录路径
+        """
+        name = f"snap-{time.time_ns():020d}"
+        tmp_path = os.path.join(self.snapshot_dir, f".tmp-{name}")
+        os.makedirs(tmp_path)
+        
+        index_file = os.path.join(tmp_path, INDEX_FILE)
+        with open(index_file, 'wb') as f:
+            f.write(index_data.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        if write_extra is not None:
+            write_extra(tmp_path)
+        
+        manifest = dict(meta)
+        manifest['format_version'] = SNAPSHOT_FORMAT_VERSION
+        manifest['created_at'] = time.time()
+        manifest['files'] = {}
+        for file_name in sorted(os.listdir(tmp_path)):
+            file_path = os.path.join(tmp_path, file_name)
+            if file_name != INDEX_FILE:
+                with open(file_path, 'rb+') as f:
+                    os.fsync(f.fileno())
+            manifest['files'][file_name] = {'size': os.path.getsize(file_path), 'sha256': _sha256(file_path)}
+        with open(os.path.join(tmp_path, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        _fsync_dir(tmp_path)
+        
+        # 发布: 重命名快照目录，再原子替换CURRENT指针
+        path = os.path.join(self.snapshot_dir, name)
+        os.rename(tmp_path, path)
+        _fsync_dir(self.snapshot_dir)
+        
+        pointer = os.path.join(self.root, CURRENT_FILE)
+        with open(pointer + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(name)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(pointer + '.tmp', pointer)
+        _fsync_dir(self.root)
+        
+        self._remove_stale(keep=name)
+        return path
+    
+    def _remove_stale(self, keep: str):
+        """删除旧快照和未发布完成的临时目录"""
+        for name in os.listdir(self.snapshot_dir):
+            if name != keep:
+                # 已映射的旧快照在Linux上删除后映射仍然有效
+                shutil.rmtree(os.path.join(self.snapshot_dir, name), ignore_errors=True)
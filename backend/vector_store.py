@@ -1,69 +1,346 @@
 import os
-import pickle
+import atexit
+import shutil
+import time
+import threading
+from collections import OrderedDict
 import numpy as np
 import faiss
-from sentence_transformers import SentenceTransformer
-from typing import List, Tuple, Optional
+from typing import Dict, Iterable, List, Tuple, Optional, Union
+from vector_partition import VectorPartition, PartitionClosed, evaluate_recall
+import vector_index
+from vector_snapshot import CURRENT_FILE
+from embedding_cache import EmbeddingCache
+from embedding_batcher import EmbeddingBatcher
+from services.text_chunker import TextChunker
+
+# 片段池化方式: max 取文档最相关片段的相似度，sum 累加命中片段的相似度（偏向多处相关的长文档）
+POOLING_MODES = ('max', 'sum')
+
+# 检索时按 k * PASSAGE_FETCH_FACTOR 取片段，再聚合为文档
+PASSAGE_FETCH_FACTOR = 4
+
+# 批量编码时每批最多的片段数
+ENCODE_BATCH_CHUNKS = 256
+
+# 已加载的嵌入模型，同一进程内的多个向量库共用
+_models: Dict[str, object] = {}
+_models_lock = threading.Lock()
 
 class VectorStore:
-    """FAISS向量存储管理类"""
+    """FAISS向量存储管理类（按用户分区）"""
     
-    def __init__(self, model_name: str = 'all-MiniLM-L6-v2', index_path: str = 'faiss_index'):
+    def __init__(self, model_name: str = 'all-MiniLM-L6-v2', index_path: str = 'faiss_index',
+                 checkpoint_bytes: int = 64 * 1024 * 1024, checkpoint_interval: float = 300.0,
+                 max_loaded_partitions: int = 64, ann_index: str = 'hnsw',
+                 ann_threshold: int = 50000, nprobe: int = 16, ef_search: int = 64,
+                 compression: str = 'none', rerank_factor: int = 4, metric: str = 'l2',
+                 similarity_threshold: float = 0.6, embedding_cache_path: Optional[str] = None,
+                 embedding_cache_items: int = 10000, chunk_size: int = 200, chunk_overlap: int = 40,
+                 passage_pooling: str = 'max', embedding_batch_size: int = 64,
+                 embedding_batch_wait_ms: float = 5.0):
         """
         初始化向量存储
         
+        每个用户的向量存放在独立分区 index_path/users/<user_id>/ 中，
+        分区在首次访问时加载，超过 max_loaded_partitions 时按LRU淘汰最久未用的分区。
+        文档切分为相互重叠的片段分别编码，向量ID为 文档ID<<10|片段序号，检索结果按文档聚合。
+        
         Args:
             model_name: 嵌入模型名称
             index_path: 索引存储路径
+            checkpoint_bytes: 分区预写日志累计达到该字节数时触发后台检查点
+            checkpoint_interval: 有未落盘修改时，后台检查点的最长间隔（秒）
+            max_loaded_partitions: 内存中最多保留的用户分区数量
+            ann_index: 分区向量数超过阈值后升级到的近似索引类型（ivf / hnsw，flat表示不升级）
+            ann_threshold: 升级为近似索引的向量数阈值
+            nprobe: IVF索引检索时探测的聚类数
+            ef_search: HNSW索引检索宽度
+            compression: 压缩存储模式（sq8 / ivfpq），启用后超过阈值的分区改为升级到压缩索引，
+                原始向量保存在快照文件中按需读取，用于精确重排；none表示不压缩
+            rerank_factor: 压缩索引检索时取 k * rerank_factor 个候选做精确重排
+            metric: 距离度量；l2 相似度为 exp(-L2距离平方)，cosine 向量归一化后用内积，相似度即余弦值
+            similarity_threshold: search_range 默认的最低相似度
+            embedding_cache_path: 嵌入缓存SQLite文件路径，为空时只缓存在内存中
+            embedding_cache_items: 嵌入缓存内存层最多保留的向量数
+            chunk_size: 片段长度（估算词元数，模型只编码前约256个词元）
+            chunk_overlap: 相邻片段的重叠长度
+            passage_pooling: 片段相似度聚合为文档分数的方式（max / sum）
+            embedding_batch_size: 并发编码请求合并的最大批量
+            embedding_batch_wait_ms: 合并请求时最多等待的毫秒数，0表示不合并、各线程直接调用模型
         """
+        if ann_index not in vector_index.INDEX_KINDS:
+            raise ValueError(f"Unknown ANN index type: {ann_index}")
+        if compression != 'none' and compression not in vector_index.COMPRESSED_KINDS:
+            raise ValueError(f"Unknown vector compression: {compression}")
+        if metric not in vector_index.METRICS:
+            raise ValueError(f"Unknown vector metric: {metric}")
+        if passage_pooling not in POOLING_MODES:
+            raise ValueError(f"Unknown passage pooling: {passage_pooling}")
         self.model_name = model_name
         self.index_path = index_path
-        self.model = None
-        self.index = None
-        self.doc_ids = []  # 存储文档ID映射
+        self._model = None
         self.dimension = 384  # all-MiniLM-L6-v2的向量维度
+        self.checkpoint_bytes = checkpoint_bytes
+        self.checkpoint_interval = checkpoint_interval
+        self.max_loaded_partitions = max_loaded_partitions
+        self.ann_index = ann_index
+        self.ann_threshold = ann_threshold
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.compression = None if compression == 'none' else compression
+        self.rerank_factor = rerank_factor
+        self.metric = metric
+        self.similarity_threshold = similarity_threshold
+        self.chunker = TextChunker(chunk_size, chunk_overlap)
+        self.passage_pooling = passage_pooling
+        
+        # 已加载的分区，按最近使用顺序排列
+        self._partitions: "OrderedDict[int, VectorPartition]" = OrderedDict()
+        self._partitions_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
         
         # 确保索引目录存在
-        os.makedirs(index_path, exist_ok=True)
+        self.partition_root = os.path.join(index_path, 'users')
+        os.makedirs(self.partition_root, exist_ok=True)
+        
+        # 按内容哈希缓存嵌入，重复内容无需再次推理
+        self.embedding_cache = EmbeddingCache(model_name, embedding_cache_path, embedding_cache_items)
+        
+        # 模型在首次编码或预热时才加载（导入 sentence-transformers / torch 耗时数秒）
+        self._model_lock = threading.Lock()
         
-        # 加载模型
-        self._load_model()
+        # 并发的少量文本编码请求合并为一批调用模型
+        self.batcher = None
+        if embedding_batch_wait_ms > 0:
+            self.batcher = EmbeddingBatcher(self._encode_batch, embedding_batch_size, embedding_batch_wait_ms)
         
-        # 加载或创建索引
-        self._load_or_create_index()
+        if self.has_shared_index():
+            print("Found a shared (pre-partition) index; run `flask vector-migrate` to split it by user.")
+        
+        # 启动后台检查点线程
+        self._checkpointer = threading.Thread(target=self._checkpoint_loop, name='vector-checkpoint', daemon=True)
+        self._checkpointer.start()
+        atexit.register(self.close)
+    
+    @property
+    def model(self):
+        """嵌入模型，首次访问时加载"""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = self._load_model()
+        return self._model
+    
+    @property
+    def model_loaded(self) -> bool:
+        return self._model is not None
     
     def _load_model(self):
-        """加载嵌入模型"""
-        print(f"Loading embedding model: {self.model_name}...")
-        self.model = SentenceTransformer(self.model_name)
-        print("Model loaded successfully.")
-    
-    def _load_or_create_index(self):
-        """加载或创建FAISS索引"""
-        index_file = os.path.join(self.index_path, 'faiss.index')
-        mapping_file = os.path.join(self.index_path, 'doc_mapping.pkl')
-        
-        if os.path.exists(index_file) and os.path.exists(mapping_file):
-            # 加载现有索引
-            self.index = faiss.read_index(index_file)
-            with open(mapping_file, 'rb') as f:
-                self.doc_ids = pickle.load(f)
-            print(f"Loaded existing index with {self.index.ntotal} vectors.")
-        else:
-            # 创建新索引 (使用L2距离)
-            self.index = faiss.IndexFlatL2(self.dimension)
-            self.doc_ids = []
-            print("Created new FAISS index.")
+        """加载嵌入模型（进程内已加载过同名模型时直接复用）"""
+        with _models_lock:
+            model = _models.get(self.model_name)
+            if model is None:
+                print(f"Loading embedding model: {self.model_name}...")
+                started = time.perf_counter()
+                from sentence_transformers import SentenceTransformer
+                model = SentenceTransformer(self.model_name)
+                _models[self.model_name] = model
+                print(f"Model loaded in {time.perf_counter() - started:.2f}s.")
+            return model
+    
+    def warm_up(self, user_ids: Iterable[int] = ()) -> Dict[str, float]:
+        """
+        预热：加载模型并执行一次编码，加载指定用户的分区并检索一次使索引页进入内存
+        
+        Args:
+            user_ids: 需要预先加载分区的用户ID（如最近活跃的用户）
+        
+        Returns:
+            各阶段耗时（秒）{'model', 'encode', 'partitions'}
+        """
+        timings = {}
+        started = time.perf_counter()
+        model = self.model
+        timings['model'] = time.perf_counter() - started
+        
+        # 首次推理会初始化计算图与线程池，不经过嵌入缓存
+        started = time.perf_counter()
+        model.encode(['warm up'], convert_to_numpy=True, show_progress_bar=False)
+        timings['encode'] = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        probe = np.zeros((1, self.dimension), dtype='float32')
+        for user_id in user_ids:
+            partition = self._partition(user_id)
+            if partition.size:
+                partition.search(probe, 1)
+        timings['partitions'] = time.perf_counter() - started
+        return {name: round(seconds, 3) for name, seconds in timings.items()}
+    
+    def _partition_path(self, user_id: int) -> str:
+        return os.path.join(self.partition_root, str(int(user_id)))
+    
+    def _partition(self, user_id: int) -> VectorPartition:
+        """获取用户分区，未加载时从磁盘加载，并按LRU淘汰冷分区"""
+        user_id = int(user_id)
+        with self._partitions_lock:
+            partition = self._partitions.get(user_id)
+            if partition is not None:
+                self._partitions.move_to_end(user_id)
+                return partition
+            
+            partition = VectorPartition(
+                self._partition_path(user_id), self.model_name, self.dimension,
+                nprobe=self.nprobe, ef_search=self.ef_search, rerank_factor=self.rerank_factor,
+                metric=self.metric,
+            )
+            self._partitions[user_id] = partition
+            evicted = []
+            while len(self._partitions) > self.max_loaded_partitions:
+                _, cold = self._partitions.popitem(last=False)
+                evicted.append(cold)
+        
+        # 淘汰的分区写出检查点后释放内存
+        for cold in evicted:
+            try:
+                cold.close()
+            except Exception as e:
+                print(f"Error closing partition {cold.path}: {str(e)}")
+        
+        self._maybe_promote(partition)
+        return partition
+    
+    def _write(self, user_id: int, operation):
+        """在用户分区上执行写操作；分区恰好被淘汰时重新加载后重试"""
+        while True:
+            partition = self._partition(user_id)
+            try:
+                return operation(partition)
+            except PartitionClosed:
+                continue
+    
+    def loaded_partitions(self) -> List[int]:
+        """返回当前驻留内存的用户分区ID（由冷到热）"""
+        with self._partitions_lock:
+            return list(self._partitions.keys())
+    
+    def checkpoint(self):
+        """为所有已加载且有修改的分区执行检查点"""
+        with self._partitions_lock:
+            partitions = list(self._partitions.values())
+        for partition in partitions:
+            partition.checkpoint()
     
     def save_index(self):
-        """保存索引到磁盘"""
-        index_file = os.path.join(self.index_path, 'faiss.index')
-        mapping_file = os.path.join(self.index_path, 'doc_mapping.pkl')
+        """保存索引到磁盘（立即执行检查点）"""
+        self.checkpoint()
+    
+    def _checkpoint_loop(self):
+        """后台线程: 分区日志超过大小阈值或有修改且超过时间间隔时执行检查点"""
+        while not self._closed:
+            self._wake.wait(timeout=min(self.checkpoint_interval, 5.0))
+            self._wake.clear()
+            if self._closed:
+                break
+            with self._partitions_lock:
+                partitions = list(self._partitions.values())
+            for partition in partitions:
+                try:
+                    partition.maybe_checkpoint(self.checkpoint_bytes, self.checkpoint_interval)
+                except Exception as e:
+                    print(f"Error writing index checkpoint for {partition.path}: {str(e)}")
+    
+    def _logged(self, partition: VectorPartition):
+        """写操作后调用，按大小阈值唤醒检查点线程，并检查是否需要升级索引"""
+        if partition.pending_bytes >= self.checkpoint_bytes:
+            self._wake.set()
+        self._maybe_promote(partition)
+    
+    def _target_kind(self, partition: VectorPartition) -> Optional[str]:
+        """
+        判断分区需要迁移到的索引类型
         
-        faiss.write_index(self.index, index_file)
-        with open(mapping_file, 'wb') as f:
-            pickle.dump(self.doc_ids, f)
-        print(f"Index saved with {self.index.ntotal} vectors.")
+        向量数超过阈值时从精确索引升级为近似索引（启用压缩时升级为压缩索引）；
+        HNSW墓碑超过20%时重建以回收空间。
+        
+        Returns:
+            目标索引类型，无需迁移时返回None
+        """
+        kind = partition.index_kind
+        if self.compression:
+            threshold = max(self.ann_threshold, vector_index.min_vectors(self.compression))
+            if kind != self.compression and partition.size >= threshold:
+                return self.compression
+        elif kind == 'flat' and self.ann_index != 'flat' and partition.size >= self.ann_threshold:
+            return self.ann_index
+        if kind == 'hnsw' and partition.tombstones > 0.2 * partition.index.ntotal:
+            return 'hnsw'
+        return None
+    
+    def _maybe_promote(self, partition: VectorPartition):
+        """需要时在后台线程中迁移分区索引，迁移期间检索与写入照常进行"""
+        if self._closed or partition.migrating:
+            return
+        kind = self._target_kind(partition)
+        if kind is None:
+            return
+        
+        def run():
+            try:
+                partition.migrate(kind)
+            except Exception as e:
+                print(f"Error migrating partition {partition.path} to {kind}: {str(e)}")
+        
+        threading.Thread(target=run, name='vector-promote', daemon=True).start()
+    
+    def close(self):
+        """停止后台检查点，为所有分区写出最终检查点并关闭日志"""
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        self._wake.set()
+        self._checkpointer.join(timeout=10)
+        with self._partitions_lock:
+            partitions = list(self._partitions.values())
+            self._partitions.clear()
+        for partition in partitions:
+            partition.close()
+        if self.batcher is not None:
+            self.batcher.close()
+        self.embedding_cache.close()
+    
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        """批处理器工作线程调用的模型编码"""
+        return self.model.encode(texts, convert_to_numpy=True, show_progress_bar=False)
+    
+    def _embed(self, texts: List[str], show_progress_bar: bool = False) -> np.ndarray:
+        """
+        编码文本，先查嵌入缓存，只对未命中的文本（批内去重后）调用模型
+        
+        少量未命中文本交给批处理器与其他线程的请求合并编码，
+        达到一批的大批量（如文档入库）直接调用模型。
+        
+        Returns:
+            float32向量矩阵（cosine度量下已归一化）
+        """
+        cached = self.embedding_cache.get_many(texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, cached) if vector is None))
+        if missing:
+            if self.batcher is not None and not self._closed and len(missing) < self.batcher.max_batch:
+                encoded = self.batcher.encode(missing)
+            else:
+                encoded = self.model.encode(missing, convert_to_numpy=True, show_progress_bar=show_progress_bar)
+            self.embedding_cache.put_many(missing, encoded)
+            fresh = dict(zip(missing, encoded))
+            cached = [vector if vector is not None else fresh[text] for text, vector in zip(texts, cached)]
+        
+        vectors = np.array(cached, dtype='float32').reshape(len(texts), self.dimension)
+        if self.metric == 'cosine':
+            faiss.normalize_L2(vectors)
+        return vectors
     
     def encode_text(self, text: str) -> np.ndarray:
         """
@@ -71,11 +348,11 @@ class VectorStore:
         
         Args:
             text: 输入文本
-            
+        
         Returns:
-            向量数组
+            向量数组（cosine度量下已归一化）
         """
-        return self.model.encode(text, convert_to_numpy=True)
+        return self._embed([text])[0]
     
     def encode_texts(self, texts: List[str]) -> np.ndarray:
         """
@@ -83,134 +360,372 @@ class VectorStore:
         
         Args:
             texts: 文本列表
-            
+        
+        Returns:
+            向量数组（cosine度量下已归一化）
+        """
+        return self._embed(texts, show_progress_bar=True)
+    
+    @staticmethod
+    def _as_ids(doc_ids: Iterable[int]) -> np.ndarray:
+        """将文档ID序列转换为FAISS使用的int64数组"""
+        return np.asarray(list(doc_ids), dtype='int64')
+    
+    def _add_vectors(self, user_id: int, ids: np.ndarray, vectors: np.ndarray) -> int:
+        """向用户分区写入（覆盖）已编码的向量"""
+        def operation(partition):
+            replaced = partition.add(ids, vectors)
+            self._logged(partition)
+            return replaced
+        return self._write(user_id, operation)
+    
+    def _chunk_texts(self, text: str) -> List[str]:
+        """切分文档文本，空文本仍作为一个片段编码，超过上限的片段被丢弃"""
+        chunks = [chunk.text for chunk in self.chunker.iter_chunks(text)]
+        return chunks[:vector_index.MAX_CHUNKS] or [text]
+    
+    def _iter_chunk_batches(self, doc_ids: List[int], texts: List[str]):
+        """
+        流式切分文档，按 ENCODE_BATCH_CHUNKS 个片段一批产出
+        
+        Yields:
+            (本批写完全部片段的文档ID列表, 片段ID数组, 片段文本列表)
+        """
+        batch_docs, batch_ids, batch_texts = [], [], []
+        for doc_id, text in zip(doc_ids, texts):
+            chunks = self._chunk_texts(text)
+            batch_docs.append(int(doc_id))
+            batch_ids.append(vector_index.chunk_ids(doc_id, len(chunks)))
+            batch_texts.extend(chunks)
+            if len(batch_texts) >= ENCODE_BATCH_CHUNKS:
+                yield batch_docs, np.concatenate(batch_ids), batch_texts
+                batch_docs, batch_ids, batch_texts = [], [], []
+        if batch_docs:
+            yield batch_docs, np.concatenate(batch_ids), batch_texts
+    
+    def _replace_chunks(self, user_id: int, doc_ids: List[int], ids: np.ndarray, vectors: np.ndarray) -> int:
+        """
+        写入文档的片段向量，并删除文档变短后多出的旧片段
+        
         Returns:
-            向量数组
+            写入前已在索引中的文档数量
         """
-        return self.model.encode(texts, convert_to_numpy=True, show_progress_bar=True)
+        def operation(partition):
+            with partition.lock:
+                existing = partition.ids_of_documents(self._as_ids(doc_ids))
+                partition.add(ids, vectors)
+                stale = existing[~np.isin(existing, ids)]
+                if len(stale):
+                    partition.remove(stale)
+            self._logged(partition)
+            return len(np.unique(existing >> vector_index.CHUNK_BITS))
+        return self._write(user_id, operation)
     
-    def add_document(self, doc_id: int, text: str):
+    def add_document(self, doc_id: int, text: str, user_id: int):
         """
-        添加单个文档到索引
+        添加单个文档到用户分区（已存在时覆盖）
         
         Args:
             doc_id: 文档ID
             text: 文档文本内容
+            user_id: 文档所属用户ID
         """
-        vector = self.encode_text(text)
-        vector = vector.reshape(1, -1).astype('float32')
-        
-        self.index.add(vector)
-        self.doc_ids.append(doc_id)
-        self.save_index()
+        self.add_documents([doc_id], [text], user_id, show_progress_bar=False)
     
-    def add_documents(self, doc_ids: List[int], texts: List[str]):
+    def add_documents(self, doc_ids: List[int], texts: List[str], user_id: int,
+                      show_progress_bar: bool = True) -> int:
         """
-        批量添加文档到索引
+        批量添加文档到用户分区（已存在时覆盖）
+        
+        文档流式切分为片段，每凑满一批片段编码并写入一次。
         
         Args:
             doc_ids: 文档ID列表
             texts: 文档文本列表
+            user_id: 文档所属用户ID
+            show_progress_bar: 是否显示编码进度
+        
+        Returns:
+            写入前已在索引中的文档数量
         """
         if len(doc_ids) != len(texts):
             raise ValueError("doc_ids and texts must have the same length")
         
-        vectors = self.encode_texts(texts)
-        vectors = vectors.astype('float32')
+        existed = 0
+        for batch_docs, ids, chunks in self._iter_chunk_batches(doc_ids, texts):
+            vectors = self._embed(chunks, show_progress_bar=show_progress_bar)
+            existed += self._replace_chunks(user_id, batch_docs, ids, vectors)
+        return existed
+    
+    def update_document(self, doc_id: int, text: str, user_id: int) -> bool:
+        """
+        重新编码并原地替换文档向量
+        
+        Args:
+            doc_id: 文档ID
+            text: 新的文档文本内容
+            user_id: 文档所属用户ID
+        
+        Returns:
+            文档原先是否在索引中
+        """
+        return self.add_documents([doc_id], [text], user_id, show_progress_bar=False) > 0
+    
+    def _pool(self, ids: np.ndarray, similarities: np.ndarray, k: int) -> List[Tuple[int, float, int]]:
+        """
+        将片段命中聚合为文档
         
-        self.index.add(vectors)
-        self.doc_ids.extend(doc_ids)
-        self.save_index()
+        Args:
+            ids: 片段ID数组（-1为空位）
+            similarities: 对应的相似度
+            k: 返回的文档数量
+        
+        Returns:
+            [(doc_id, score, 最相关片段序号), ...]，按分数从高到低排列
+        """
+        scores: Dict[int, float] = {}
+        best: Dict[int, Tuple[float, int]] = {}
+        doc_ids, chunk_nos = vector_index.split_ids(ids)
+        for chunk_id, doc_id, chunk_no, similarity in zip(ids, doc_ids, chunk_nos, similarities):
+            if chunk_id == -1:
+                continue
+            doc_id, similarity = int(doc_id), float(similarity)
+            if doc_id not in best or similarity > best[doc_id][0]:
+                best[doc_id] = (similarity, int(chunk_no))
+            if self.passage_pooling == 'sum':
+                scores[doc_id] = scores.get(doc_id, 0.0) + similarity
+            else:
+                scores[doc_id] = best[doc_id][0]
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(doc_id, score, best[doc_id][1]) for doc_id, score in ranked]
+    
+    @staticmethod
+    def _format_hits(hits: List[Tuple[int, float, int]], with_passages: bool) -> list:
+        return hits if with_passages else [(doc_id, score) for doc_id, score, _ in hits]
     
-    def search(self, query: str, k: int = 10) -> List[Tuple[int, float]]:
+    def search(self, query: str, user_id: int, k: int = 10,
+               with_passages: bool = False) -> List[Tuple[int, float]]:
         """
-        搜索最相似的文档
+        在用户分区中搜索最相似的文档
         
         Args:
             query: 查询文本
+            user_id: 查询用户ID，只扫描该用户的向量
             k: 返回结果数量
-            
+            with_passages: 是否同时返回每个文档最相关的片段序号
+        
+        Returns:
+            [(doc_id, similarity_score), ...] 列表；
+            with_passages 时为 [(doc_id, similarity_score, chunk_no), ...]
+        """
+        return self.search_batch([query], user_id, k, with_passages)[0]
+    
+    def search_batch(self, queries: List[str], user_id: int, k: int = 10,
+                     with_passages: bool = False) -> List[List[Tuple[int, float]]]:
+        """
+        批量检索：全部查询一次编码，以查询矩阵对分区做一次检索
+        
+        Args:
+            queries: 查询文本列表
+            user_id: 查询用户ID，只扫描该用户的向量
+            k: 每个查询返回的结果数量
+            with_passages: 是否同时返回每个文档最相关的片段序号
+        
         Returns:
-            [(doc_id, similarity_score), ...] 列表
+            与 queries 一一对应的结果列表，每项格式同 search
+        """
+        queries = list(queries)
+        partition = self._partition(user_id)
+        if partition.size == 0 or not queries or k <= 0:
+            return [[] for _ in queries]
+        
+        query_vectors = self._embed(queries)
+        
+        # 多取片段，聚合后每个查询保留k个文档
+        distances, ids = partition.search(query_vectors, k * PASSAGE_FETCH_FACTOR)
+        return [
+            self._format_hits(self._pool(row_ids, self._similarities(row_distances), k), with_passages)
+            for row_distances, row_ids in zip(distances, ids)
+        ]
+    
+    def _similarities(self, distances: np.ndarray) -> np.ndarray:
         """
-        if self.index.ntotal == 0:
-            return []
+        将索引返回的距离转换为相似度分数（越大越相似）
         
-        # 编码查询
-        query_vector = self.encode_text(query)
-        query_vector = query_vector.reshape(1, -1).astype('float32')
+        l2: 使用负指数函数转换 similarity = exp(-distance)，取值0-1
+        cosine: 内积即余弦相似度，取值-1到1
+        """
+        if self.metric == 'cosine':
+            return distances
+        return np.exp(-distances)
+    
+    def _radius(self, min_similarity: float) -> float:
+        """将相似度下限换算为索引范围检索的阈值（l2为距离上限 -ln(s)）"""
+        if self.metric == 'cosine':
+            return min_similarity
+        if min_similarity <= 0:
+            return float('inf')
+        return float(-np.log(min_similarity))
+    
+    def search_range(self, query: Union[str, List[str]], user_id: int,
+                     min_similarity: Optional[float] = None,
+                     max_k: int = 10,
+                     with_passages: bool = False) -> Union[List[Tuple[int, float]], List[List[Tuple[int, float]]]]:
+        """
+        按相似度阈值检索：阈值在索引内部过滤，低于阈值的片段不会返回
         
-        # 搜索
-        k = min(k, self.index.ntotal)
-        distances, indices = self.index.search(query_vector, k)
+        Args:
+            query: 查询文本，或查询文本列表（批量编码、批量检索）
+            user_id: 查询用户ID，只扫描该用户的向量
+            min_similarity: 最低相似度，默认使用 similarity_threshold
+            max_k: 每个查询最多返回的文档数量
+            with_passages: 是否同时返回每个文档最相关的片段序号
         
-        # 将L2距离转换为相似度分数 (0-1之间，越大越相似)
-        # 使用负指数函数转换: similarity = exp(-distance)
-        similarities = np.exp(-distances[0])
+        Returns:
+            [(doc_id, similarity_score), ...]，按相似度从高到低排列（sum池化时分数为命中片段之和）；
+            with_passages 时每项为 (doc_id, similarity_score, chunk_no)；
+            query 为列表时返回与之一一对应的结果列表
+        """
+        batched = not isinstance(query, str)
+        queries = list(query) if batched else [query]
+        if min_similarity is None:
+            min_similarity = self.similarity_threshold
         
-        # 构建结果
-        results = []
-        for idx, similarity in zip(indices[0], similarities):
-            if idx < len(self.doc_ids):
-                doc_id = self.doc_ids[idx]
-                results.append((doc_id, float(similarity)))
+        partition = self._partition(user_id)
+        if partition.size == 0 or not queries or max_k <= 0:
+            results = [[] for _ in queries]
+            return results if batched else results[0]
         
-        return results
+        query_vectors = self._embed(queries)
+        results = []
+        radius = self._radius(min_similarity)
+        for distances, ids in partition.search_range(query_vectors, radius, max_k * PASSAGE_FETCH_FACTOR):
+            hits = self._pool(ids, self._similarities(distances), max_k)
+            results.append(self._format_hits(hits, with_passages))
+        return results if batched else results[0]
     
-    def remove_document(self, doc_id: int) -> bool:
+    def remove_document(self, doc_id: int, user_id: int) -> bool:
         """
-        从索引中移除文档
-        注意: FAISS不支持直接删除，需要重建索引
+        从用户分区中移除文档
         
         Args:
             doc_id: 文档ID
-            
+            user_id: 文档所属用户ID
+        
         Returns:
             是否成功移除
         """
-        if doc_id not in self.doc_ids:
-            return False
+        return self.remove_documents([doc_id], user_id) > 0
+    
+    def remove_documents(self, doc_ids: Iterable[int], user_id: int) -> int:
+        """
+        按文档ID批量移除向量，只写一条日志记录
         
-        # 找到文档在列表中的所有位置
-        indices_to_remove = [i for i, did in enumerate(self.doc_ids) if did == doc_id]
+        Args:
+            doc_ids: 文档ID列表
+            user_id: 文档所属用户ID
         
-        # 重建索引（排除要删除的文档）
-        if self.index.ntotal > 0:
-            try:
-                # 获取所有向量 - 使用正确的FAISS API
-                vectors = []
-                for i in range(self.index.ntotal):
-                    vec = self.index.reconstruct(i)
-                    vectors.append(vec)
-                vectors = np.array(vectors, dtype='float32')
-                
-                # 创建新索引
-                new_index = faiss.IndexFlatL2(self.dimension)
-                new_doc_ids = []
-                
-                # 添加未删除的向量
-                for i in range(len(vectors)):
-                    if i not in indices_to_remove:
-                        new_index.add(vectors[i:i+1])
-                        new_doc_ids.append(self.doc_ids[i])
-                
-                self.index = new_index
-                self.doc_ids = new_doc_ids
-                self.save_index()
-            except Exception as e:
-                print(f"Error removing document: {str(e)}")
-                return False
+        Returns:
+            实际移除的向量（片段）数量
+        """
+        doc_ids = self._as_ids(doc_ids)
+        if len(doc_ids) == 0:
+            return 0
         
-        return True
+        def operation(partition):
+            with partition.lock:
+                ids = partition.ids_of_documents(doc_ids)
+                if len(ids) == 0:
+                    return 0
+                return partition.remove(ids)
+        return self._write(user_id, operation)
     
-    def get_index_size(self) -> int:
-        """获取索引中的文档数量"""
-        return self.index.ntotal
+    def get_index_size(self, user_id: int) -> int:
+        """获取用户分区中的文档数量（不是片段向量数）"""
+        return self._partition(user_id).document_count
     
-    def clear_index(self):
-        """清空索引"""
-        self.index = faiss.IndexFlatL2(self.dimension)
-        self.doc_ids = []
-        self.save_index()
-
-
+    def evaluate_index(self, user_id: int, k: int = 10, sample: int = 100) -> Dict:
+        """
+        评估用户分区当前索引相对精确检索的召回率与查询延迟
+        
+        Args:
+            user_id: 用户ID
+            k: 评估的结果数量（recall@k）
+            sample: 抽样查询数量
+        
+        Returns:
+            {'index_type', 'vectors', 'recall_at_k', 'k', 'latency_ms', 'exact_latency_ms'}
+        """
+        partition = self._partition(user_id)
+        ids, vectors = partition.vectors()
+        report = {'index_type': partition.index_kind, 'vectors': int(len(ids))}
+        report.update(evaluate_recall(partition.search, ids, vectors, k, sample))
+        return report
+    
+    def clear_index(self, user_id: int = None):
+        """
+        清空索引
+        
+        Args:
+            user_id: 只清空该用户的分区；为None时删除全部分区
+        """
+        if user_id is not None:
+            self._write(user_id, lambda partition: partition.clear())
+            return
+        
+        with self._partitions_lock:
+            partitions = list(self._partitions.values())
+            self._partitions.clear()
+        for partition in partitions:
+            partition.destroy()
+        shutil.rmtree(self.partition_root, ignore_errors=True)
+        os.makedirs(self.partition_root, exist_ok=True)
+    
+    def has_shared_index(self) -> bool:
+        """是否存在分区化之前的全局索引（index_path根目录下）"""
+        return any(
+            os.path.exists(os.path.join(self.index_path, name))
+            for name in (CURRENT_FILE, 'faiss.index')
+        ) or os.path.isdir(os.path.join(self.index_path, 'wal'))
+    
+    def migrate_shared_index(self, owners: Dict[int, int]) -> int:
+        """
+        将分区化之前的全局索引按文档所属用户拆分到各用户分区
+        
+        向量直接搬移，不重新编码；找不到所属用户（已删除）的文档被丢弃。
+        
+        Args:
+            owners: {doc_id: user_id} 映射
+        
+        Returns:
+            迁移的向量数量
+        """
+        if not self.has_shared_index():
+            return 0
+        
+        # 全局索引始终是L2度量
+        shared = VectorPartition(self.index_path, self.model_name, self.dimension, metric='l2')
+        ids, vectors = shared.vectors()
+        if self.metric == 'cosine':
+            faiss.normalize_L2(vectors)
+        user_ids = np.array([owners.get(int(doc_id), -1) for doc_id in ids >> vector_index.CHUNK_BITS], dtype='int64')
+        
+        migrated = 0
+        for user_id in np.unique(user_ids):
+            if user_id < 0:
+                continue
+            mask = user_ids == user_id
+            self._add_vectors(int(user_id), ids[mask], vectors[mask])
+            migrated += int(mask.sum())
+        self.checkpoint()
+        
+        # 删除全局索引文件
+        shared.wal.close()
+        for name in (CURRENT_FILE, 'snapshots', 'wal'):
+            target = os.path.join(self.index_path, name)
+            if os.path.isdir(target):
+                shutil.rmtree(target, ignore_errors=True)
+            elif os.path.exists(target):
+                os.remove(target)
+        print(f"Migrated {migrated} of {len(ids)} shared vectors into per-user partitions.")
+        return migrated
@@ -0,0 +1,251 @@
+import numpy as np
+import faiss
+from typing import List, Optional, Tuple
+import vector_index
+import vector_rerank
+from vector_rerank import RawVectors
+
+# 增量（新写入 + 被删除/覆盖的基础ID）达到 max(MERGE_THRESHOLD, 基础向量数 * MERGE_RATIO) 时
+# 合并为新的基础索引：合并需复制整个索引，大分区按比例放宽以摊薄复制开销
+MERGE_THRESHOLD = 1024
+MERGE_RATIO = 0.02
+
+
+def _empty_ids() -> np.ndarray:
+    return np.zeros(0, dtype='int64')
+
+
+class PartitionView:
+    """
+    分区在某一时刻的不可变版本
+
+    检索线程取到视图引用后只读取其中的数据，无需加锁；写操作在写锁内基于当前视图生成新视图，
+    以一次属性赋值原子发布，正在进行的检索继续使用旧视图，不会读到一半的修改。
+
+    基础索引（及压缩索引的原始向量）发布后不再修改。之后的写入记录在小的增量中：
+    delta 为新写入的向量，检索时精确暴力计算；masked 为基础索引中已被删除或覆盖的ID，
+    检索时多取相应数量的候选再过滤。增量达到阈值或检查点时由写线程合并出新的基础索引。
+    """
+
+    __slots__ = ('index', 'raw', 'metric', 'base_ids', 'tombstones', 'delta_ids',
+                 'delta_vectors', 'masked', 'mapped', 'version')
+
+    def __init__(self, index, raw: Optional[RawVectors] = None, metric: str = 'l2',
+                 mapped: bool = False, version: int = 0):
+        """
+        以索引为基础创建没有增量的视图
+
+        Args:
+            index: 基础索引（发布后不再修改）
+            raw: 压缩索引的原始向量
+            metric: 距离度量
+            mapped: 基础索引是否以只读mmap映射自快照文件（映射的数据不可复制后修改）
+            version: 版本号，每次发布新视图加1
+        """
+        self.index = index
+        self.raw = raw
+        self.metric = metric
+        self.mapped = mapped
+        self.version = version
+        self.base_ids = np.sort(vector_index.stored_ids(index))
+        self.tombstones = vector_index.count_tombstones(index)
+        self.delta_ids = _empty_ids()
+        self.delta_vectors = np.zeros((0, index.d), dtype='float32')
+        self.masked = _empty_ids()
+
+    def _derive(self, delta_ids: np.ndarray, delta_vectors: np.ndarray, masked: np.ndarray) -> 'PartitionView':
+        """共享基础索引，替换增量得到新视图"""
+        view = object.__new__(PartitionView)
+        for name in ('index', 'raw', 'metric', 'base_ids', 'tombstones', 'mapped'):
+            setattr(view, name, getattr(self, name))
+        view.delta_ids = delta_ids
+        view.delta_vectors = delta_vectors
+        view.masked = masked
+        view.version = self.version + 1
+        return view
+
+    def with_raw(self, raw: Optional[RawVectors]) -> 'PartitionView':
+        """替换原始向量（检查点后改为从新快照mmap读取）"""
+        view = self._derive(self.delta_ids, self.delta_vectors, self.masked)
+        view.raw = raw
+        return view
+
+    @property
+    def size(self) -> int:
+        """有效向量数量"""
+        return len(self.base_ids) - len(self.masked) + len(self.delta_ids)
+
+    @property
+    def pending(self) -> int:
+        """尚未合并进基础索引的增量大小"""
+        return len(self.delta_ids) + len(self.masked)
+
+    @property
+    def needs_merge(self) -> bool:
+        """增量是否已大到应合并"""
+        return self.pending >= max(MERGE_THRESHOLD, len(self.base_ids) * MERGE_RATIO)
+
+    def _in_base(self, ids: np.ndarray) -> np.ndarray:
+        """ids 是否为基础索引中的有效ID"""
+        if len(self.base_ids) == 0:
+            return np.zeros(len(ids), dtype=bool)
+        positions = np.minimum(np.searchsorted(self.base_ids, ids), len(self.base_ids) - 1)
+        return self.base_ids[positions] == ids
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray) -> Tuple['PartitionView', int]:
+        """
+        写入（覆盖）向量
+
+        Returns:
+            (新视图, 被覆盖的已有向量数量)
+        """
+        in_delta = np.isin(self.delta_ids, ids)
+        in_base = self._in_base(ids)
+        replaced = int(np.count_nonzero(in_delta)) + int(np.count_nonzero(in_base & ~np.isin(ids, self.masked)))
+        view = self._derive(
+            np.concatenate([self.delta_ids[~in_delta], ids]),
+            np.concatenate([self.delta_vectors[~in_delta], vectors]),
+            np.union1d(self.masked, ids[in_base]),
+        )
+        return view, replaced
+
+    def remove(self, ids: np.ndarray) -> Tuple['PartitionView', int]:
+        """
+        按ID删除向量
+
+        Returns:
+            (新视图, 实际删除的向量数量)
+        """
+        in_delta = np.isin(self.delta_ids, ids)
+        in_base = self._in_base(ids) & ~np.isin(ids, self.masked)
+        removed = int(np.count_nonzero(in_delta)) + int(np.count_nonzero(in_base))
+        if removed == 0:
+            return self, 0
+        view = self._derive(
+            self.delta_ids[~in_delta],
+            self.delta_vectors[~in_delta],
+            np.union1d(self.masked, ids[in_base]),
+        )
+        return view, removed
+
+    def stored_ids(self) -> np.ndarray:
+        """全部有效的ID"""
+        base = self.base_ids
+        if len(self.masked):
+            base = base[~np.isin(base, self.masked)]
+        return np.concatenate([base, self.delta_ids])
+
+    def vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """全部有效的 (ID数组, 原始向量矩阵)"""
+        if self.raw is not None:
+            ids, vectors = self.raw.vectors()
+        else:
+            ids, vectors = vector_index.contents(self.index)
+        if len(self.masked):
+            keep = ~np.isin(ids, self.masked)
+            ids, vectors = ids[keep], vectors[keep]
+        return np.concatenate([ids, self.delta_ids]), np.concatenate([vectors, self.delta_vectors])
+
+    def _delta_distances(self, query_vectors: np.ndarray) -> np.ndarray:
+        """查询与增量向量的精确距离矩阵（与基础索引的距离口径一致）"""
+        if self.metric == 'cosine':
+            return query_vectors @ self.delta_vectors.T
+        return faiss.pairwise_distances(query_vectors, self.delta_vectors)
+
+    def search(self, query_vectors: np.ndarray, k: int, rerank_factor: int = 4) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        检索：基础索引多取 len(masked) 个候选并过滤，与增量的精确结果合并
+
+        Returns:
+            (距离矩阵, ID矩阵)，不足k个时以 (最差距离, -1) 补齐
+        """
+        has_base = self.index.ntotal > 0
+        if not len(self.delta_ids) and not len(self.masked) and has_base:
+            return vector_rerank.search(self.index, self.raw, query_vectors, k, self.tombstones, rerank_factor)
+
+        worst = vector_index.worst_distance(self.metric)
+        parts_distances, parts_ids = [], []
+        if has_base:
+            distances, ids = vector_rerank.search(
+                self.index, self.raw, query_vectors, k + len(self.masked), self.tombstones, rerank_factor
+            )
+            if len(self.masked):
+                hidden = np.isin(ids, self.masked)
+                ids = np.where(hidden, -1, ids)
+                distances = np.where(hidden, worst, distances)
+            parts_distances.append(distances)
+            parts_ids.append(ids)
+        if len(self.delta_ids):
+            parts_distances.append(self._delta_distances(query_vectors).astype('float32'))
+            parts_ids.append(np.broadcast_to(self.delta_ids, (len(query_vectors), len(self.delta_ids))))
+
+        out_distances = np.full((len(query_vectors), k), worst, dtype='float32')
+        out_ids = np.full((len(query_vectors), k), -1, dtype='int64')
+        if not parts_ids:
+            return out_distances, out_ids
+        distances = np.concatenate(parts_distances, axis=1)
+        ids = np.concatenate(parts_ids, axis=1)
+        for row in range(len(query_vectors)):
+            live = ids[row] != -1
+            row_distances, row_ids = distances[row][live], ids[row][live]
+            order = vector_index.rank_order(row_distances, self.metric)[:k]
+            out_distances[row, :len(order)] = row_distances[order]
+            out_ids[row, :len(order)] = row_ids[order]
+        return out_distances, out_ids
+
+    def range_search(self, query_vectors: np.ndarray, radius: float, max_k: int,
+                     rerank_factor: int = 4) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        范围检索：基础索引的结果过滤 masked 后与增量中满足阈值的向量合并
+
+        Returns:
+            每个查询一项 (距离数组, ID数组)，按相似度排序，最多max_k个
+        """
+        if self.index.ntotal > 0:
+            base = vector_rerank.range_search(
+                self.index, self.raw, query_vectors, radius, max_k + len(self.masked),
+                self.tombstones, rerank_factor
+            )
+        else:
+            base = [(np.zeros(0, dtype='float32'), _empty_ids()) for _ in range(len(query_vectors))]
+        if not len(self.delta_ids) and not len(self.masked):
+            return base
+
+        delta_distances = self._delta_distances(query_vectors) if len(self.delta_ids) else None
+        results = []
+        for row, (distances, ids) in enumerate(base):
+            if len(self.masked):
+                keep = ~np.isin(ids, self.masked)
+                distances, ids = distances[keep], ids[keep]
+            if delta_distances is not None:
+                hit = vector_index.within(delta_distances[row], radius, self.metric)
+                distances = np.concatenate([distances, delta_distances[row][hit].astype('float32')])
+                ids = np.concatenate([ids, self.delta_ids[hit]])
+            order = vector_index.rank_order(distances, self.metric)[:max_k]
+            results.append((distances[order], ids[order]))
+        return results
+
+    def materialize(self) -> Tuple[object, Optional[RawVectors]]:
+        """
+        生成包含全部增量的新基础索引与原始向量（不修改当前视图）
+
+        Returns:
+            (索引, 原始向量)；没有增量时直接返回当前基础索引
+        """
+        if not self.pending:
+            return self.index, self.raw
+        if self.mapped:
+            # clone_index 会与mmap映射共享数据，序列化一次得到完全独立的可写副本
+            index = faiss.deserialize_index(faiss.serialize_index(self.index))
+        else:
+            index = faiss.clone_index(self.index)
+        vector_index.remove_ids(index, self.masked)
+        if len(self.delta_ids):
+            index.add_with_ids(self.delta_vectors, self.delta_ids)
+
+        raw = None
+        if self.raw is not None:
+            raw = self.raw.freeze()
+            raw.remove(self.masked)
+            raw.add(self.delta_ids, self.delta_vectors)
+        return index, raw
@@ -0,0 +1,142 @@
+import os
+import glob
+import struct
+import zlib
+import numpy as np
+from typing import Iterator, Optional, Tuple
+
+# 记录类型
+OP_ADD = 1
+OP_REMOVE = 2
+OP_CLEAR = 3
+
+# 记录头: 操作类型, 向量数量, 负载长度, 负载CRC32
+_HEADER = struct.Struct('<BIII')
+
+
+class VectorWAL:
+    """
+    向量预写日志（追加写，按段滚动）
+    
+    每次增删向量追加一条小记录并fsync，全量索引只在检查点时写出。
+    记录语义为按ID覆盖/删除，重复回放同一段日志结果不变，
+    因此检查点与删除旧日志段之间崩溃也不会造成数据不一致。
+    """
+    
+    def __init__(self, directory: str, dimension: int):
+        """
+        初始化预写日志
+        
+        Args:
+            directory: 日志段所在目录
+            dimension: 向量维度
+        """
+        self.directory = directory
+        self.dimension = dimension
+        self._file = None
+        self._segment = 0
+        self._bytes = 0
+        os.makedirs(directory, exist_ok=True)
+    
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f'wal-{segment:08d}.log')
+    
+    def segments(self) -> list:
+        """按顺序返回现有日志段编号"""
+        paths = glob.glob(os.path.join(self.directory, 'wal-*.log'))
+        return sorted(int(os.path.basename(p)[4:12]) for p in paths)
+    
+    @property
+    def pending_bytes(self) -> int:
+        """自上次滚动以来写入的日志字节数"""
+        return self._bytes
+    
+    def open(self):
+        """在已有日志段之后开启新的日志段"""
+        existing = self.segments()
+        self._segment = (existing[-1] + 1) if existing else 1
+        self._file = open(self._segment_path(self._segment), 'ab')
+        self._bytes = 0
+    
+    def rotate(self) -> int:
+        """
+        切换到新的日志段
+        
+        Returns:
+            切换前最后一个日志段编号，检查点落盘后可删除该编号及之前的段
+        """
+        sealed = self._segment
+        self._file.close()
+        self._segment += 1
+        self._file = open(self._segment_path(self._segment), 'ab')
+        self._bytes = 0
+        return sealed
+    
+    def drop_segments(self, upto: int):
+        """删除编号不大于upto的日志段"""
+        for segment in self.segments():
+            if segment <= upto:
+                os.remove(self._segment_path(segment))
+    
+    def close(self):
+        """关闭当前日志段"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+    
+    def _append(self, op: int, count: int, payload: bytes):
+        header = _HEADER.pack(op, count, len(payload), zlib.crc32(payload))
+        self._file.write(header + payload)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._bytes += _HEADER.size + len(payload)
+    
+    def append_add(self, ids: np.ndarray, vectors: np.ndarray):
+        """记录写入（覆盖）向量"""
+        ids = np.ascontiguousarray(ids, dtype='int64')
+        vectors = np.ascontiguousarray(vectors, dtype='float32')
+        self._append(OP_ADD, len(ids), ids.tobytes() + vectors.tobytes())
+    
+    def append_remove(self, ids: np.ndarray):
+        """记录删除向量"""
+        ids = np.ascontiguousarray(ids, dtype='int64')
+        self._append(OP_REMOVE, len(ids), ids.tobytes())
+    
+    def append_clear(self):
+        """记录清空索引"""
+        self._append(OP_CLEAR, 0, b'')
+    
+    def replay(self) -> Iterator[Tuple[int, np.ndarray, Optional[np.ndarray]]]:
+        """
+        按写入顺序回放所有日志段
+        
+        段内遇到不完整或校验失败的记录（崩溃时的残缺尾部）时，把该段截断到最后一条完整记录，
+        再继续回放之后的段：重启后的写入追加在新段中，不能因旧段的残缺尾部被丢弃。
+        
+        Yields:
+            (操作类型, ID数组, 向量数组或None)
+        """
+        for segment in self.segments():
+            path = self._segment_path(segment)
+            with open(path, 'rb') as f:
+                data = f.read()
+            offset = 0
+            while offset + _HEADER.size <= len(data):
+                op, count, length, crc = _HEADER.unpack_from(data, offset)
+                start = offset + _HEADER.size
+                payload = data[start:start + length]
+                if len(payload) != length or zlib.crc32(payload) != crc:
+                    break
+                ids = np.frombuffer(payload, dtype='int64', count=count)
+                vectors = None
+                if op == OP_ADD:
+                    vectors = np.frombuffer(payload, dtype='float32', offset=count * 8)
+                    vectors = vectors.reshape(count, self.dimension)
+                yield op, ids, vectors
+                offset = start + length
+            if offset < len(data):
+                print(f"WAL segment {segment}: torn record at offset {offset}, truncating the segment.")
+                with open(path, 'r+b') as f:
+                    f.truncate(offset)
+                    f.flush()
+                    os.fsync(f.fileno())